@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Archivage Dossiers Collecteurs',
-    'version': '16.0.1.0.0',
+    'version': '16.0.1.1.0',
     'category': 'Operations/Inventory',
     'summary': 'Gestion complète de la chaîne de traitement des dossiers collecteurs',
     'description': """
@@ -63,6 +63,7 @@ Sécurité et Droits d'accès :
         'stock',
         'product',
         'web',
+        'bus',
         'board'
     ],
     'data': [
@@ -74,6 +75,7 @@ Sécurité et Droits d'accès :
         'data/stock_location_data.xml',
         'data/stock_picking_type_data.xml',
         'data/sequence_data.xml',
+        'data/product_data.xml',
         
         # Actions
 
@@ -87,6 +89,12 @@ Sécurité et Droits d'accès :
         'views/indexation_dossier_views.xml',
         'views/livraison_numerique_views.xml',
         'views/reporting_kpi_views.xml',
+        'views/reporting_kpi_journalier_views.xml',
+        'views/dossier_attente_views.xml',
+        'views/dossier_encours_views.xml',
+        'views/reporting_vues_materialisees_views.xml',
+        'views/agent_charge_views.xml',
+        'views/action_masse_views.xml',
         'views/actions.xml',
         
         # Wizards
@@ -95,6 +103,11 @@ Sécurité et Droits d'accès :
         # Menus (doit être en dernier)
         'views/menuitem.xml',
     ],
+    'assets': {
+        'web.assets_backend': [
+            'archivage_collecteurs_complet/static/src/js/file_etape_bus.js',
+        ],
+    },
     'installable': True,
     'application': True,
     'auto_install': False,
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+MODULE = 'archivage_collecteurs_complet'
+
+
+def migrate(cr, version):
+    """Rattache le produit DOSSIER_COLLECTEUR créé par les anciennes versions à son identifiant XML.
+
+    Sans ce rattachement, data/product_data.xml créerait un second produit
+    Dossier Collecteur. Le produit existant était créé sans suivi : il passe
+    au suivi par numéro de série, ce que le chargement des données
+    (noupdate) ne ferait pas.
+    """
+    if not version:
+        return
+    cr.execute("""
+        SELECT 1 FROM ir_model_data WHERE module = %s AND name = 'product_dossier_collecteur'
+    """, [MODULE])
+    if cr.fetchone():
+        return
+    cr.execute("""
+        SELECT p.id, p.product_tmpl_id
+          FROM product_product p
+         WHERE p.default_code = 'DOSSIER_COLLECTEUR'
+         ORDER BY p.active DESC, p.id
+         LIMIT 1
+    """)
+    ligne = cr.fetchone()
+    if not ligne:
+        return
+    product_id, template_id = ligne
+
+    cr.execute("""
+        INSERT INTO ir_model_data (module, name, model, res_id, noupdate)
+        VALUES (%s, 'product_dossier_collecteur', 'product.product', %s, true),
+               (%s, 'product_dossier_collecteur_product_template', 'product.template', %s, true)
+        ON CONFLICT DO NOTHING
+    """, [MODULE, product_id, MODULE, template_id])
+    cr.execute("UPDATE product_template SET tracking = 'serial' WHERE id = %s AND tracking != 'serial'", [template_id])
+
+    cr.execute("""
+        SELECT count(*) FROM stock_quant WHERE product_id = %s AND lot_id IS NULL AND quantity != 0
+    """, [product_id])
+    nombre_quants, = cr.fetchone()
+    if nombre_quants:
+        _logger.warning(
+            "Produit DOSSIER_COLLECTEUR (id %s) : %d quantités en stock sans numéro de série, "
+            "à solder par un inventaire", product_id, nombre_quants
+        )
+    _logger.info("Produit DOSSIER_COLLECTEUR (id %s) rattaché à %s.product_dossier_collecteur", product_id, MODULE)
@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from . import reporting_kpi
+from . import reporting_kpi_journalier
+from . import reporting_kpi_histogramme
+from . import reporting_tableau_bord
+from . import compteur_delta
+from . import action_masse
 from . import reception_dossier
+from . import dossier_attente
 from . import dossier_collecteur
+from . import dossier_encours
 from . import traitement_physique
 from . import numerisation_dossier
 from . import indexation_dossier
 from . import livraison_numerique
 from . import carton
-from . import reporting_kpi
+from . import agent_statistique_mensuelle
+from . import agent_charge
+from . import notification_etape
 from . import res_users_inherit
+from . import ir_websocket
+from . import ir_sequence
+from . import reporting_vues_materialisees
 
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+# Enregistrements traités (et validés en base) ensemble
+TAILLE_LOT_ACTION_MASSE = 500
+
+# Durée maximale d'une exécution du cron (secondes) avant de se relancer
+DUREE_MAX_ACTION_MASSE = 120
+
+# Nombre maximal d'erreurs détaillées dans le rapport (les suivantes sont seulement comptées)
+LIMITE_ERREURS_RAPPORT = 100
+
+
+class ActionMasse(models.Model):
+    _name = 'action.masse'
+    _description = 'Action de Masse par Domaine'
+    _order = 'id desc'
+
+    name = fields.Char(string='Action', required=True, readonly=True)
+
+    res_model = fields.Char(string='Modèle', required=True, readonly=True)
+
+    methode = fields.Char(
+        string='Méthode',
+        required=True,
+        readonly=True,
+        help="Action de lot appelée sur chaque lot d'enregistrements (déclarée dans _actions_masse du modèle)"
+    )
+
+    domaine = fields.Text(
+        string='Domaine',
+        required=True,
+        readonly=True,
+        default='[]',
+        help="Filtre des enregistrements à traiter, réévalué à chaque lot"
+    )
+
+    utilisateur_id = fields.Many2one(
+        'res.users',
+        string='Demandée par',
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.user,
+        help="L'action est exécutée avec les droits de cet utilisateur"
+    )
+
+    state = fields.Selection([
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminée'),
+        ('erreur', 'En erreur'),
+        ('annule', 'Annulée')
+    ], string='État', default='en_cours', required=True, readonly=True, index=True)
+
+    dernier_id = fields.Integer(
+        string='Dernier Enregistrement Traité',
+        readonly=True,
+        help="Point de reprise : les lots suivants commencent après cet identifiant"
+    )
+
+    nombre_total = fields.Integer(string='Enregistrements Visés', readonly=True)
+    nombre_traites = fields.Integer(string='Enregistrements Traités', readonly=True)
+    nombre_erreurs = fields.Integer(string='Enregistrements en Erreur', readonly=True)
+
+    progression = fields.Float(
+        string='Progression (%)',
+        compute='_compute_progression'
+    )
+
+    rapport_erreurs = fields.Text(string="Rapport d'Erreurs", readonly=True)
+    message_erreur = fields.Text(string="Cause de l'Arrêt", readonly=True)
+
+    date_debut = fields.Datetime(string='Date de Lancement', readonly=True, default=fields.Datetime.now)
+    date_fin = fields.Datetime(string='Date de Fin', readonly=True)
+
+    # === MÉTHODES DE CALCUL ===
+    @api.depends('nombre_total', 'nombre_traites', 'nombre_erreurs')
+    def _compute_progression(self):
+        for record in self:
+            if record.nombre_total:
+                record.progression = min(
+                    100.0, (record.nombre_traites + record.nombre_erreurs) / record.nombre_total * 100
+                )
+            else:
+                record.progression = 100.0 if record.state == 'termine' else 0.0
+
+    # === LANCEMENT ===
+    @api.model
+    def lancer(self, res_model, methode, domaine):
+        """Enregistre une action de masse et confie son exécution au cron.
+
+        Seul le nombre d'enregistrements visés est calculé ici ; aucun
+        identifiant n'est chargé.
+        """
+        Modele = self.env[res_model]
+        actions = self._get_actions_autorisees(res_model)
+        if methode not in actions:
+            raise UserError(_("L'action %s n'est pas disponible en masse sur %s.") % (methode, Modele._description))
+
+        action = self.create({
+            'name': "%s - %s" % (Modele._description, actions[methode]),
+            'res_model': res_model,
+            'methode': methode,
+            'domaine': repr(domaine),
+            'nombre_total': Modele.search_count(domaine),
+        })
+        self.env.ref('archivage_collecteurs_complet.cron_executer_actions_masse')._trigger()
+        return action
+
+    @api.model
+    def _get_actions_autorisees(self, res_model):
+        """{méthode: libellé} des actions de lot que le modèle déclare dans _actions_masse"""
+        if res_model not in self.env or not isinstance(self.env[res_model], self.pool['action.masse.mixin']):
+            return {}
+        return dict(self.env[res_model]._actions_masse)
+
+    def _verifier_methode(self):
+        """Refuse d'exécuter une méthode que le modèle ne déclare plus (ou pas) dans _actions_masse"""
+        for action in self:
+            if action.methode not in self._get_actions_autorisees(action.res_model):
+                raise UserError(_("L'action %s n'est pas disponible en masse sur %s.") % (
+                    action.methode, action.res_model
+                ))
+
+    # === CRUD ===
+    def write(self, vals):
+        """Le modèle, la méthode et le domaine d'une action sont fixés à son lancement"""
+        champs_figes = {'res_model', 'methode', 'domaine'} & set(vals)
+        if champs_figes:
+            raise UserError(_("Le modèle, la méthode et le domaine d'une action de masse ne sont pas modifiables."))
+        return super().write(vals)
+
+    # === ACTIONS ===
+    def action_reprendre(self):
+        """Relance une action arrêtée sur erreur, à partir du dernier lot validé"""
+        actions = self.filtered(lambda a: a.state == 'erreur')
+        if not actions:
+            raise UserError(_("Seules les actions en erreur peuvent être reprises."))
+        actions.write({'state': 'en_cours', 'message_erreur': False, 'date_fin': False})
+        self.env.ref('archivage_collecteurs_complet.cron_executer_actions_masse')._trigger()
+
+    def action_annuler(self):
+        """Arrête l'action ; les lots déjà validés restent appliqués"""
+        self.filtered(lambda a: a.state in ('en_cours', 'erreur')).write({
+            'state': 'annule',
+            'date_fin': fields.Datetime.now(),
+        })
+
+    # === EXÉCUTION PAR LOTS ===
+    def _get_lot_suivant(self):
+        """Prochain lot du domaine après le point de reprise, par identifiant croissant"""
+        self.ensure_one()
+        Modele = self.env[self.res_model].with_user(self.utilisateur_id)
+        domaine = safe_eval(self.domaine) + [('id', '>', self.dernier_id)]
+        return Modele.search(domaine, order='id', limit=TAILLE_LOT_ACTION_MASSE)
+
+    def _executer_lot(self, lot):
+        """Applique l'action au lot ; si le lot échoue, la rejoue enregistrement par enregistrement.
+
+        Les enregistrements refusés sont comptés et cités dans le rapport sans
+        bloquer le reste du lot.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                getattr(lot, self.methode)()
+            return len(lot), []
+        except Exception:
+            _logger.info("Lot de l'action de masse %s refusé, reprise par enregistrement", self.id, exc_info=True)
+
+        traites, erreurs = 0, []
+        for record in lot:
+            try:
+                with self.env.cr.savepoint():
+                    getattr(record, self.methode)()
+                traites += 1
+            except Exception as e:
+                erreurs.append("%s : %s" % (record.display_name, e))
+        return traites, erreurs
+
+    def _executer(self, echeance):
+        """Traite les lots de l'action jusqu'à la fin du domaine ou jusqu'à l'échéance.
+
+        La méthode est revérifiée contre _actions_masse avant tout lot. Chaque
+        lot est validé en base avec le point de reprise : une interruption ne
+        fait perdre que le lot en cours. Retourne False si l'échéance
+        (time.monotonic) est atteinte avant la fin.
+        """
+        self.ensure_one()
+        self._verifier_methode()
+        while self.state == 'en_cours':
+            if time.monotonic() >= echeance:
+                return False
+            lot = self._get_lot_suivant()
+            if not lot:
+                self.write({'state': 'termine', 'date_fin': fields.Datetime.now()})
+                self.env.cr.commit()
+                return True
+
+            traites, erreurs = self._executer_lot(lot)
+            vals = {
+                'dernier_id': lot[-1].id,
+                'nombre_traites': self.nombre_traites + traites,
+                'nombre_erreurs': self.nombre_erreurs + len(erreurs),
+            }
+            place = LIMITE_ERREURS_RAPPORT - min(self.nombre_erreurs, LIMITE_ERREURS_RAPPORT)
+            if erreurs and place:
+                vals['rapport_erreurs'] = '\n'.join(filter(None, [self.rapport_erreurs] + erreurs[:place]))
+            self.write(vals)
+            self.env.cr.commit()
+            # Le lot suivant ne garde rien en cache ; l'état relu permet l'annulation en cours de route
+            self.env.invalidate_all()
+        return True
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_executer_actions_masse(self, duree_max=DUREE_MAX_ACTION_MASSE):
+        """Poursuit les actions de masse en cours, dans l'ordre de lancement.
+
+        Une action qui échoue hors de ses enregistrements (domaine invalide,
+        base indisponible...) passe en erreur et garde son point de reprise.
+        Le cron se relance lui-même quand sa durée maximale est atteinte.
+        """
+        echeance = time.monotonic() + duree_max
+        for action in self.search([('state', '=', 'en_cours')], order='id'):
+            try:
+                termine = action._executer(echeance)
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Échec de l'action de masse %s", action.id)
+                action.write({'state': 'erreur', 'message_erreur': str(e)})
+                self.env.cr.commit()
+                continue
+            if not termine:
+                self.env.ref('archivage_collecteurs_complet.cron_executer_actions_masse')._trigger()
+                break
+        return True
+
+
+class ActionMasseMixin(models.AbstractModel):
+    _name = 'action.masse.mixin'
+    _description = 'Actions de Masse par Domaine'
+
+    # (méthode, libellé) des actions de lot proposées en masse ; chaque méthode
+    # s'applique à un recordset quelconque, sans argument
+    _actions_masse = ()
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api, _
+from odoo.tools import sql, str2bool
+
+from .constantes import CHAMPS_AFFECTATION, ETAPES_AFFECTATION
+
+# Nombre maximal de dossiers ouverts par agent au-delà duquel l'agent ne reçoit plus d'affectation automatique
+DOSSIERS_MAX_PAR_AGENT = 20
+
+
+class AgentCharge(models.Model):
+    _name = 'agent.charge'
+    _description = 'Index de Charge de Travail par Agent'
+    _order = 'specialite, taches_ouvertes, debit_jour'
+    _rec_name = 'agent_id'
+
+    agent_id = fields.Many2one(
+        'res.users',
+        string='Agent',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    # === CHARGE ===
+    taches_ouvertes = fields.Integer(
+        string='Dossiers Ouverts',
+        readonly=True,
+        help="Dossiers affectés à l'agent et encore dans l'étape de sa spécialité"
+    )
+
+    debit_jour = fields.Integer(
+        string="Dossiers Terminés Aujourd'hui",
+        readonly=True,
+        help="Dossiers sortis aujourd'hui de l'étape de l'agent"
+    )
+
+    date_debit = fields.Date(
+        string='Date du Débit',
+        readonly=True,
+        help="Jour auquel se rapporte le débit ; le débit repart de zéro le lendemain"
+    )
+
+    # === DISPONIBILITÉ (copie indexable de la fiche agent) ===
+    specialite = fields.Selection(
+        related='agent_id.specialite_archivage',
+        store=True,
+        string='Spécialité'
+    )
+    actif = fields.Boolean(related='agent_id.active', store=True, string='Actif')
+    disponible = fields.Boolean(related='agent_id.disponible', store=True)
+    en_conge = fields.Boolean(related='agent_id.en_conge', store=True)
+    date_debut_conge = fields.Date(related='agent_id.date_debut_conge', store=True)
+    date_fin_conge = fields.Date(related='agent_id.date_fin_conge', store=True)
+    horaire_debut = fields.Float(related='agent_id.horaire_debut', store=True)
+    horaire_fin = fields.Float(related='agent_id.horaire_fin', store=True)
+    jours_travail = fields.Selection(related='agent_id.jours_travail', store=True)
+
+    def init(self):
+        sql.create_unique_index(self.env.cr, 'agent_charge_agent_uniq', self._table, ['agent_id'])
+        # Parcours de l'index dans l'ordre de choix : le premier agent disponible est le bon
+        sql.create_index(self.env.cr, 'agent_charge_choix_idx', self._table, ['specialite', 'taches_ouvertes'])
+
+    # === SYNCHRONISATION ===
+    @api.model
+    def _synchroniser(self, user_ids=None):
+        """Crée l'index des agents ayant une spécialité et recalcule leur charge.
+
+        Sans liste d'agents, tout l'index est reconstruit (rattrapage des
+        écritures SQL directes et changement de jour).
+        """
+        domaine = [('specialite_archivage', '!=', False)]
+        if user_ids is not None:
+            domaine.append(('id', 'in', list(user_ids)))
+        agents = self.env['res.users'].with_context(active_test=False).search(domaine)
+        existants = self.search([('agent_id', 'in', agents.ids)]).mapped('agent_id')
+        self.sudo().create([{'agent_id': agent.id} for agent in agents - existants])
+
+        Dossier = self.env['dossier.collecteur']
+        Dossier.flush_model(['state'] + list(CHAMPS_AFFECTATION))
+        self.flush_model()
+
+        charges_sql = ' UNION ALL '.join(
+            f"""SELECT d.{agent} AS agent_id,
+                       (d.state = '{etat}')::integer AS ouvert,
+                       COALESCE(d.{sortie} >= %(jour)s AND d.{sortie} < %(jour)s::date + 1, FALSE)::integer AS termine
+                  FROM {Dossier._table} d
+                 WHERE d.{agent} IS NOT NULL"""
+            for etat, agent, sortie in ETAPES_AFFECTATION.values()
+        )
+        condition = 'c2.agent_id = ANY(%(agents)s)' if user_ids is not None else 'TRUE'
+
+        self.env.cr.execute(f"""
+            UPDATE {self._table} c
+               SET taches_ouvertes = s.ouverts,
+                   debit_jour = s.termines,
+                   date_debit = %(jour)s
+              FROM (SELECT c2.agent_id,
+                           COALESCE(SUM(t.ouvert), 0) AS ouverts,
+                           COALESCE(SUM(t.termine), 0) AS termines
+                      FROM {self._table} c2
+                      LEFT JOIN ({charges_sql}) t ON t.agent_id = c2.agent_id
+                     WHERE {condition}
+                     GROUP BY c2.agent_id) s
+             WHERE c.agent_id = s.agent_id
+        """, {'jour': fields.Date.today(), 'agents': list(user_ids or [])})
+        self.invalidate_model(['taches_ouvertes', 'debit_jour', 'date_debit'])
+
+    # === MISE À JOUR INCRÉMENTALE ===
+    @api.model
+    def _appliquer_contributions(self, avant, apres):
+        """Applique la différence de charge {agent_id: mesures} de dossiers modifiés"""
+        deltas = []
+        for agent_id in set(avant) | set(apres):
+            mesures_avant = avant.get(agent_id, {})
+            mesures_apres = apres.get(agent_id, {})
+            delta = [mesures_apres.get(m, 0) - mesures_avant.get(m, 0) for m in ('taches_ouvertes', 'debit_jour')]
+            if any(delta):
+                deltas.append((agent_id, *delta))
+
+        if not deltas:
+            return
+
+        lignes_sql = ', '.join(['(%s, %s, %s)'] * len(deltas))
+        self.env.cr.execute(f"""
+            UPDATE {self._table} c
+               SET taches_ouvertes = GREATEST(c.taches_ouvertes + v.taches, 0),
+                   debit_jour = GREATEST(CASE WHEN c.date_debit = %s THEN c.debit_jour ELSE 0 END + v.debit, 0),
+                   date_debit = %s
+              FROM (VALUES {lignes_sql}) AS v(agent_id, taches, debit)
+             WHERE c.agent_id = v.agent_id
+        """, [fields.Date.today(), fields.Date.today()] + [valeur for delta in deltas for valeur in delta])
+        self.invalidate_model(['taches_ouvertes', 'debit_jour', 'date_debit'])
+
+    # === CHOIX DES AGENTS ===
+    @api.model
+    def _get_plafond_dossiers(self):
+        plafond = self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.dossiers_max_par_agent', DOSSIERS_MAX_PAR_AGENT
+        )
+        return int(plafond)
+
+    @api.model
+    def _condition_presence(self):
+        """Condition SQL (et paramètres) des agents présents : actifs, disponibles et hors congé"""
+        aujourd_hui = fields.Date.today()
+        condition = """
+            c.actif AND c.disponible AND NOT COALESCE(c.en_conge, FALSE)
+            AND NOT COALESCE(c.date_debut_conge <= %s AND %s <= c.date_fin_conge, FALSE)
+        """
+        return condition, [aujourd_hui, aujourd_hui]
+
+    @api.model
+    def _condition_disponibilite(self):
+        """Condition SQL (et paramètres) des agents disponibles à l'instant présent"""
+        maintenant = datetime.now()
+        heure_actuelle = maintenant.hour + maintenant.minute / 60.0
+        jour_semaine = maintenant.weekday()  # 0 = Lundi, 6 = Dimanche
+        jours_ouvres = ['personnalise']
+        if jour_semaine <= 4:
+            jours_ouvres.append('lundi_vendredi')
+        if jour_semaine <= 5:
+            jours_ouvres.append('lundi_samedi')
+
+        condition, params = self._condition_presence()
+        condition += """
+            AND %s BETWEEN c.horaire_debut AND c.horaire_fin
+            AND COALESCE(c.jours_travail, 'personnalise') = ANY(%s)
+        """
+        return condition, params + [heure_actuelle, jours_ouvres]
+
+    @api.model
+    def _get_agents_disponibles(self, specialite, limit=None, plafond=None):
+        """Retourne [(agent_id, taches_ouvertes, debit_jour, vitesse)] des agents disponibles, du moins chargé au plus chargé.
+
+        La requête suit l'index (spécialité, dossiers ouverts) et s'arrête au
+        premier agent disponible lorsque limit vaut 1. Avec un plafond, les
+        agents ayant déjà ce nombre de dossiers ouverts sont exclus.
+        """
+        self.flush_model()
+        Users = self.env['res.users']
+        condition, params = self._condition_disponibilite()
+        if plafond is not None:
+            condition += " AND c.taches_ouvertes < %s"
+            params.append(plafond)
+        requete = f"""
+            SELECT c.agent_id, c.taches_ouvertes,
+                   CASE WHEN c.date_debit = %s THEN c.debit_jour ELSE 0 END AS debit,
+                   COALESCE(u.vitesse_moyenne_travail, 0)
+              FROM {self._table} c
+              JOIN {Users._table} u ON u.id = c.agent_id
+             WHERE c.specialite = %s AND {condition}
+             ORDER BY c.taches_ouvertes, debit, c.agent_id
+        """
+        params = [fields.Date.today(), specialite] + params
+        if limit:
+            requete += " LIMIT %s"
+            params.append(limit)
+        self.env.cr.execute(requete, params)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def get_meilleur_agent(self, specialite):
+        """Retourne l'agent disponible le moins chargé d'une spécialité (res.users, vide si aucun)"""
+        agents = self._get_agents_disponibles(specialite, limit=1)
+        return self.env['res.users'].browse(agents[0][0] if agents else [])
+
+    @api.model
+    def affecter_dossiers(self, dossiers, specialite, agents=None):
+        """Répartit des dossiers entre les agents disponibles d'une spécialité.
+
+        Chaque dossier va à l'agent qui le terminerait le plus tôt : dossiers
+        ouverts (lot en cours compris) rapportés à sa vitesse observée relative
+        à celle de l'équipe. Un agent sans historique compte pour la vitesse
+        moyenne. Aucun agent ne dépasse le plafond de dossiers ouverts ; les
+        dossiers en surplus restent sans responsable. L'affectation est un bail :
+        non démarré à son échéance, le dossier retourne dans la file commune.
+        Une écriture par agent ; retourne {dossier_id: agent_id}.
+        """
+        if not dossiers or specialite not in ETAPES_AFFECTATION:
+            return {}
+
+        plafond = self._get_plafond_dossiers()
+        if agents is None:
+            agents = self._get_agents_disponibles(specialite, plafond=plafond)
+        if not agents:
+            return {}
+
+        vitesses = [vitesse for _agent_id, _ouvertes, _debit, vitesse in agents if vitesse > 0]
+        vitesse_equipe = sum(vitesses) / len(vitesses) if vitesses else 1.0
+        tas = []
+        for agent_id, ouvertes, debit, vitesse in agents:
+            vitesse_relative = vitesse / vitesse_equipe if vitesse > 0 else 1.0
+            tas.append(((ouvertes + 1) / vitesse_relative, ouvertes, debit, agent_id, vitesse_relative))
+        heapq.heapify(tas)
+
+        affectations = {}
+        dossiers_par_agent = defaultdict(list)
+        for dossier_id in dossiers.ids:
+            if not tas:
+                break
+            _fin, ouvertes, debit, agent_id, vitesse_relative = tas[0]
+            if ouvertes + 1 >= plafond:
+                heapq.heappop(tas)
+            else:
+                heapq.heapreplace(
+                    tas, ((ouvertes + 2) / vitesse_relative, ouvertes + 1, debit, agent_id, vitesse_relative)
+                )
+            affectations[dossier_id] = agent_id
+            dossiers_par_agent[agent_id].append(dossier_id)
+
+        champ_agent = ETAPES_AFFECTATION[specialite][1]
+        echeance = fields.Datetime.now() + timedelta(minutes=self.env['dossier.collecteur']._get_duree_affectation())
+        for agent_id, dossier_ids in dossiers_par_agent.items():
+            dossiers.browse(dossier_ids).write({
+                champ_agent: agent_id,
+                'reserve_par_id': False,
+                'date_expiration_reservation': echeance,
+            })
+        return affectations
+
+    @api.model
+    def _affectation_automatique_active(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.affectation_automatique', 'True'
+        ))
+
+    @api.model
+    def affecter_dossiers_en_attente(self):
+        """Complète le portefeuille des agents disponibles avec la file commune.
+
+        Rattrape les dossiers arrivés quand aucun agent n'était disponible
+        (hors horaires, congés, plafond atteint) et ceux dont l'affectation a
+        expiré sans être démarrée. Seuls les dossiers qui tiennent sous le
+        plafond des agents disponibles sont lus, dans l'ordre de la file de
+        travail (reserver_prochain_dossier).
+        """
+        self._liberer_dossiers_agents_absents()
+
+        Dossier = self.env['dossier.collecteur']
+        plafond = self._get_plafond_dossiers()
+        affectations = {}
+        for specialite in ETAPES_AFFECTATION:
+            agents = self._get_agents_disponibles(specialite, plafond=plafond)
+            places = sum(plafond - ouvertes for _agent_id, ouvertes, _debit, _vitesse in agents)
+            if not places:
+                continue
+            dossiers = Dossier._rechercher_file_commune(specialite, places)
+            affectations.update(self.affecter_dossiers(dossiers, specialite, agents))
+        return affectations
+
+    @api.model
+    def _liberer_dossiers_agents_absents(self):
+        """Remet sans responsable les dossiers non démarrés des agents absents.
+
+        Un agent inactif, indisponible ou en congé rend les dossiers qu'il n'a
+        pas commencés ; ils sont réaffectés aux agents présents. Les dossiers
+        réservés en ce moment par un autre traitement sont laissés pour le
+        passage suivant (SKIP LOCKED).
+        """
+        Dossier = self.env['dossier.collecteur']
+        Dossier.flush_model()
+        self.flush_model()
+        condition, params = self._condition_presence()
+        for specialite, (etat, champ_agent, _sortie) in ETAPES_AFFECTATION.items():
+            self.env.cr.execute(f"""
+                SELECT d.id
+                  FROM {Dossier._table} d
+                  JOIN {self._table} c ON c.agent_id = d.{champ_agent}
+                 WHERE d.state = %s
+                   AND {Dossier._sql_etape_non_demarree(specialite)}
+                   AND NOT ({condition})
+                   FOR UPDATE OF d SKIP LOCKED
+            """, [etat] + params)
+            dossier_ids = [ligne[0] for ligne in self.env.cr.fetchall()]
+            Dossier.browse(dossier_ids).write({
+                champ_agent: False,
+                'reserve_par_id': False,
+                'date_expiration_reservation': False,
+            })
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_synchroniser_charges(self):
+        """Reconstruit l'index de charge (rattrapage et changement de jour)"""
+        self._synchroniser()
+        return True
+
+    @api.model
+    def cron_affecter_dossiers(self):
+        """Affectation automatique des dossiers en attente de responsable"""
+        if self._affectation_automatique_active():
+            self.affecter_dossiers_en_attente()
+        return True
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+
+from .reporting_kpi import ETAPES_KPI
+
+
+class AgentStatistiqueMensuelle(models.Model):
+    _name = 'agent.statistique.mensuelle'
+    _description = 'Compteurs Mensuels de Production par Agent'
+    _order = 'mois desc, agent_id, etape'
+
+    agent_id = fields.Many2one(
+        'res.users',
+        string='Agent',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    mois = fields.Date(
+        string='Mois',
+        required=True,
+        readonly=True,
+        index=True,
+        help="Premier jour du mois"
+    )
+
+    etape = fields.Selection([
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation')
+    ], string='Étape', required=True, readonly=True)
+
+    nombre = fields.Integer(string='Opérations Validées', readonly=True, group_operator='sum')
+    nombre_erreurs = fields.Integer(string='Erreurs', readonly=True, group_operator='sum')
+    nombre_pieces = fields.Integer(string='Pièces', readonly=True, group_operator='sum')
+    duree_totale = fields.Float(string='Durée Effective Totale (min)', readonly=True, group_operator='sum')
+    vitesse_totale = fields.Float(string='Somme des Vitesses', readonly=True, group_operator='sum')
+
+    a_reporter = fields.Boolean(
+        string='À Reporter',
+        readonly=True,
+        help="Compteur modifié depuis la dernière mise à jour des statistiques stockées de l'agent"
+    )
+
+    def init(self):
+        sql.create_unique_index(
+            self.env.cr, 'agent_statistique_mensuelle_cle_uniq', self._table, ['agent_id', 'mois', 'etape']
+        )
+        sql.create_index(
+            self.env.cr, 'agent_statistique_mensuelle_a_reporter_idx', self._table, ['agent_id'], where='a_reporter'
+        )
+
+    # === MISE À JOUR INCRÉMENTALE ===
+    @api.model
+    def _appliquer_contributions(self, avant, apres):
+        """Reporte les contributions journalières d'une étape sur les compteurs mensuels.
+
+        Reçoit les contributions au format du cumul journalier
+        {(date, etape, agent_id): mesures}. Les compteurs modifiés sont marqués
+        à reporter : les statistiques stockées sur res.users sont mises à jour
+        par cron_rafraichir_statistiques, pas dans la transaction de l'étape.
+        """
+        deltas = defaultdict(lambda: defaultdict(float))
+        for contributions, signe in ((avant, -1), (apres, 1)):
+            for (jour, etape, agent_id), mesures in contributions.items():
+                if not agent_id:
+                    continue
+                delta = deltas[(agent_id, jour.replace(day=1), etape)]
+                for mesure in ('nombre', 'nombre_erreurs', 'nombre_pieces', 'duree_totale', 'vitesse_totale'):
+                    delta[mesure] += signe * mesures.get(mesure, 0)
+
+        lignes = [cle + (
+            delta['nombre'], delta['nombre_erreurs'], delta['nombre_pieces'],
+            delta['duree_totale'], delta['vitesse_totale'],
+        ) for cle, delta in deltas.items() if any(delta.values())]
+        if not lignes:
+            return
+
+        lignes_sql = ', '.join(['(%s, %s::date, %s, %s, %s, %s, %s::float8, %s::float8)'] * len(lignes))
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (agent_id, mois, etape, nombre, nombre_erreurs, nombre_pieces, duree_totale, vitesse_totale,
+                    a_reporter, create_uid, create_date, write_uid, write_date)
+            SELECT v.*, TRUE, %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM (VALUES {lignes_sql}) AS v
+            ON CONFLICT (agent_id, mois, etape)
+            DO UPDATE SET nombre = t.nombre + EXCLUDED.nombre,
+                          nombre_erreurs = t.nombre_erreurs + EXCLUDED.nombre_erreurs,
+                          nombre_pieces = t.nombre_pieces + EXCLUDED.nombre_pieces,
+                          duree_totale = t.duree_totale + EXCLUDED.duree_totale,
+                          vitesse_totale = t.vitesse_totale + EXCLUDED.vitesse_totale,
+                          a_reporter = TRUE,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+        """, [self.env.uid, self.env.uid] + [valeur for ligne in lignes for valeur in ligne])
+        self.invalidate_model()
+
+    @api.model
+    def _extraire_agents_a_reporter(self):
+        """Retourne les agents dont un compteur a changé et lève leur marque"""
+        self.flush_model(['a_reporter'])
+        self.env.cr.execute(f"""
+            UPDATE {self._table} SET a_reporter = FALSE WHERE a_reporter RETURNING agent_id
+        """)
+        agent_ids = {agent_id for agent_id, in self.env.cr.fetchall()}
+        self.invalidate_model(['a_reporter'])
+        return agent_ids
+
+    # === RECONSTRUCTION (BACKFILL) ===
+    @api.model
+    def reconstruire(self):
+        """Reconstruit les compteurs mensuels à partir du cumul journalier"""
+        Journalier = self.env['reporting.kpi.journalier']
+        Journalier.flush_model()
+        self.env.cr.execute(f"DELETE FROM {self._table}")
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table}
+                   (agent_id, mois, etape, nombre, nombre_erreurs, nombre_pieces, duree_totale, vitesse_totale,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT j.agent_id, date_trunc('month', j.date)::date, j.etape,
+                   SUM(j.nombre), SUM(j.nombre_erreurs), SUM(j.nombre_pieces),
+                   SUM(j.duree_totale), SUM(j.vitesse_totale),
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM {Journalier._table} j
+             WHERE j.agent_id IS NOT NULL AND j.etape = ANY(%s)
+             GROUP BY j.agent_id, date_trunc('month', j.date)::date, j.etape
+        """, [self.env.uid, self.env.uid, list(ETAPES_KPI)])
+        self.invalidate_model()
+        self.env['res.users']._rafraichir_statistiques()
+        return True
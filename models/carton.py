@@ -4,14 +4,19 @@ from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from datetime import datetime
 
+from .constantes import RANGS_PRIORITE
+
 
 class CartonNumerisation(models.Model):
     _name = 'carton.numerisation'
     _description = 'Carton de Numérisation'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'compteur.delta.mixin']
     _order = 'numero_carton desc'
     _rec_name = 'numero_carton'
 
+    # Compteur de dossiers maintenu par variations
+    _compteurs = ('compteur_dossiers',)
+
     # === IDENTIFICATION ===
     numero_carton = fields.Char(
         string='N° Carton', 
@@ -74,10 +79,16 @@ class CartonNumerisation(models.Model):
     nombre_dossiers = fields.Integer(
         string='Nombre de Dossiers',
         compute='_compute_nombre_dossiers',
-        store=True,
         help="Nombre de dossiers actuellement dans le carton"
     )
     
+    compteur_dossiers = fields.Integer(
+        string='Nombre de Dossiers (consolidé)',
+        readonly=True,
+        copy=False,
+        help="Mis à jour par variations (compteur.delta) : ajouter ou retirer un dossier n'écrit pas la ligne du carton"
+    )
+    
     taux_remplissage = fields.Float(
         string='Taux de Remplissage (%)',
         compute='_compute_taux_remplissage',
@@ -111,7 +122,6 @@ class CartonNumerisation(models.Model):
     nombre_pieces_total = fields.Integer(
         string='Nombre Total de Pièces',
         compute='_compute_nombre_pieces_total',
-        store=True,
         help="Nombre total de pièces numérisées dans le carton"
     )
     
@@ -127,6 +137,14 @@ class CartonNumerisation(models.Model):
         ('critique', 'Critique')
     ], string='Priorité', default='normale', tracking=True)
     
+    rang_priorite = fields.Integer(
+        string='Rang de Priorité',
+        compute='_compute_rang_priorite',
+        store=True,
+        index=True,
+        help="0 = critique, 1 = urgente, 2 = normale ; ordre de la file des cartons à numériser"
+    )
+    
     # === NOTES ===
     notes = fields.Text(
         string='Notes',
@@ -139,10 +157,16 @@ class CartonNumerisation(models.Model):
     )
     
     # === MÉTHODES DE CALCUL ===
+    @api.depends('priorite')
+    def _compute_rang_priorite(self):
+        for record in self:
+            record.rang_priorite = RANGS_PRIORITE.get(record.priorite, RANGS_PRIORITE['normale'])
+    
     @api.depends('dossier_ids')
     def _compute_nombre_dossiers(self):
+        compteurs = self._get_compteurs()
         for record in self:
-            record.nombre_dossiers = len(record.dossier_ids)
+            record.nombre_dossiers = compteurs[record.id]['compteur_dossiers']
     
     @api.depends('nombre_dossiers', 'capacite_max')
     def _compute_taux_remplissage(self):
@@ -168,15 +192,33 @@ class CartonNumerisation(models.Model):
     
     @api.depends('dossier_ids.nombre_pieces')
     def _compute_nombre_pieces_total(self):
+        """Somme des pièces des dossiers, en une requête groupée pour tous les cartons"""
+        pieces = {}
+        if self.ids:
+            groupes = self.env['dossier.collecteur'].read_group(
+                [('carton_id', 'in', self.ids)], ['carton_id', 'nombre_pieces:sum'], ['carton_id'], lazy=False
+            )
+            pieces = {groupe['carton_id'][0]: groupe['nombre_pieces'] for groupe in groupes}
         for record in self:
-            record.nombre_pieces_total = sum(record.dossier_ids.mapped('nombre_pieces'))
+            record.nombre_pieces_total = pieces.get(record.id, 0)
+    
+    def _get_requete_compteurs(self):
+        Dossier = self.env['dossier.collecteur']
+        return f"""
+            SELECT c.id, COUNT(d.id) AS compteur_dossiers
+              FROM {self._table} c
+              LEFT JOIN {Dossier._table} d ON d.carton_id = c.id
+             GROUP BY c.id
+        """
     
     # === MÉTHODES CRUD ===
-    @api.model
-    def create(self, vals):
-        if not vals.get('numero_carton'):
-            vals['numero_carton'] = self._generate_numero_carton()
-        return super(CartonNumerisation, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        sans_numero = [vals for vals in vals_list if not vals.get('numero_carton')]
+        numeros = iter(self.env['ir.sequence'].next_by_code_lot('carton.numerisation', len(sans_numero)))
+        for vals in sans_numero:
+            vals['numero_carton'] = next(numeros, None) or self._generate_numero_carton()
+        return super(CartonNumerisation, self).create(vals_list)
     
     def _generate_numero_carton(self):
         """Génère automatiquement un numéro de carton"""
@@ -298,9 +340,7 @@ class CartonNumerisation(models.Model):
         self.state = 'termine'
         
         # Passer tous les dossiers du carton à l'état numérisation
-        for dossier in self.dossier_ids:
-            if dossier.state == 'transfert':
-                dossier.action_valider_transfert()
+        self.dossier_ids.filtered(lambda d: d.state == 'transfert').action_valider_transfert()
         
         self.message_post(
             body=_("Carton terminé avec %d dossiers - Prêt pour numérisation") % self.nombre_dossiers,
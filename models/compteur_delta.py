@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+
+class CompteurDelta(models.Model):
+    _name = 'compteur.delta'
+    _description = 'Variation de Compteur en Attente de Consolidation'
+    _log_access = False
+
+    res_model = fields.Char(string='Modèle', required=True, readonly=True)
+    res_id = fields.Integer(string='Enregistrement', required=True, readonly=True)
+    compteur = fields.Char(string='Compteur', required=True, readonly=True)
+    valeur = fields.Integer(string='Variation', readonly=True)
+
+    def init(self):
+        sql.create_index(self.env.cr, 'compteur_delta_res_idx', self._table, ['res_model', 'res_id'])
+        # Remise à plat des compteurs consolidés à chaque mise à jour du module
+        self.pool.post_init(self._reconstruire_compteurs)
+
+    # === MISE À JOUR INCRÉMENTALE ===
+    @api.model
+    def _appliquer_contributions(self, avant, apres):
+        """Ajoute au journal la différence {(modèle, id, compteur): valeur} de dossiers modifiés.
+
+        Insertion seule : les transactions concurrentes ne modifient jamais la
+        même ligne, la ligne parente n'est écrite que par la consolidation.
+        """
+        lignes = []
+        for cle in set(avant) | set(apres):
+            delta = apres.get(cle, 0) - avant.get(cle, 0)
+            if delta:
+                lignes.append(cle + (delta,))
+        if not lignes:
+            return
+
+        lignes_sql = ', '.join(['(%s, %s, %s, %s)'] * len(lignes))
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (res_model, res_id, compteur, valeur)
+            VALUES {lignes_sql}
+        """, [valeur for ligne in lignes for valeur in ligne])
+
+    # === CONSOLIDATION ===
+    @api.model
+    def _get_modeles_compteurs(self):
+        return [
+            self.env[nom_modele]
+            for nom_modele in self.env.registry.descendants(['compteur.delta.mixin'], '_inherit')
+            if not self.env[nom_modele]._abstract
+        ]
+
+    @api.model
+    def _reconstruire_compteurs(self):
+        for modele in self._get_modeles_compteurs():
+            modele._reconstruire_compteurs()
+
+    @api.model
+    def cron_consolider_compteurs(self):
+        """Reporte le journal des variations sur les compteurs consolidés"""
+        for modele in self._get_modeles_compteurs():
+            _logger.info("Consolidation des compteurs de %s", modele._name)
+            modele._consolider_compteurs()
+        return True
+
+
+class CompteurDeltaMixin(models.AbstractModel):
+    _name = 'compteur.delta.mixin'
+    _description = 'Compteurs Maintenus par Variations'
+
+    # Colonnes consolidées (champs Integer stockés du modèle), alimentées par compteur.delta
+    _compteurs = ()
+
+    # Chaque modèle concret définit _get_requete_compteurs() : la requête
+    # SELECT id, <compteurs> qui recalcule les compteurs de tous ses enregistrements
+
+    def _get_compteurs(self):
+        """Retourne {id: {compteur: valeur}} : valeur consolidée et variations en attente"""
+        Delta = self.env['compteur.delta']
+        compteurs = {
+            record.id: {compteur: record[compteur] for compteur in self._compteurs}
+            for record in self
+        }
+        ids = [record_id for record_id in compteurs if record_id]
+        if not ids:
+            return compteurs
+
+        self.env.cr.execute(f"""
+            SELECT res_id, compteur, SUM(valeur)
+              FROM {Delta._table}
+             WHERE res_model = %s AND res_id = ANY(%s)
+             GROUP BY res_id, compteur
+        """, [self._name, ids])
+        for res_id, compteur, valeur in self.env.cr.fetchall():
+            if compteur in compteurs[res_id]:
+                compteurs[res_id][compteur] += valeur
+        return compteurs
+
+    @api.model
+    def _consolider_compteurs(self):
+        """Vide le journal du modèle et l'ajoute aux colonnes consolidées, en une requête"""
+        Delta = self.env['compteur.delta']
+        colonnes = ', '.join(
+            f"SUM(valeur) FILTER (WHERE compteur = '{compteur}') AS {compteur}" for compteur in self._compteurs
+        )
+        affectations = ', '.join(
+            f"{compteur} = COALESCE(p.{compteur}, 0) + COALESCE(s.{compteur}, 0)" for compteur in self._compteurs
+        )
+        self.flush_model(list(self._compteurs))
+        self.env.cr.execute(f"""
+            WITH d AS (
+                DELETE FROM {Delta._table} WHERE res_model = %s RETURNING res_id, compteur, valeur
+            ), s AS (
+                SELECT res_id, {colonnes} FROM d GROUP BY res_id
+            )
+            UPDATE {self._table} p
+               SET {affectations}
+              FROM s
+             WHERE p.id = s.res_id
+        """, [self._name])
+        self.invalidate_model(list(self._compteurs))
+
+    @api.model
+    def _reconstruire_compteurs(self):
+        """Recalcule les compteurs consolidés depuis les dossiers et vide le journal du modèle"""
+        Delta = self.env['compteur.delta']
+        self.env.flush_all()
+        self.env.cr.execute(f"DELETE FROM {Delta._table} WHERE res_model = %s", [self._name])
+        affectations = ', '.join(f"{compteur} = s.{compteur}" for compteur in self._compteurs)
+        self.env.cr.execute(f"""
+            UPDATE {self._table} p
+               SET {affectations}
+              FROM ({self._get_requete_compteurs()}) s
+             WHERE p.id = s.id
+        """)
+        self.invalidate_model(list(self._compteurs))
+        return True
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Constantes du workflow partagées entre modèles.
+
+Module sans modèle : l'importer ne change pas l'ordre d'enregistrement des
+modèles, donc l'ordre de création des tables et des vues SQL.
+"""
+
+# Par état du workflow : zone physique du dossier, date d'entrée dans l'état
+# et date de sortie de l'état sur dossier.collecteur
+ETATS_ENCOURS = {
+    'reception': ('reception', 'date_reception', 'date_debut_traitement'),
+    'traitement': ('traitement', 'date_debut_traitement', 'date_fin_traitement'),
+    'transfert': ('traitement', 'date_fin_traitement', 'date_transfert'),
+    'numerisation': ('numerisation', 'date_transfert', 'date_fin_numerisation'),
+    'indexation': ('indexation', 'date_fin_numerisation', 'date_fin_indexation'),
+    'livraison': ('livraison', 'date_fin_indexation', 'date_livraison'),
+}
+
+ZONES_ENCOURS = [
+    ('reception', 'Zone de Réception'),
+    ('traitement', 'Zone de Traitement Physique'),
+    ('numerisation', 'Zone de Numérisation'),
+    ('indexation', "Zone d'Indexation"),
+    ('livraison', 'Zone de Livraison'),
+]
+
+ETATS_SELECTION = [
+    ('reception', 'Réception'),
+    ('traitement', 'Traitement Physique'),
+    ('transfert', 'Transfert Numérisation'),
+    ('numerisation', 'Numérisation'),
+    ('indexation', 'Indexation'),
+    ('livraison', 'Livraison Numérique'),
+]
+
+
+# Par spécialité : état du dossier pendant l'étape, responsable de l'étape et
+# date de sortie de l'étape sur dossier.collecteur
+ETAPES_AFFECTATION = {
+    'traitement': ('traitement', 'agent_traitement_id', 'date_fin_traitement'),
+    'numerisation': ('numerisation', 'operateur_numerisation_id', 'date_fin_numerisation'),
+    'indexation': ('indexation', 'agent_indexation_id', 'date_fin_indexation'),
+}
+
+CHAMPS_AFFECTATION = frozenset(
+    champ for _etat, agent, sortie in ETAPES_AFFECTATION.values() for champ in (agent, sortie)
+)
+
+
+# Files d'attente entre deux étapes : (file, date d'entrée, date de sortie) sur dossier.collecteur
+FILES_ATTENTE = [
+    ('traitement', 'date_reception', 'date_debut_traitement'),
+    ('transfert', 'date_fin_traitement', 'date_transfert'),
+    ('numerisation', 'date_transfert', 'date_debut_numerisation'),
+    ('indexation', 'date_fin_numerisation', 'date_debut_indexation'),
+    ('livraison', 'date_fin_indexation', 'date_livraison'),
+]
+
+CHAMPS_ATTENTE = frozenset(champ for _file, entree, sortie in FILES_ATTENTE for champ in (entree, sortie))
+
+
+# Rang de traitement des priorités dans les files de travail (le plus petit d'abord)
+RANGS_PRIORITE = {'critique': 0, 'urgente': 1, 'normale': 2}
+
+
+# Canal du bus (temps réel) d'une étape et champs dont la modification met à jour les files ouvertes
+CANAL_FILE_ETAPE = 'archivage_file_%s'
+CHAMPS_FILE_ETAPE = frozenset(['state', 'priorite', 'reserve_par_id']) | CHAMPS_AFFECTATION
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+
+from .constantes import CHAMPS_ATTENTE, FILES_ATTENTE
+
+
+class DossierAttente(models.Model):
+    _name = 'dossier.attente'
+    _description = "Temps d'Attente d'un Dossier entre deux Étapes"
+    _order = 'date_entree desc'
+    _rec_name = 'dossier_id'
+
+    dossier_id = fields.Many2one(
+        'dossier.collecteur',
+        string='Dossier',
+        required=True,
+        readonly=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    file = fields.Selection([
+        ('traitement', 'Attente Traitement'),
+        ('transfert', 'Attente Transfert'),
+        ('numerisation', 'Attente Numérisation'),
+        ('indexation', 'Attente Indexation'),
+        ('livraison', 'Attente Livraison')
+    ], string="File d'Attente", required=True, readonly=True, index=True,
+        help="Étape attendue par le dossier")
+
+    date_entree = fields.Datetime(
+        string='Entrée en File',
+        required=True,
+        readonly=True,
+        help="Fin de l'étape précédente"
+    )
+
+    date_sortie = fields.Datetime(
+        string='Sortie de File',
+        readonly=True,
+        index=True,
+        help="Début de l'étape attendue (vide tant que le dossier attend)"
+    )
+
+    duree_attente = fields.Float(
+        string="Durée d'Attente (min)",
+        readonly=True,
+        group_operator='avg',
+        help="Temps passé par le dossier dans la file"
+    )
+
+    en_attente = fields.Boolean(
+        string='En Attente',
+        readonly=True,
+        help="Le dossier est toujours dans la file"
+    )
+
+    code_agence = fields.Char(
+        related='dossier_id.code_agence',
+        string='Code Agence'
+    )
+
+    def init(self):
+        sql.create_unique_index(self.env.cr, 'dossier_attente_dossier_file_uniq', self._table, ['dossier_id', 'file'])
+        # Dossiers encore en file : petite partie de l'historique, lue par les KPIs des files
+        sql.create_index(
+            self.env.cr, 'dossier_attente_en_attente_idx', self._table, ['file', 'date_entree'], where='en_attente'
+        )
+
+    # === SYNCHRONISATION ===
+    @api.model
+    def _synchroniser(self, dossier_ids=None):
+        """Met à jour les attentes des dossiers à partir de leurs dates de suivi.
+
+        Une requête INSERT ... ON CONFLICT pour toutes les files de tous les
+        dossiers, puis suppression des attentes dont la date d'entrée a disparu.
+        Sans liste de dossiers, tous les dossiers sont resynchronisés.
+        """
+        Dossier = self.env['dossier.collecteur']
+        Dossier.flush_model(list(CHAMPS_ATTENTE))
+        self.flush_model()
+
+        files_sql = ', '.join(
+            f"('{file}', d.{entree}, d.{sortie})" for file, entree, sortie in FILES_ATTENTE
+        )
+        condition = 'd.id = ANY(%s)' if dossier_ids is not None else 'TRUE'
+        params = [list(dossier_ids)] if dossier_ids is not None else []
+
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (dossier_id, file, date_entree, date_sortie, duree_attente, en_attente,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT d.id, f.file, f.entree, f.sortie,
+                   CASE WHEN f.sortie IS NOT NULL
+                        THEN GREATEST(EXTRACT(EPOCH FROM (f.sortie - f.entree)) / 60, 0)
+                   END,
+                   f.sortie IS NULL,
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM {Dossier._table} d
+             CROSS JOIN LATERAL (VALUES {files_sql}) AS f(file, entree, sortie)
+             WHERE {condition} AND f.entree IS NOT NULL
+            ON CONFLICT (dossier_id, file)
+            DO UPDATE SET date_entree = EXCLUDED.date_entree,
+                          date_sortie = EXCLUDED.date_sortie,
+                          duree_attente = EXCLUDED.duree_attente,
+                          en_attente = EXCLUDED.en_attente,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+            WHERE (t.date_entree, t.date_sortie) IS DISTINCT FROM (EXCLUDED.date_entree, EXCLUDED.date_sortie)
+        """, [self.env.uid, self.env.uid] + params)
+
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table} a
+             USING {Dossier._table} d
+                   CROSS JOIN LATERAL (VALUES {files_sql}) AS f(file, entree, sortie)
+             WHERE a.dossier_id = d.id AND a.file = f.file
+               AND f.entree IS NULL AND {condition}
+        """, params)
+
+        self.invalidate_model()
+
+    # === KPIs ===
+    @api.model
+    def get_kpis_files_attente(self, date_debut=None, date_fin=None):
+        """Retourne les KPIs de chaque file d'attente en une requête groupée.
+
+        Les attentes terminées sont comptées sur leur date de sortie dans la
+        période ; les dossiers encore en attente sont comptés à l'instant présent.
+        Seules ces lignes sont lues (index sur date_sortie et index partiel des
+        dossiers en attente), pas tout l'historique des files.
+        Retourne {file: {'nombre', 'attente_moyenne', 'attente_p90', 'attente_max',
+        'en_attente', 'age_max_en_attente'}} (durées en minutes).
+        """
+        self.flush_model()
+        periode = ['a.date_sortie IS NOT NULL']
+        params = []
+        if date_debut:
+            periode.append('a.date_sortie >= %s')
+            params.append(date_debut)
+        if date_fin:
+            periode.append('a.date_sortie < %s::date + 1')
+            params.append(date_fin)
+        filtre = ' AND '.join(periode)
+
+        self.env.cr.execute(f"""
+            SELECT a.file,
+                   COUNT(*) FILTER (WHERE {filtre}),
+                   AVG(a.duree_attente) FILTER (WHERE {filtre}),
+                   PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY a.duree_attente) FILTER (WHERE {filtre}),
+                   MAX(a.duree_attente) FILTER (WHERE {filtre}),
+                   COUNT(*) FILTER (WHERE a.en_attente),
+                   MAX(EXTRACT(EPOCH FROM ((NOW() AT TIME ZONE 'UTC') - a.date_entree)) / 60)
+                       FILTER (WHERE a.en_attente)
+              FROM {self._table} a
+             WHERE a.en_attente OR ({filtre})
+             GROUP BY a.file
+        """, params * 5)
+
+        kpis = {
+            file: {
+                'nombre': 0, 'attente_moyenne': 0, 'attente_p90': 0, 'attente_max': 0,
+                'en_attente': 0, 'age_max_en_attente': 0,
+            }
+            for file, _entree, _sortie in FILES_ATTENTE
+        }
+        for file, nombre, moyenne, p90, maximum, en_attente, age_max in self.env.cr.fetchall():
+            kpis[file] = {
+                'nombre': nombre,
+                'attente_moyenne': float(moyenne or 0),
+                'attente_p90': float(p90 or 0),
+                'attente_max': float(maximum or 0),
+                'en_attente': en_attente,
+                'age_max_en_attente': float(age_max or 0),
+            }
+        return kpis
+
+    @api.model
+    def get_goulot_etranglement(self, date_debut=None, date_fin=None):
+        """Retourne la file d'attente dont le temps d'attente P90 est le plus élevé"""
+        kpis = self.get_kpis_files_attente(date_debut, date_fin)
+        return max(kpis, key=lambda file: kpis[file]['attente_p90'])
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_synchroniser_attentes(self):
+        """Resynchronise toutes les attentes (rattrapage des écritures SQL directes)"""
+        self._synchroniser()
+        return True
@@ -2,16 +2,57 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 from datetime import datetime, timedelta
+from collections import defaultdict
+
+from .constantes import (
+    CANAL_FILE_ETAPE, CHAMPS_AFFECTATION, CHAMPS_ATTENTE, CHAMPS_FILE_ETAPE, ETAPES_AFFECTATION, ETATS_ENCOURS,
+    RANGS_PRIORITE,
+)
+
+# Durée par défaut d'une réservation de dossier dans une file de travail (minutes)
+DUREE_RESERVATION = 30
+
+# Durée par défaut d'une affectation automatique non démarrée avant le retour du dossier dans la file commune (minutes)
+DUREE_AFFECTATION = 240
+
+# Nombre maximal de dossiers cités dans le message d'erreur d'une transition de lot
+LIMITE_DOSSIERS_CITES = 10
+
+# Délai cible (SLA) en heures pour sortir de chaque état, selon la priorité
+DELAIS_SLA = {
+    'reception': {'normale': 24, 'urgente': 8, 'critique': 4},
+    'traitement': {'normale': 48, 'urgente': 24, 'critique': 8},
+    'transfert': {'normale': 24, 'urgente': 8, 'critique': 4},
+    'numerisation': {'normale': 48, 'urgente': 24, 'critique': 8},
+    'indexation': {'normale': 48, 'urgente': 24, 'critique': 8},
+    'livraison': {'normale': 24, 'urgente': 12, 'critique': 4},
+}
 
 
 class DossierCollecteur(models.Model):
     _name = 'dossier.collecteur'
     _description = 'Dossier Collecteur - Workflow Complet'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'reporting.kpi.journalier.mixin', 'action.masse.mixin']
     _order = 'numero_dossier desc'
     _rec_name = 'numero_dossier'
 
+    # Alimentation du cumul journalier des KPIs (dossiers livrés), de l'index de charge des agents
+    # et des compteurs de dossiers des réceptions et des cartons
+    _kpi_etape = 'livraison'
+    _kpi_champs = frozenset(['state', 'date_livraison', 'reception_id', 'carton_id']) | CHAMPS_AFFECTATION
+
+    # Transitions de lot proposées en masse sur un domaine (voir action.masse)
+    _actions_masse = (
+        ('action_demarrer_traitement', "Démarrer le Traitement"),
+        ('action_valider_traitement', "Valider le Traitement"),
+        ('action_valider_transfert', "Valider le Transfert"),
+        ('action_valider_numerisation', "Valider la Numérisation"),
+        ('action_valider_indexation', "Valider l'Indexation"),
+        ('action_valider_livraison', "Valider la Livraison"),
+    )
+
     # === IDENTIFICATION ===
     numero_dossier = fields.Char(
         string='N° Dossier', 
@@ -102,6 +143,13 @@ class DossierCollecteur(models.Model):
         help="Code de l'agence d'origine"
     )
     
+    reference_externe = fields.Char(
+        string='Référence Bordereau',
+        index=True,
+        copy=False,
+        help="Référence du dossier sur le bordereau du bureau d'ordre, renseignée à l'import"
+    )
+    
     numero_carton = fields.Char(
         string='N° Carton', 
         tracking=True,
@@ -207,6 +255,54 @@ class DossierCollecteur(models.Model):
         ('critique', 'Critique')
     ], string='Priorité', default='normale', tracking=True)
     
+    rang_priorite = fields.Integer(
+        string='Rang de Priorité',
+        compute='_compute_rang_priorite',
+        store=True,
+        help="0 = critique, 1 = urgente, 2 = normale ; ordre des files de travail"
+    )
+    
+    # === SLA ===
+    date_echeance = fields.Datetime(
+        string='Échéance Étape',
+        compute='_compute_date_echeance',
+        store=True,
+        index=True,
+        help="Date limite de sortie de l'état courant selon la priorité (SLA)"
+    )
+    
+    sla_depasse = fields.Boolean(
+        string='SLA Dépassé',
+        compute='_compute_sla_depasse',
+        search='_search_sla_depasse',
+        help="L'échéance de l'étape courante est dépassée"
+    )
+    
+    date_escalade = fields.Datetime(
+        string='Dernière Escalade',
+        readonly=True,
+        copy=False,
+        help="Date de la dernière alerte de dépassement du SLA"
+    )
+    
+    # === FILE DE TRAVAIL ===
+    reserve_par_id = fields.Many2one(
+        'res.users',
+        string='Réservé par',
+        readonly=True,
+        copy=False,
+        help="Agent ayant pris le dossier dans la file de travail de l'étape"
+    )
+    
+    date_expiration_reservation = fields.Datetime(
+        string='Fin de Réservation',
+        readonly=True,
+        copy=False,
+        index=True,
+        help="Fin de la réservation ou de l'affectation automatique ; au-delà, un dossier "
+             "non démarré retourne dans la file commune de l'étape"
+    )
+    
     # === DATES DE SUIVI ===
     date_debut_traitement = fields.Datetime(
         string='Début Traitement',
@@ -284,7 +380,44 @@ class DossierCollecteur(models.Model):
             'target': 'current',
         }
     
+    def init(self):
+        # Ordre des files de travail : état, priorité puis échéance
+        sql.create_index(
+            self.env.cr, 'dossier_collecteur_file_travail_idx', self._table, ['state', 'rang_priorite', 'date_echeance']
+        )
+        # Recherche des doublons à l'import de bordereau
+        sql.create_index(
+            self.env.cr, 'dossier_collecteur_radical_agence_idx', self._table, ['radical_dossier', 'code_agence']
+        )
+    
     # === MÉTHODES DE CALCUL ===
+    @api.depends('priorite')
+    def _compute_rang_priorite(self):
+        for record in self:
+            record.rang_priorite = RANGS_PRIORITE.get(record.priorite, RANGS_PRIORITE['normale'])
+    
+    @api.depends('state', 'priorite', 'date_reception', 'date_debut_traitement', 'date_fin_traitement',
+                 'date_transfert', 'date_fin_numerisation', 'date_fin_indexation')
+    def _compute_date_echeance(self):
+        for record in self:
+            delais = DELAIS_SLA.get(record.state)
+            if not delais:
+                record.date_echeance = False
+                continue
+            entree = record[ETATS_ENCOURS[record.state][1]] or record.create_date or fields.Datetime.now()
+            record.date_echeance = entree + timedelta(hours=delais.get(record.priorite or 'normale'))
+    
+    def _compute_sla_depasse(self):
+        maintenant = fields.Datetime.now()
+        for record in self:
+            record.sla_depasse = bool(record.date_echeance and record.date_echeance < maintenant)
+    
+    def _search_sla_depasse(self, operator, value):
+        maintenant = fields.Datetime.now()
+        if (operator == '=') == bool(value):
+            return [('date_echeance', '<', maintenant)]
+        return ['|', ('date_echeance', '=', False), ('date_echeance', '>=', maintenant)]
+    
     @api.depends('traitement_id.duree_traitement')
     def _compute_duree_traitement(self):
         for record in self:
@@ -331,141 +464,198 @@ class DossierCollecteur(models.Model):
             record.progress = state_progress.get(record.state, 0)
     
     # === MÉTHODES CRUD ===
-    @api.model
-    def create(self, vals):
-        if not vals.get('numero_dossier'):
-            vals['numero_dossier'] = self.env['ir.sequence'].next_by_code('dossier.collecteur') or _('New')
-        return super(DossierCollecteur, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        # Numéros réservés en un bloc pour tout le lot
+        self.env['ir.sequence']._numeroter(vals_list, 'numero_dossier', 'dossier.collecteur')
+        dossiers = super(DossierCollecteur, self).create(vals_list)
+        self.env['dossier.attente']._synchroniser(dossiers.ids)
+        dossiers._notifier_files_etape({})
+        return dossiers
+    
+    def write(self, vals):
+        if 'state' in vals and 'reserve_par_id' not in vals:
+            # Une réservation ou une affectation automatique ne vaut que pour l'étape en cours
+            vals = dict(vals, reserve_par_id=False, date_expiration_reservation=False)
+        etats_avant = {record.id: record.state for record in self} if CHAMPS_FILE_ETAPE.intersection(vals) else None
+        result = super(DossierCollecteur, self).write(vals)
+        # Temps d'attente entre étapes, recalculés dès qu'une date de suivi change
+        if CHAMPS_ATTENTE.intersection(vals):
+            self.env['dossier.attente']._synchroniser(self.ids)
+        if etats_avant is not None:
+            self._notifier_files_etape(etats_avant)
+        return result
+    
+    def _notifier_files_etape(self, etats_avant):
+        """Pousse sur le bus, pour chaque étape touchée, les dossiers modifiés.
+
+        Un message par canal d'étape (état quitté et état atteint) ; les vues
+        de file abonnées ne relisent que ces dossiers. Envoyé à la validation
+        de la transaction.
+        """
+        ids_par_etat = defaultdict(list)
+        for record in self:
+            for etat in {etats_avant.get(record.id), record.state}:
+                if etat:
+                    ids_par_etat[etat].append(record.id)
+        self.env['bus.bus']._sendmany([
+            (CANAL_FILE_ETAPE % etat, 'archivage_file_etape', {'etat': etat, 'ids': ids})
+            for etat, ids in ids_par_etat.items()
+        ])
+    
+    def _get_contributions_kpi(self):
+        """Contribution des dossiers livrés au cumul journalier des KPIs"""
+        contributions = defaultdict(lambda: defaultdict(float))
+        for record in self:
+            if record.state != 'livre' or not record.date_livraison:
+                continue
+            cle = (record.date_livraison.date(), 'livraison', record.reception_id.archiviste_id.id or None)
+            contributions[cle]['nombre_dossiers'] += 1
+        return contributions
+    
+    def _get_contributions_cumuls(self):
+        cumuls = super(DossierCollecteur, self)._get_contributions_cumuls()
+        cumuls['agent.charge'] = self._get_contributions_charge()
+        cumuls['compteur.delta'] = self._get_contributions_compteurs()
+        return cumuls
+    
+    def _get_contributions_charge(self):
+        """Contribution des dossiers à l'index de charge : {agent_id: mesures}"""
+        contributions = defaultdict(lambda: defaultdict(int))
+        aujourd_hui = fields.Date.today()
+        for record in self:
+            for etat, champ_agent, champ_sortie in ETAPES_AFFECTATION.values():
+                agent_id = record[champ_agent].id
+                if not agent_id:
+                    continue
+                if record.state == etat:
+                    contributions[agent_id]['taches_ouvertes'] += 1
+                if record[champ_sortie] and record[champ_sortie].date() == aujourd_hui:
+                    contributions[agent_id]['debit_jour'] += 1
+        return contributions
+    
+    def _get_contributions_compteurs(self):
+        """Contribution des dossiers aux compteurs de leur réception et de leur carton"""
+        contributions = defaultdict(int)
+        for record in self:
+            if record.reception_id:
+                cle = ('reception.dossier', record.reception_id.id)
+                contributions[cle + ('compteur_dossiers',)] += 1
+                contributions[cle + ('compteur_traites',)] += record.state != 'reception'
+                contributions[cle + ('compteur_livres',)] += record.state == 'livre'
+            if record.carton_id:
+                contributions[('carton.numerisation', record.carton_id.id, 'compteur_dossiers')] += 1
+        return contributions
     
     # === ACTIONS DU WORKFLOW ===
+    # Chaque transition s'applique à un ou plusieurs dossiers : préconditions
+    # vérifiées sur le lot, une seule écriture et une note de chatter groupée.
     def action_demarrer_traitement(self):
         """Démarre le traitement physique"""
-        self.ensure_one()
-        
-        if self.state != 'reception':
-            raise UserError(_("Seuls les dossiers en réception peuvent démarrer le traitement."))
-        
-        self.write({
-            'state': 'traitement',
-            'date_debut_traitement': fields.Datetime.now()
-        })
-        
-        self._notify_next_operator('archivage_secondv.group_agent_traitement')
-        self.message_post(
-            body=_("Traitement physique démarré"),
-            subtype_xmlid='mail.mt_note'
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'reception'),
+            _("Seuls les dossiers en réception peuvent démarrer le traitement.")
+        )
+        self._appliquer_transition(
+            {'state': 'traitement', 'date_debut_traitement': fields.Datetime.now()},
+            _("Traitement physique démarré"),
+            etape='traitement',
+            groupe='archivage_collecteurs_complet.group_agent_traitement'
         )
     
     def action_valider_traitement(self):
         """Valide le traitement physique et passe au transfert"""
-        self.ensure_one()
-        
-        if self.state != 'traitement':
-            raise UserError(_("Seuls les dossiers en traitement peuvent être validés."))
-        
-        if not self.traitement_id:
-            raise UserError(_("Aucun traitement physique enregistré pour ce dossier."))
-        
-        if not self.radical_dossier or not self.code_agence:
-            raise UserError(_("Le radical dossier et le code agence sont obligatoires."))
-        
-        self.write({
-            'state': 'transfert',
-            'date_fin_traitement': fields.Datetime.now()
-        })
-        
-        self._notify_next_operator("archivage_secondv.group_gestionnaire_stock")
-        self.message_post(
-            body=_("Traitement physique terminé, prêt pour transfert"),
-            subtype_xmlid='mail.mt_note'
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'traitement'),
+            _("Seuls les dossiers en traitement peuvent être validés.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.traitement_id),
+            _("Aucun traitement physique enregistré pour ce dossier.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.radical_dossier or not d.code_agence),
+            _("Le radical dossier et le code agence sont obligatoires.")
+        )
+        self._appliquer_transition(
+            {'state': 'transfert', 'date_fin_traitement': fields.Datetime.now()},
+            _("Traitement physique terminé, prêt pour transfert"),
+            groupe='archivage_collecteurs_complet.group_gestionnaire_stock'
         )
     
     def action_valider_transfert(self):
         """Valide le transfert vers la numérisation"""
-        self.ensure_one()
-        
-        if self.state != 'transfert':
-            raise UserError(_("Seuls les dossiers en transfert peuvent être validés."))
-        
-        self.write({
-            'state': 'numerisation',
-            'date_transfert': fields.Datetime.now(),
-            'gestionnaire_stock_id': self.env.user.id
-        })
-        
-        self._notify_next_operator("archivage_secondv.group_operateur_numerisation")
-        self.message_post(
-            body=_("Dossier transféré vers la zone de numérisation"),
-            subtype_xmlid='mail.mt_note'
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'transfert'),
+            _("Seuls les dossiers en transfert peuvent être validés.")
+        )
+        self._appliquer_transition(
+            {
+                'state': 'numerisation',
+                'date_transfert': fields.Datetime.now(),
+                'gestionnaire_stock_id': self.env.user.id
+            },
+            _("Dossier transféré vers la zone de numérisation"),
+            etape='numerisation',
+            groupe='archivage_collecteurs_complet.group_operateur_numerisation'
         )
     
     def action_valider_numerisation(self):
         """Valide la numérisation et passe à l'indexation"""
-        self.ensure_one()
-        
-        if self.state != 'numerisation':
-            raise UserError(_("Seuls les dossiers en numérisation peuvent être validés."))
-        
-        if not self.numerisation_id:
-            raise UserError(_("Aucune numérisation enregistrée pour ce dossier."))
-        
-        if not self.type_dossier_detail or not self.numero_carton:
-            raise UserError(_("Le type de dossier et le numéro de carton sont obligatoires."))
-        
-        self.write({
-            'state': 'indexation',
-            'date_fin_numerisation': fields.Datetime.now()
-        })
-        
-        self._notify_next_operator("archivage_secondv.group_agent_indexation")
-        self.message_post(
-            body=_("Numérisation terminée, prêt pour indexation"),
-            subtype_xmlid='mail.mt_note'
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'numerisation'),
+            _("Seuls les dossiers en numérisation peuvent être validés.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.numerisation_id),
+            _("Aucune numérisation enregistrée pour ce dossier.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.type_dossier_detail or not d.numero_carton),
+            _("Le type de dossier et le numéro de carton sont obligatoires.")
+        )
+        self._appliquer_transition(
+            {'state': 'indexation', 'date_fin_numerisation': fields.Datetime.now()},
+            _("Numérisation terminée, prêt pour indexation"),
+            etape='indexation',
+            groupe='archivage_collecteurs_complet.group_agent_indexation'
         )
     
     def action_valider_indexation(self):
         """Valide l'indexation et passe à la livraison"""
-        self.ensure_one()
-        
-        if self.state != 'indexation':
-            raise UserError(_("Seuls les dossiers en indexation peuvent être validés."))
-        
-        if not self.indexation_ids:
-            raise UserError(_("Aucune indexation enregistrée pour ce dossier."))
-        
-        self.write({
-            'state': 'livraison',
-            'date_fin_indexation': fields.Datetime.now()
-        })
-        
-        self._notify_next_operator("archivage_secondv.group_archiviste")
-        self.message_post(
-            body=_("Indexation terminée, prêt pour livraison"),
-            subtype_xmlid='mail.mt_note'
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'indexation'),
+            _("Seuls les dossiers en indexation peuvent être validés.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.indexation_ids),
+            _("Aucune indexation enregistrée pour ce dossier.")
+        )
+        self._appliquer_transition(
+            {'state': 'livraison', 'date_fin_indexation': fields.Datetime.now()},
+            _("Indexation terminée, prêt pour livraison"),
+            groupe='archivage_collecteurs_complet.group_archiviste'
         )
     
     def action_valider_livraison(self):
         """Valide la livraison finale"""
-        self.ensure_one()
-        
-        if self.state != 'livraison':
-            raise UserError(_("Seuls les dossiers en livraison peuvent être validés."))
-        
-        if not self.livraison_id:
-            raise UserError(_("Aucune livraison enregistrée pour ce dossier."))
-        
-        self.write({
-            'state': 'livre',
-            'date_livraison': fields.Datetime.now()
-        })
-        
-        # Vérifier si la réception est terminée
-        self.reception_id._check_completion()
-        
-        self.message_post(
-            body=_("Dossier livré avec succès à CIH Bank"),
+        self._verifier_lot(
+            self.filtered(lambda d: d.state != 'livraison'),
+            _("Seuls les dossiers en livraison peuvent être validés.")
+        )
+        self._verifier_lot(
+            self.filtered(lambda d: not d.livraison_id),
+            _("Aucune livraison enregistrée pour ce dossier.")
+        )
+        self._appliquer_transition(
+            {'state': 'livre', 'date_livraison': fields.Datetime.now()},
+            _("Dossier livré avec succès à CIH Bank"),
             subtype_xmlid='mail.mt_comment'
         )
+        
+        # Vérifier si les réceptions sont terminées
+        for reception in self.reception_id:
+            reception._check_completion()
     
     def action_retour_etape_precedente(self):
         """Retourne à l'étape précédente"""
@@ -566,23 +756,247 @@ class DossierCollecteur(models.Model):
             'target': 'new',
         }
     
+    # === FILE DE TRAVAIL ===
+    @api.model
+    def _get_duree_reservation(self):
+        duree = self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.duree_reservation', DUREE_RESERVATION
+        )
+        return int(duree)
+    
+    @api.model
+    def _sql_etape_non_demarree(self, specialite):
+        """Condition SQL d'un dossier dont l'étape n'a pas encore été démarrée"""
+        if specialite == 'traitement':
+            return 'd.traitement_id IS NULL'
+        if specialite == 'numerisation':
+            return 'd.numerisation_id IS NULL'
+        Indexation = self.env['indexation.dossier']
+        return f'NOT EXISTS (SELECT 1 FROM {Indexation._table} i WHERE i.dossier_id = d.id)'
+    
+    @api.model
+    def _get_duree_affectation(self):
+        duree = self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.duree_affectation', DUREE_AFFECTATION
+        )
+        return int(duree)
+    
+    @api.model
+    def _sql_file_commune(self, champ_agent):
+        """Condition SQL d'un dossier de la file commune (paramètre nommé maintenant).
+        
+        Un dossier y est sans responsable, ou son affectation automatique ou sa
+        réservation a expiré ; une affectation manuelle (sans échéance) l'en sort.
+        """
+        return f"""(d.{champ_agent} IS NULL OR d.date_expiration_reservation < %(maintenant)s)
+                   AND (d.reserve_par_id IS NULL OR d.date_expiration_reservation < %(maintenant)s)"""
+    
+    @api.model
+    def _rechercher_file_commune(self, specialite, limit):
+        """Prochains dossiers non démarrés de la file commune d'une étape, dans l'ordre de la file.
+        
+        Les lignes verrouillées par une réservation concurrente sont sautées
+        (FOR UPDATE SKIP LOCKED) et restent verrouillées jusqu'à la fin de la
+        transaction appelante.
+        """
+        etat, champ_agent, _sortie = ETAPES_AFFECTATION[specialite]
+        self.flush_model()
+        self.env.cr.execute(f"""
+            SELECT d.id
+              FROM {self._table} d
+             WHERE d.state = %(etat)s
+               AND {self._sql_etape_non_demarree(specialite)}
+               AND {self._sql_file_commune(champ_agent)}
+             ORDER BY d.rang_priorite, d.date_echeance NULLS LAST, d.id
+             LIMIT %(limit)s
+               FOR UPDATE OF d SKIP LOCKED
+        """, {'etat': etat, 'maintenant': fields.Datetime.now(), 'limit': limit})
+        return self.browse([ligne[0] for ligne in self.env.cr.fetchall()])
+    
+    @api.model
+    def reserver_prochain_dossier(self, specialite):
+        """Réserve atomiquement le prochain dossier de la file d'une étape pour l'agent courant.
+        
+        Les dossiers déjà affectés à l'agent passent en premier, puis ceux de
+        la file commune ; dans chaque cas les plus prioritaires et, à priorité
+        égale, l'échéance SLA la plus proche. Les lignes verrouillées par une
+        réservation concurrente sont sautées (FOR UPDATE SKIP LOCKED) : deux
+        agents ne reçoivent jamais le même dossier. Un dossier réservé ou
+        affecté automatiquement mais non démarré retourne dans la file commune
+        à l'expiration de son échéance.
+        Retourne le dossier réservé, ou un ensemble vide si la file est vide.
+        """
+        if specialite not in ETAPES_AFFECTATION:
+            raise UserError(_("Aucune file de travail pour l'étape %s.") % specialite)
+        
+        etat, champ_agent, _sortie = ETAPES_AFFECTATION[specialite]
+        maintenant = fields.Datetime.now()
+        self.flush_model()
+        
+        # Deux parcours de l'index (state, rang_priorite, date_echeance) : les
+        # dossiers de l'agent d'abord, puis la file commune
+        parcours = [
+            f"""d.{champ_agent} = %(uid)s
+                AND (d.reserve_par_id IS NULL OR d.reserve_par_id = %(uid)s
+                     OR d.date_expiration_reservation < %(maintenant)s)""",
+            self._sql_file_commune(champ_agent),
+        ]
+        for condition_file in parcours:
+            self.env.cr.execute(f"""
+                SELECT d.id
+                  FROM {self._table} d
+                 WHERE d.state = %(etat)s
+                   AND {self._sql_etape_non_demarree(specialite)}
+                   AND {condition_file}
+                 ORDER BY d.rang_priorite, d.date_echeance NULLS LAST, d.id
+                 LIMIT 1
+                   FOR UPDATE OF d SKIP LOCKED
+            """, {'etat': etat, 'uid': self.env.uid, 'maintenant': maintenant})
+            ligne = self.env.cr.fetchone()
+            if ligne:
+                break
+        else:
+            return self.browse()
+        
+        dossier = self.browse(ligne[0])
+        dossier.write({
+            'reserve_par_id': self.env.uid,
+            'date_expiration_reservation': maintenant + timedelta(minutes=self._get_duree_reservation()),
+            champ_agent: self.env.uid,
+        })
+        return dossier
+    
+    @api.model
+    def action_prendre_prochain_dossier(self, specialite):
+        """Réserve le prochain dossier de l'étape et l'ouvre"""
+        dossier = self.reserver_prochain_dossier(specialite)
+        if not dossier:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('File Vide'),
+                    'message': _("Aucun dossier n'est disponible dans votre file de travail."),
+                    'type': 'info',
+                    'sticky': False,
+                }
+            }
+        return {
+            'name': _('Dossier Collecteur'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'dossier.collecteur',
+            'res_id': dossier.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+    
+    def action_liberer_reservation(self):
+        """Remet les dossiers réservés par l'agent courant dans la file de travail"""
+        for specialite, (etat, champ_agent, _sortie) in ETAPES_AFFECTATION.items():
+            dossiers = self.filtered(
+                lambda d: d.state == etat and d.reserve_par_id == self.env.user and d[champ_agent] == self.env.user
+            )
+            dossiers.write({champ_agent: False})
+        self.filtered(lambda d: d.reserve_par_id == self.env.user).write({
+            'reserve_par_id': False,
+            'date_expiration_reservation': False,
+        })
+        return True
+    
+    # === SLA ET ESCALADE ===
+    @api.model
+    def _get_dossiers_a_escalader(self):
+        """Dossiers dont l'échéance est dépassée et pas encore signalée pour l'étape courante.
+        
+        Parcours de l'index sur date_echeance (les dossiers livrés n'ont pas
+        d'échéance) ; seuls les dossiers en retard sont lus.
+        """
+        self.flush_model(['date_echeance', 'date_escalade'])
+        self.env.cr.execute(f"""
+            SELECT d.id
+              FROM {self._table} d
+             WHERE d.date_echeance < %s
+               AND (d.date_escalade IS NULL OR d.date_escalade < d.date_echeance)
+             ORDER BY d.date_echeance
+        """, [fields.Datetime.now()])
+        return self.browse([ligne[0] for ligne in self.env.cr.fetchall()])
+    
+    def _escalader(self):
+        """Signale le dépassement du SLA à l'agent de l'étape et aux superviseurs"""
+        superviseurs = self.env.ref('archivage_collecteurs_complet.group_superviseur', raise_if_not_found=False)
+        partenaires_superviseurs = superviseurs.users.partner_id if superviseurs else self.env['res.partner']
+        etats = dict(self._fields['state'].selection)
+        for record in self:
+            champ_agent = ETAPES_AFFECTATION.get(record.state, (None, None, None))[1]
+            partenaires = partenaires_superviseurs
+            if champ_agent and record[champ_agent]:
+                partenaires |= record[champ_agent].partner_id
+            record.message_post(
+                body=_("SLA dépassé : le dossier devait quitter l'étape %s avant le %s") % (
+                    etats.get(record.state), fields.Datetime.to_string(record.date_echeance)
+                ),
+                partner_ids=partenaires.ids,
+                subtype_xmlid='mail.mt_comment'
+            )
+        self.write({'date_escalade': fields.Datetime.now()})
+    
+    @api.model
+    def cron_escalader_sla(self):
+        """Cron d'escalade des dossiers en dépassement de SLA"""
+        self._get_dossiers_a_escalader()._escalader()
+        return True
+    
     # === MÉTHODES PRIVÉES ===
-    def _notify_next_operator(self, group_xmlid):
-        """Envoie une notification au prochain opérateur"""
-        try:
-            group = self.env.ref(group_xmlid)
-            users = group.users
-            partner_ids = users.mapped('partner_id.id')
-            
-            if partner_ids:
-                self.message_post(
-                    body=_("Nouveau dossier %s prêt pour traitement") % self.numero_dossier,
-                    partner_ids=partner_ids,
-                    subtype_xmlid='mail.mt_comment'
-                )
-        except Exception:
-            # Si le groupe n'existe pas, on continue sans erreur
-            pass
+    def _affecter_etape(self, specialite):
+        """Affecte les dossiers sans responsable à l'agent disponible le plus adapté de l'étape.
+
+        Désactivé par le paramètre archivage_collecteurs.affectation_automatique ;
+        le contexte affectation_differee permet à l'appelant d'affecter un lot en une fois.
+        """
+        Charge = self.env['agent.charge']
+        if self.env.context.get('affectation_differee') or not Charge._affectation_automatique_active():
+            return {}
+        champ_agent = ETAPES_AFFECTATION[specialite][1]
+        return Charge.affecter_dossiers(self.filtered(lambda d: not d[champ_agent]), specialite)
+    
+    def _notify_next_operator(self, group_xml_id):
+        """Annonce l'arrivée du lot dans l'étape aux utilisateurs du groupe suivant.
+
+        Les passages d'étape sont regroupés en un récapitulatif par
+        destinataire (voir notification.etape).
+        """
+        group = self.env.ref(group_xml_id, raise_if_not_found=False)
+        if group:
+            self.env['notification.etape'].enregistrer(self, group)
+    
+    def _verifier_lot(self, invalides, message):
+        """Refuse une transition de lot en citant les dossiers qui ne la permettent pas"""
+        if not invalides:
+            return
+        if len(self) > 1:
+            numeros = ', '.join(invalides[:LIMITE_DOSSIERS_CITES].mapped('numero_dossier'))
+            if len(invalides) > LIMITE_DOSSIERS_CITES:
+                numeros += _(" et %d autres") % (len(invalides) - LIMITE_DOSSIERS_CITES)
+            message = "%s\n%s" % (message, _("Dossiers concernés : %s") % numeros)
+        raise UserError(message)
+    
+    def _appliquer_transition(self, vals, message, etape=None, groupe=None, subtype_xmlid='mail.mt_note'):
+        """Fait passer le lot à l'état suivant en une écriture.
+
+        Affecte ensuite l'étape, prévient le groupe suivant et journalise la
+        transition sur chaque dossier en une seule insertion de messages.
+        """
+        if not self:
+            return
+        self.write(vals)
+        if etape:
+            self._affecter_etape(etape)
+        if groupe:
+            self._notify_next_operator(groupe)
+        self._message_log_batch(
+            bodies={dossier.id: message for dossier in self},
+            subtype_id=self.env['ir.model.data']._xmlid_to_res_id(subtype_xmlid),
+        )
     
     # === CONTRAINTES ===
     @api.constrains('state')
@@ -617,39 +1031,6 @@ class DossierCollecteur(models.Model):
 
 
 
-    def _notify_next_operator(self, group_xmlid):
-        """Envoie une notification au prochain opérateur responsable"""
-        group = self.env.ref(group_xmlid)
-        if group:
-            users = group.users
-            if users:
-                for user in users:
-                    self.message_post(
-                        body=_("Un nouveau dossier est prêt pour vous : %s") % self.numero_dossier,
-                        partner_ids=[user.partner_id.id],
-                        subtype_xmlid="mail.mt_note"
-                    )
-
-
-
-    
-    # === MÉTHODES PRIVÉES ===
-    def _notify_next_operator(self, group_xml_id):
-        """Notifie les utilisateurs du groupe suivant"""
-        try:
-            group_id = self.env.ref(group_xml_id)
-            if group_id:
-                users = self.env["res.users"].search([("groups_id", "in", group_id.id)])
-                for user in users:
-                    self.message_post(
-                        partner_ids=[user.partner_id.id],
-                        body=_("Nouveau dossier %s en attente de traitement dans votre étape.") % self.numero_dossier,
-                        subtype_xmlid='mail.mt_comment'
-                    )
-        except Exception:
-            # Si le groupe n'existe pas, on continue sans erreur
-            pass
-    
     # === CONTRAINTES ===
     @api.constrains('radical_dossier')
     def _check_radical_dossier(self):
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import models, fields, api, tools, _
+
+from .constantes import ETATS_ENCOURS, ETATS_SELECTION, ZONES_ENCOURS
+
+
+class DossierEncours(models.Model):
+    _name = 'dossier.encours'
+    _description = 'Instantané des Dossiers en Cours par État'
+    _order = 'date_instantane desc, state'
+
+    date_instantane = fields.Datetime(
+        string='Instantané',
+        required=True,
+        readonly=True,
+        index=True,
+        help="Date et heure de la prise de l'instantané"
+    )
+
+    state = fields.Selection(ETATS_SELECTION, string='État', required=True, readonly=True, index=True)
+
+    zone = fields.Selection(
+        ZONES_ENCOURS,
+        string='Zone',
+        readonly=True,
+        help="Zone physique correspondant à l'état du dossier"
+    )
+
+    code_agence = fields.Char(
+        string='Code Agence',
+        readonly=True,
+        index=True
+    )
+
+    # === MESURES ===
+    nombre = fields.Integer(string='Dossiers en Cours', readonly=True, group_operator='sum')
+
+    nombre_moins_1j = fields.Integer(string='< 1 jour', readonly=True, group_operator='sum')
+    nombre_1_3j = fields.Integer(string='1 à 3 jours', readonly=True, group_operator='sum')
+    nombre_3_7j = fields.Integer(string='3 à 7 jours', readonly=True, group_operator='sum')
+    nombre_plus_7j = fields.Integer(string='> 7 jours', readonly=True, group_operator='sum')
+
+    age_moyen = fields.Float(
+        string='Âge Moyen (h)',
+        readonly=True,
+        group_operator='avg',
+        help="Temps moyen passé dans l'état au moment de l'instantané"
+    )
+
+    age_max = fields.Float(string='Âge Maximum (h)', readonly=True, group_operator='max')
+
+    # === CAPTURE ===
+    @api.model
+    def capturer(self):
+        """Enregistre l'en-cours courant, groupé par état et par agence, en une requête"""
+        Dossier = self.env['dossier.collecteur']
+        Dossier.flush_model()
+
+        zone_sql = ' '.join(
+            f"WHEN '{etat}' THEN '{zone}'" for etat, (zone, _entree, _sortie) in ETATS_ENCOURS.items()
+        )
+        entree_sql = ' '.join(
+            f"WHEN '{etat}' THEN d.{entree}" for etat, (_zone, entree, _sortie) in ETATS_ENCOURS.items()
+        )
+        age = f"EXTRACT(EPOCH FROM (i.instant - COALESCE(CASE d.state {entree_sql} END, d.create_date))) / 3600"
+
+        self.env.cr.execute(f"""
+            WITH i AS (SELECT NOW() AT TIME ZONE 'UTC' AS instant)
+            INSERT INTO {self._table}
+                   (date_instantane, state, zone, code_agence, nombre,
+                    nombre_moins_1j, nombre_1_3j, nombre_3_7j, nombre_plus_7j, age_moyen, age_max,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT i.instant, d.state, CASE d.state {zone_sql} END, d.code_agence, COUNT(*),
+                   COUNT(*) FILTER (WHERE {age} < 24),
+                   COUNT(*) FILTER (WHERE {age} >= 24 AND {age} < 72),
+                   COUNT(*) FILTER (WHERE {age} >= 72 AND {age} < 168),
+                   COUNT(*) FILTER (WHERE {age} >= 168),
+                   AVG({age}), MAX({age}),
+                   %s, i.instant, %s, i.instant
+              FROM {Dossier._table} d, i
+             WHERE d.state = ANY(%s)
+             GROUP BY i.instant, d.state, d.code_agence
+        """, [self.env.uid, self.env.uid, list(ETATS_ENCOURS)])
+        self.invalidate_model()
+        return True
+
+    # === LOI DE LITTLE ===
+    @api.model
+    def get_loi_little(self, date_debut, date_fin):
+        """Retourne, par état, l'en-cours moyen, le débit et le temps de cycle d'une période.
+
+        L'en-cours moyen L vient des instantanés, le débit λ (dossiers sortis de
+        l'état par jour) des dates de suivi des dossiers ; le temps de cycle
+        W = L / λ est exprimé en jours.
+        """
+        self.flush_model()
+        self.env['dossier.collecteur'].flush_model()
+        nombre_jours = (date_fin - date_debut).days + 1
+
+        self.env.cr.execute(f"""
+            SELECT e.state, AVG(e.total)
+              FROM (SELECT date_instantane, state, SUM(nombre) AS total
+                      FROM {self._table}
+                     WHERE date_instantane >= %s AND date_instantane < %s::date + 1
+                     GROUP BY date_instantane, state) e
+             GROUP BY e.state
+        """, [date_debut, date_fin])
+        encours = {state: float(moyenne) for state, moyenne in self.env.cr.fetchall()}
+
+        sorties = self._get_sorties(date_debut, date_fin)
+
+        resultat = {}
+        for state in ETATS_ENCOURS:
+            debit = sorties.get(state, 0) / nombre_jours
+            encours_moyen = encours.get(state, 0.0)
+            resultat[state] = {
+                'encours_moyen': encours_moyen,
+                'debit_journalier': debit,
+                'temps_cycle_jours': encours_moyen / debit if debit else 0,
+            }
+        return resultat
+
+    @api.model
+    def _get_sorties(self, date_debut, date_fin):
+        """Nombre de dossiers sortis de chaque état sur la période, en une requête"""
+        Dossier = self.env['dossier.collecteur']
+        sorties_sql = ', '.join(
+            f"('{etat}', d.{sortie})" for etat, (_zone, _entree, sortie) in ETATS_ENCOURS.items()
+        )
+        self.env.cr.execute(f"""
+            SELECT s.state, COUNT(*)
+              FROM {Dossier._table} d
+             CROSS JOIN LATERAL (VALUES {sorties_sql}) AS s(state, date_sortie)
+             WHERE s.date_sortie >= %s AND s.date_sortie < %s::date + 1
+             GROUP BY s.state
+        """, [date_debut, date_fin])
+        return dict(self.env.cr.fetchall())
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_capturer_encours(self, jours_conservation=400):
+        """Capture l'en-cours et purge les instantanés trop anciens"""
+        self.capturer()
+        limite = fields.Datetime.now() - timedelta(days=jours_conservation)
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE date_instantane < %s", [limite])
+        return True
+
+
+class DossierEncoursAnalyse(models.Model):
+    _name = 'dossier.encours.analyse'
+    _description = 'Analyse Journalière En-cours, Débit et Temps de Cycle'
+    _auto = False
+    _order = 'jour desc, state'
+
+    jour = fields.Date(string='Jour', readonly=True)
+    state = fields.Selection(ETATS_SELECTION, string='État', readonly=True)
+    encours_moyen = fields.Float(string='En-cours Moyen', readonly=True, group_operator='avg')
+    debit = fields.Integer(string='Sorties (débit)', readonly=True, group_operator='sum')
+    temps_cycle_jours = fields.Float(
+        string='Temps de Cycle (jours)',
+        readonly=True,
+        group_operator='avg',
+        help="Loi de Little : en-cours moyen / débit journalier"
+    )
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        Encours = self.env['dossier.encours']
+        Dossier = self.env['dossier.collecteur']
+        sorties_sql = ', '.join(
+            f"('{etat}', d.{sortie})" for etat, (_zone, _entree, sortie) in ETATS_ENCOURS.items()
+        )
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                WITH encours AS (
+                    SELECT e.jour, e.state, AVG(e.total) AS encours_moyen
+                      FROM (SELECT date_instantane::date AS jour, date_instantane, state,
+                                   SUM(nombre) AS total
+                              FROM {Encours._table}
+                             GROUP BY date_instantane, state) e
+                     GROUP BY e.jour, e.state
+                ), sorties AS (
+                    SELECT s.date_sortie::date AS jour, s.state, COUNT(*) AS debit
+                      FROM {Dossier._table} d
+                     CROSS JOIN LATERAL (VALUES {sorties_sql}) AS s(state, date_sortie)
+                     WHERE s.date_sortie IS NOT NULL
+                     GROUP BY s.date_sortie::date, s.state
+                )
+                SELECT ROW_NUMBER() OVER (ORDER BY COALESCE(e.jour, s.jour), COALESCE(e.state, s.state)) AS id,
+                       COALESCE(e.jour, s.jour) AS jour,
+                       COALESCE(e.state, s.state) AS state,
+                       COALESCE(e.encours_moyen, 0) AS encours_moyen,
+                       COALESCE(s.debit, 0) AS debit,
+                       CASE WHEN s.debit > 0 THEN COALESCE(e.encours_moyen, 0) / s.debit ELSE 0 END
+                           AS temps_cycle_jours
+                  FROM encours e
+                  FULL OUTER JOIN sorties s ON s.jour = e.jour AND s.state = e.state
+            )
+        """)
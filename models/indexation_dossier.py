@@ -8,10 +8,14 @@ from datetime import datetime, timedelta
 class IndexationDossier(models.Model):
     _name = 'indexation.dossier'
     _description = 'Indexation des Documents'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'reporting.kpi.journalier.mixin']
     _order = 'heure_debut desc'
     _rec_name = 'display_name'
 
+    # Alimentation du cumul journalier des KPIs
+    _kpi_etape = 'indexation'
+    _kpi_champs = frozenset(['state', 'heure_debut', 'heure_fin', 'duree_pauses', 'agent_id', 'nombre_pieces_indexees'])
+
     # === IDENTIFICATION ===
     dossier_id = fields.Many2one(
         'dossier.collecteur', 
@@ -570,30 +574,20 @@ class IndexationDossier(models.Model):
     @api.model
     def get_kpi_agent(self, agent_id, date_debut=None, date_fin=None):
         """Retourne les KPIs d'un agent pour une période donnée"""
-        domain = [('agent_id', '=', agent_id), ('state', '=', 'valide')]
-        
-        if date_debut:
-            domain.append(('heure_debut', '>=', date_debut))
-        if date_fin:
-            domain.append(('heure_fin', '<=', date_fin))
-        
-        indexations = self.search(domain)
-        
-        if not indexations:
-            return {
-                'nombre_documents': 0,
-                'duree_moyenne': 0,
-                'duree_totale': 0,
-                'vitesse_moyenne': 0,
-                'nombre_pieces_total': 0
-            }
+        kpis = self.get_kpis_agents(date_debut, date_fin, [agent_id])
+        return kpis.get(agent_id) or self._formater_kpis_agent({}, 'nombre_documents')
+    
+    @api.model
+    def get_kpis_agents(self, date_debut=None, date_fin=None, agent_ids=None):
+        """Retourne les KPIs de tous les agents actifs sur la période en une requête.
         
+        Sans liste d'agents, tous ceux ayant une opération validée sont retournés.
+        Retourne {agent_id: kpis} avec le même format que get_kpi_agent.
+        """
+        sommes = self._get_sommes_agents(date_debut, date_fin, agent_ids)
         return {
-            'nombre_documents': len(indexations),
-            'duree_moyenne': sum(indexations.mapped('duree_effective')) / len(indexations),
-            'duree_totale': sum(indexations.mapped('duree_effective')),
-            'vitesse_moyenne': sum(indexations.mapped('vitesse_indexation')) / len(indexations),
-            'nombre_pieces_total': sum(indexations.mapped('nombre_pieces_indexees'))
+            agent_id: self._formater_kpis_agent(sommes_agent, 'nombre_documents')
+            for agent_id, sommes_agent in sommes.items()
         }
     
     @api.model
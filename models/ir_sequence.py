@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, _
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+
+    # === RÉSERVATION PAR BLOC ===
+    @api.model
+    def next_by_code_lot(self, sequence_code, nombre, sequence_date=None):
+        """Réserve nombre numéros consécutifs d'une séquence en un appel.
+
+        Même recherche de séquence que next_by_code ; retourne une liste vide
+        si la séquence n'existe pas.
+        """
+        if nombre <= 0:
+            return []
+        self.check_access_rights('read')
+        company_id = self.env.company.id
+        sequence = self.search(
+            [('code', '=', sequence_code), ('company_id', 'in', [company_id, False])], order='company_id', limit=1
+        )
+        if not sequence:
+            return []
+        return sequence._next_lot(nombre, sequence_date=sequence_date)
+
+    def _next_lot(self, nombre, sequence_date=None):
+        """Réserve un bloc de numéros : une requête pour une séquence standard, un verrou pour une séquence sans trou.
+
+        Les séquences par plage de dates gardent le tirage numéro par numéro.
+        """
+        self.ensure_one()
+        if self.use_date_range:
+            return [self._next(sequence_date=sequence_date) for _i in range(nombre)]
+
+        if self.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)", ['ir_sequence_%03d' % self.id, nombre]
+            )
+            numeros = [ligne[0] for ligne in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute(f"""
+                UPDATE {self._table}
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next - number_increment * %s, number_increment
+            """, [nombre, self.id, nombre])
+            premier, increment = self.env.cr.fetchone()
+            self.invalidate_recordset(['number_next'])
+            numeros = [premier + increment * i for i in range(nombre)]
+
+        return [self.get_next_char(numero) for numero in numeros]
+
+    @api.model
+    def _numeroter(self, vals_list, champ, sequence_code):
+        """Renseigne champ dans les valeurs de création qui n'en ont pas, en un bloc de numéros"""
+        sans_numero = [vals for vals in vals_list if not vals.get(champ)]
+        numeros = iter(self.next_by_code_lot(sequence_code, len(sans_numero)))
+        for vals in sans_numero:
+            vals[champ] = next(numeros, None) or _('New')
+        return vals_list
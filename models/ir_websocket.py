@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from .constantes import CANAL_FILE_ETAPE
+
+# États dont chaque groupe suit la file en temps réel ; sans restriction pour l'encadrement
+ETATS_SUIVIS_PAR_GROUPE = {
+    'archivage_collecteurs_complet.group_archiviste': ['reception', 'livraison'],
+    'archivage_collecteurs_complet.group_agent_traitement': ['reception', 'traitement'],
+    'archivage_collecteurs_complet.group_gestionnaire_stock': ['transfert'],
+    'archivage_collecteurs_complet.group_operateur_numerisation': ['numerisation'],
+    'archivage_collecteurs_complet.group_agent_indexation': ['indexation'],
+    'archivage_collecteurs_complet.group_superviseur': None,
+}
+
+
+class IrWebsocket(models.AbstractModel):
+    _inherit = 'ir.websocket'
+
+    def _build_bus_channel_list(self, channels):
+        """Abonne l'utilisateur connecté aux canaux des étapes de ses groupes"""
+        channels = super()._build_bus_channel_list(channels)
+        user = self.env.user
+        if not user or user._is_public():
+            return channels
+        tous_etats = [etat for etat, _libelle in self.env['dossier.collecteur']._fields['state'].selection]
+        etats = set()
+        for group_xmlid, etats_groupe in ETATS_SUIVIS_PAR_GROUPE.items():
+            group = self.env.ref(group_xmlid, raise_if_not_found=False)
+            if group and group in user.groups_id:
+                etats.update(tous_etats if etats_groupe is None else etats_groupe)
+        return channels + [CANAL_FILE_ETAPE % etat for etat in sorted(etats)]
@@ -3,6 +3,7 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from datetime import datetime, timedelta
+from collections import defaultdict
 import os
 import shutil
 
@@ -10,10 +11,14 @@ import shutil
 class LivraisonNumerique(models.Model):
     _name = 'livraison.numerique'
     _description = 'Livraison Numérique vers CIH Bank'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'reporting.kpi.journalier.mixin']
     _order = 'date_livraison desc'
     _rec_name = 'numero_livraison'
 
+    # Alimentation du cumul journalier des KPIs
+    _kpi_etape = 'livraison'
+    _kpi_champs = frozenset(['state', 'date_livraison', 'archiviste_id'])
+
     # === IDENTIFICATION ===
     numero_livraison = fields.Char(
         string='N° Livraison', 
@@ -216,15 +221,15 @@ class LivraisonNumerique(models.Model):
             record.taille_totale = record.nombre_pieces_total * taille_moyenne_par_piece
     
     # === MÉTHODES CRUD ===
-    @api.model
-    def create(self, vals):
-        if not vals.get('numero_livraison'):
-            vals['numero_livraison'] = self.env['ir.sequence'].next_by_code('livraison.numerique') or _('New')
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['ir.sequence']._numeroter(vals_list, 'numero_livraison', 'livraison.numerique')
         
         # Initialiser l'historique
-        vals['historique_etats'] = f"{fields.Datetime.now()}: Création de la livraison\n"
+        for vals in vals_list:
+            vals['historique_etats'] = f"{fields.Datetime.now()}: Création de la livraison\n"
         
-        return super(LivraisonNumerique, self).create(vals)
+        return super(LivraisonNumerique, self).create(vals_list)
     
     def write(self, vals):
         # Enregistrer les changements d'état dans l'historique
@@ -238,6 +243,19 @@ class LivraisonNumerique(models.Model):
         
         return super(LivraisonNumerique, self).write(vals)
     
+    def _get_contributions_kpi(self):
+        """Contribution des livraisons effectuées ou en erreur au cumul journalier des KPIs"""
+        contributions = defaultdict(lambda: defaultdict(float))
+        for record in self:
+            if record.state not in ('livre', 'confirme', 'erreur') or not record.date_livraison:
+                continue
+            mesures = contributions[(record.date_livraison.date(), 'livraison', record.archiviste_id.id or None)]
+            if record.state == 'erreur':
+                mesures['nombre_erreurs'] += 1
+            else:
+                mesures['nombre'] += 1
+        return contributions
+    
     # === ACTIONS PRINCIPALES ===
     def action_demarrer_preparation(self):
         """Démarre la préparation de la livraison"""
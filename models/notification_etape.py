@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from markupsafe import Markup, escape
+
+from odoo import models, fields, api, _
+from odoo.tools import sql, str2bool
+
+from .constantes import ETATS_SELECTION
+
+# Nombre maximal de numéros de dossiers listés par étape dans un récapitulatif
+LIMITE_DOSSIERS_RECAPITULATIF = 20
+
+
+class NotificationEtape(models.Model):
+    _name = 'notification.etape'
+    _description = "Notification de Passage d'Étape en Attente d'Envoi"
+    _order = 'destinataire_id, etat, id'
+
+    destinataire_id = fields.Many2one(
+        'res.users',
+        string='Destinataire',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    dossier_id = fields.Many2one(
+        'dossier.collecteur',
+        string='Dossier',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    etat = fields.Selection(
+        ETATS_SELECTION,
+        string='Étape',
+        required=True,
+        readonly=True,
+        help="Étape dans laquelle le dossier est arrivé"
+    )
+
+    def init(self):
+        # Un dossier n'est annoncé qu'une fois par destinataire et par étape
+        sql.create_unique_index(
+            self.env.cr, 'notification_etape_cle_uniq', self._table, ['destinataire_id', 'dossier_id', 'etat']
+        )
+
+    # === ENREGISTREMENT ===
+    @api.model
+    def _envoi_periodique(self):
+        """Vrai si les récapitulatifs partent par le cron plutôt qu'à chaque transition"""
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.notification_periodique', 'False'
+        ))
+
+    @api.model
+    def _get_destinataires(self, group):
+        """Utilisateurs du groupe qui acceptent les notifications internes du workflow"""
+        return group.users.filtered(lambda u: u.recevoir_notifications and u.notification_interne)
+
+    @api.model
+    def enregistrer(self, dossiers, group):
+        """Met en attente l'arrivée de dossiers dans une étape pour les utilisateurs du groupe.
+
+        Une insertion pour tout le lot ; le récapitulatif part aussitôt, sauf
+        si l'envoi périodique est activé.
+        """
+        destinataires = self._get_destinataires(group)
+        if not dossiers or not destinataires:
+            return
+
+        lignes = [(dossier.id, dossier.state) for dossier in dossiers]
+        lignes_sql = ', '.join(['(%s, %s)'] * len(lignes))
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (destinataire_id, dossier_id, etat, create_uid, create_date, write_uid, write_date)
+            SELECT u.id, v.dossier_id, v.etat, %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM unnest(%s) AS u(id)
+             CROSS JOIN (VALUES {lignes_sql}) AS v(dossier_id, etat)
+            ON CONFLICT (destinataire_id, dossier_id, etat) DO NOTHING
+        """, [self.env.uid, self.env.uid, destinataires.ids] + [valeur for ligne in lignes for valeur in ligne])
+        self.invalidate_model()
+
+        if not self._envoi_periodique():
+            self.envoyer(dossier_ids=dossiers.ids)
+
+    # === ENVOI ===
+    @api.model
+    def envoyer(self, dossier_ids=None):
+        """Envoie un récapitulatif par destinataire des dossiers en attente de notification.
+
+        Les lignes sont retirées du tampon au moment où elles sont lues, un
+        même dossier n'est donc jamais annoncé deux fois par des envois
+        concurrents. Sans liste de dossiers, tout le tampon est envoyé.
+        """
+        self.flush_model()
+        condition = 'dossier_id = ANY(%s)' if dossier_ids is not None else 'TRUE'
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table}
+             WHERE {condition}
+            RETURNING destinataire_id, etat, dossier_id
+        """, [list(dossier_ids)] if dossier_ids is not None else [])
+        lignes = self.env.cr.fetchall()
+        self.invalidate_model()
+        if not lignes:
+            return 0
+
+        dossiers_par_destinataire = defaultdict(lambda: defaultdict(list))
+        for destinataire_id, etat, dossier_id in lignes:
+            dossiers_par_destinataire[destinataire_id][etat].append(dossier_id)
+
+        Dossier = self.env['dossier.collecteur']
+        numeros = {
+            dossier.id: dossier.numero_dossier
+            for dossier in Dossier.browse({dossier_id for _u, _e, dossier_id in lignes}).exists()
+        }
+        destinataires = self.env['res.users'].browse(list(dossiers_par_destinataire)).exists()
+        for destinataire in destinataires:
+            self.env['mail.thread'].sudo().message_notify(
+                partner_ids=destinataire.partner_id.ids,
+                subject=_("Dossiers en attente dans votre étape"),
+                body=self._get_corps_recapitulatif(dossiers_par_destinataire[destinataire.id], numeros),
+            )
+        return len(destinataires)
+
+    @api.model
+    def _get_corps_recapitulatif(self, dossiers_par_etat, numeros):
+        """Corps HTML du récapitulatif : par étape, le nombre et les numéros des dossiers"""
+        libelles = dict(ETATS_SELECTION)
+        paragraphes = []
+        for etat, dossier_ids in dossiers_par_etat.items():
+            liste = ', '.join(numeros.get(dossier_id) or '' for dossier_id in dossier_ids[:LIMITE_DOSSIERS_RECAPITULATIF])
+            if len(dossier_ids) > LIMITE_DOSSIERS_RECAPITULATIF:
+                liste += _(" et %d autres") % (len(dossier_ids) - LIMITE_DOSSIERS_RECAPITULATIF)
+            paragraphes.append(Markup("<p><strong>%s</strong> : %s<br/>%s</p>") % (
+                libelles.get(etat, etat),
+                _("%d nouveau(x) dossier(s)") % len(dossier_ids),
+                escape(liste),
+            ))
+        return Markup('').join(paragraphes)
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_envoyer_notifications(self):
+        """Envoie les récapitulatifs en attente"""
+        self.envoyer()
+        return True
@@ -8,10 +8,14 @@ from datetime import datetime, timedelta
 class NumerisationDossier(models.Model):
     _name = 'numerisation.dossier'
     _description = 'Numérisation des Dossiers Collecteurs'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'reporting.kpi.journalier.mixin']
     _order = 'heure_debut desc'
     _rec_name = 'display_name'
 
+    # Alimentation du cumul journalier des KPIs
+    _kpi_etape = 'numerisation'
+    _kpi_champs = frozenset(['state', 'heure_debut', 'heure_fin', 'duree_pauses', 'operateur_id', 'nombre_pieces'])
+
     # === IDENTIFICATION ===
     dossier_id = fields.Many2one(
         'dossier.collecteur', 
@@ -491,29 +495,19 @@ class NumerisationDossier(models.Model):
     @api.model
     def get_kpi_operateur(self, operateur_id, date_debut=None, date_fin=None):
         """Retourne les KPIs d'un opérateur pour une période donnée"""
-        domain = [('operateur_id', '=', operateur_id), ('state', '=', 'valide')]
-        
-        if date_debut:
-            domain.append(('heure_debut', '>=', date_debut))
-        if date_fin:
-            domain.append(('heure_fin', '<=', date_fin))
-        
-        numerisations = self.search(domain)
-        
-        if not numerisations:
-            return {
-                'nombre_dossiers': 0,
-                'duree_moyenne': 0,
-                'duree_totale': 0,
-                'vitesse_moyenne': 0,
-                'nombre_pieces_total': 0
-            }
+        kpis = self.get_kpis_operateurs(date_debut, date_fin, [operateur_id])
+        return kpis.get(operateur_id) or self._formater_kpis_agent({})
+    
+    @api.model
+    def get_kpis_operateurs(self, date_debut=None, date_fin=None, operateur_ids=None):
+        """Retourne les KPIs de tous les opérateurs actifs sur la période en une requête.
         
+        Sans liste d'opérateurs, tous ceux ayant une opération validée sont retournés.
+        Retourne {operateur_id: kpis} avec le même format que get_kpi_operateur.
+        """
+        sommes = self._get_sommes_agents(date_debut, date_fin, operateur_ids)
         return {
-            'nombre_dossiers': len(numerisations),
-            'duree_moyenne': sum(numerisations.mapped('duree_effective')) / len(numerisations),
-            'duree_totale': sum(numerisations.mapped('duree_effective')),
-            'vitesse_moyenne': sum(numerisations.mapped('vitesse_numerisation')) / len(numerisations),
-            'nombre_pieces_total': sum(numerisations.mapped('nombre_pieces'))
+            operateur_id: self._formater_kpis_agent(sommes_agent)
+            for operateur_id, sommes_agent in sommes.items()
         }
 
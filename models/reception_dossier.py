@@ -1,17 +1,42 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import time
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from datetime import datetime, timedelta
+from collections import defaultdict
+
+_logger = logging.getLogger(__name__)
+
+# Au-delà de ce nombre de dossiers à créer, la création part en tâche de fond
+SEUIL_CREATION_SYNCHRONE = 1000
+
+# Dossiers créés par lot (un create() et un bloc de numéros par lot)
+TAILLE_LOT_CREATION = 500
+
+# Durée maximale (secondes) d'un passage du cron de création avant de se relancer
+DUREE_MAX_CREATION = 120
+
+# Pause (secondes) avant le passage suivant, qui laisse le worker aux autres crons
+DELAI_RELANCE_CREATION = 120
 
 
 class ReceptionDossier(models.Model):
     _name = 'reception.dossier'
     _description = 'Réception des Dossiers Collecteurs'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'reporting.kpi.journalier.mixin', 'compteur.delta.mixin']
     _order = 'date_reception desc'
     _rec_name = 'numero_reception'
 
+    # Alimentation du cumul journalier des KPIs
+    _kpi_etape = 'reception'
+    _kpi_champs = frozenset(['state', 'date_reception', 'nombre_dossiers', 'archiviste_id'])
+
+    # Compteurs de dossiers maintenus par variations
+    _compteurs = ('compteur_dossiers', 'compteur_traites', 'compteur_livres')
+
     # === INFORMATIONS DE RÉCEPTION ===
     numero_reception = fields.Char(
         string='N° Réception', 
@@ -98,37 +123,103 @@ class ReceptionDossier(models.Model):
     # === CHAMPS CALCULÉS ===
     nombre_dossiers_crees = fields.Integer(
         string='Dossiers Créés',
-        compute='_compute_nombre_dossiers_crees',
-        store=True,
+        compute='_compute_compteurs',
         help="Nombre de dossiers collecteurs effectivement créés"
     )
     
     nombre_dossiers_traites = fields.Integer(
         string='Dossiers Traités', 
-        compute='_compute_nombre_dossiers_traites', 
-        store=True,
+        compute='_compute_compteurs', 
         help="Nombre de dossiers déjà traités"
     )
     
     progression = fields.Float(
         string='Progression (%)',
-        compute='_compute_progression',
+        compute='_compute_compteurs',
         help="Pourcentage de progression du traitement"
     )
     
     duree_traitement_totale = fields.Float(
         string='Durée Totale (heures)',
-        compute='_compute_duree_traitement_totale',
+        compute='_compute_durees',
         help="Durée totale de traitement de tous les dossiers"
     )
     
     duree_moyenne_par_dossier = fields.Float(
         string='Durée Moyenne par Dossier (heures)', 
-        compute='_compute_duree_moyenne_par_dossier', 
-        store=True,
+        compute='_compute_durees', 
         help="Durée moyenne de traitement par dossier"
     )
     
+    # === COMPTEURS CONSOLIDÉS ===
+    # Mis à jour par variations (compteur.delta) : un changement d'état d'un
+    # dossier n'écrit jamais la ligne de la réception
+    compteur_dossiers = fields.Integer(string='Dossiers (consolidé)', readonly=True, copy=False)
+    compteur_traites = fields.Integer(string='Dossiers Traités (consolidé)', readonly=True, copy=False)
+    compteur_livres = fields.Integer(string='Dossiers Livrés (consolidé)', readonly=True, copy=False)
+    
+    # === CRÉATION DES DOSSIERS ===
+    creation_en_cours = fields.Boolean(
+        string='Création des Dossiers en Cours',
+        readonly=True,
+        copy=False,
+        index=True,
+        help="Les dossiers sont créés par lots en tâche de fond"
+    )
+    
+    creation_valider = fields.Boolean(
+        string='Valider après Création',
+        readonly=True,
+        copy=False,
+        help="La réception passe à l'état validé une fois tous les dossiers créés"
+    )
+    
+    creation_demarrer = fields.Boolean(
+        string='Démarrer après Création',
+        readonly=True,
+        copy=False,
+        help="Le traitement démarre une fois tous les dossiers créés"
+    )
+    
+    creation_progression = fields.Float(
+        string='Dossiers Créés (%)',
+        compute='_compute_creation_progression',
+        help="Avancement de la création des dossiers"
+    )
+    
+    creation_erreur = fields.Text(
+        string='Erreur de Création',
+        readonly=True,
+        copy=False,
+        help="Dernière erreur rencontrée par la création des dossiers en tâche de fond"
+    )
+    
+    # === IMPORT DE BORDEREAU EN TÂCHE DE FOND ===
+    import_fichier_id = fields.Many2one(
+        'ir.attachment',
+        string='Bordereau en Cours d\'Import',
+        readonly=True,
+        copy=False,
+        help="Bordereau dont les lignes restantes sont importées par le cron de création des dossiers"
+    )
+    
+    import_separateur = fields.Char(string='Séparateur CSV du Bordereau', readonly=True, copy=False)
+    
+    import_encodage = fields.Char(string='Encodage CSV du Bordereau', readonly=True, copy=False)
+    
+    import_derniere_ligne = fields.Integer(
+        string='Dernière Ligne Importée',
+        readonly=True,
+        copy=False,
+        help="Point de reprise de l'import : les lignes suivantes du bordereau restent à importer"
+    )
+    
+    import_nombre_doublons = fields.Integer(string='Doublons Ignorés à l\'Import', readonly=True, copy=False)
+    
+    import_nombre_erreurs = fields.Integer(string='Lignes du Bordereau en Erreur', readonly=True, copy=False)
+    
+    import_rapport_erreurs = fields.Text(string="Rapport d'Import du Bordereau", readonly=True, copy=False)
+    
     # === CONTRÔLES QUALITÉ ===
     controle_nombre = fields.Boolean(
         string='Contrôle Nombre de Dossiers', 
@@ -182,45 +273,71 @@ class ReceptionDossier(models.Model):
     )
     
     # === MÉTHODES DE CALCUL ===
-    @api.depends('dossier_ids')
-    def _compute_nombre_dossiers_crees(self):
+    @api.depends('dossier_ids', 'dossier_ids.state')
+    def _compute_compteurs(self):
+        compteurs = self._get_compteurs()
         for record in self:
-            record.nombre_dossiers_crees = len(record.dossier_ids)
-    
-    @api.depends('dossier_ids.state')
-    def _compute_nombre_dossiers_traites(self):
+            valeurs = compteurs[record.id]
+            record.nombre_dossiers_crees = valeurs['compteur_dossiers']
+            record.nombre_dossiers_traites = valeurs['compteur_traites']
+            record.progression = (
+                valeurs['compteur_livres'] / valeurs['compteur_dossiers'] * 100 if valeurs['compteur_dossiers'] > 0 else 0
+            )
+    
+    @api.depends('nombre_dossiers', 'nombre_dossiers_crees')
+    def _compute_creation_progression(self):
         for record in self:
-            record.nombre_dossiers_traites = len(record.dossier_ids.filtered(lambda d: d.state != 'reception'))
-    
-    @api.depends('dossier_ids.state')
-    def _compute_progression(self):
-        for record in self:
-            if not record.dossier_ids:
-                record.progression = 0
+            if record.nombre_dossiers > 0:
+                record.creation_progression = min(record.nombre_dossiers_crees / record.nombre_dossiers * 100, 100)
             else:
-                total_dossiers = len(record.dossier_ids)
-                dossiers_termines = len(record.dossier_ids.filtered(lambda d: d.state == 'livre'))
-                record.progression = (dossiers_termines / total_dossiers) * 100 if total_dossiers > 0 else 0
-    
-    @api.depends('dossier_ids.duree_totale')
-    def _compute_duree_traitement_totale(self):
-        for record in self:
-            record.duree_traitement_totale = sum(record.dossier_ids.mapped('duree_totale'))
+                record.creation_progression = 0
     
     @api.depends('dossier_ids.duree_totale', 'nombre_dossiers_traites')
-    def _compute_duree_moyenne_par_dossier(self):
+    def _compute_durees(self):
+        """Somme des durées des dossiers, en une requête groupée pour toutes les réceptions"""
+        durees = {}
+        if self.ids:
+            groupes = self.env['dossier.collecteur'].read_group(
+                [('reception_id', 'in', self.ids)], ['reception_id', 'duree_totale:sum'], ['reception_id'], lazy=False
+            )
+            durees = {groupe['reception_id'][0]: groupe['duree_totale'] for groupe in groupes}
         for record in self:
+            record.duree_traitement_totale = durees.get(record.id, 0.0)
             if record.nombre_dossiers_traites > 0:
-                record.duree_moyenne_par_dossier = sum(record.dossier_ids.mapped('duree_totale')) / record.nombre_dossiers_traites
+                record.duree_moyenne_par_dossier = record.duree_traitement_totale / record.nombre_dossiers_traites
             else:
                 record.duree_moyenne_par_dossier = 0.0
     
+    def _get_requete_compteurs(self):
+        Dossier = self.env['dossier.collecteur']
+        return f"""
+            SELECT r.id,
+                   COUNT(d.id) AS compteur_dossiers,
+                   COUNT(d.id) FILTER (WHERE d.state != 'reception') AS compteur_traites,
+                   COUNT(d.id) FILTER (WHERE d.state = 'livre') AS compteur_livres
+              FROM {self._table} r
+              LEFT JOIN {Dossier._table} d ON d.reception_id = r.id
+             GROUP BY r.id
+        """
+    
     # === MÉTHODES CRUD ===
-    @api.model
-    def create(self, vals):
-        if not vals.get('numero_reception'):
-            vals['numero_reception'] = self.env['ir.sequence'].next_by_code('reception.dossier') or _('New')
-        return super(ReceptionDossier, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env['ir.sequence']._numeroter(vals_list, 'numero_reception', 'reception.dossier')
+        return super(ReceptionDossier, self).create(vals_list)
+    
+    def _get_contributions_kpi(self):
+        """Contribution des réceptions validées au cumul journalier des KPIs"""
+        contributions = defaultdict(lambda: defaultdict(float))
+        for record in self:
+            if record.state not in ('valide', 'en_cours', 'termine') or not record.date_reception:
+                continue
+            mesures = contributions[(record.date_reception.date(), 'reception', record.archiviste_id.id or None)]
+            mesures['nombre'] += 1
+            mesures['nombre_dossiers'] += record.nombre_dossiers
+            if record.state == 'termine':
+                mesures['nombre_livres'] += 1
+        return contributions
     
     # === ACTIONS PRINCIPALES ===
     def action_valider_reception(self):
@@ -233,14 +350,18 @@ class ReceptionDossier(models.Model):
         if self.nombre_dossiers <= 0:
             raise UserError(_("Le nombre de dossiers doit être supérieur à 0."))
         
-        # Créer les dossiers collecteurs
-        self._create_dossiers_collecteurs()
-        
-        self.state = 'valide'
-        self.message_post(
-            body=_("Réception validée - %d dossiers collecteurs créés") % self.nombre_dossiers,
-            subtype_xmlid='mail.mt_comment'
-        )
+        if not self._lancer_creation_dossiers(valider=True):
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Création en Cours'),
+                    'message': _("%d dossiers collecteurs sont créés en tâche de fond ; "
+                                 "la réception sera validée à la fin de la création.") % self.nombre_dossiers,
+                    'type': 'info',
+                    'sticky': False,
+                }
+            }
         
         return {
             'type': 'ir.actions.client',
@@ -260,10 +381,11 @@ class ReceptionDossier(models.Model):
         if self.state != 'valide':
             raise UserError(_("Seules les réceptions validées peuvent être démarrées."))
         
-        # Passer tous les dossiers en état traitement
-        for dossier in self.dossier_ids:
-            if dossier.state == 'reception':
-                dossier.action_demarrer_traitement()
+        if self.creation_en_cours:
+            raise UserError(_("La création des dossiers de cette réception n'est pas terminée."))
+        
+        # Passer tous les dossiers en état traitement et les répartir en un lot entre les agents
+        self.dossier_ids.filtered(lambda d: d.state == 'reception').action_demarrer_traitement()
         
         self.state = 'en_cours'
         self.message_post(
@@ -350,24 +472,100 @@ class ReceptionDossier(models.Model):
     
     # === MÉTHODES PRIVÉES ===
     def _create_dossiers_collecteurs(self):
-        """Crée les dossiers collecteurs selon le nombre spécifié"""
+        """Crée les dossiers collecteurs manquants, par lots, dans la transaction courante"""
         self.ensure_one()
+        self._creer_dossiers_par_lots()
+    
+    def _lancer_creation_dossiers(self, valider=False, demarrer=False):
+        """Complète les dossiers de la réception jusqu'au nombre reçu.
+
+        Au-dessous de SEUIL_CREATION_SYNCHRONE dossiers à créer, la création
+        (et la validation ou le démarrage demandés) se fait immédiatement ;
+        au-delà elle est confiée au cron de création, qui la termine par lots.
+        Un import de bordereau interrompu reprend, lui, à sa dernière ligne
+        validée. Retourne True si la création est terminée.
+        """
+        self.ensure_one()
+        restant = self.nombre_dossiers - self._compter_dossiers()
+        if not self.import_fichier_id and restant <= SEUIL_CREATION_SYNCHRONE:
+            self._creer_dossiers_par_lots()
+            self._terminer_creation_dossiers(valider, demarrer)
+            return True
         
-        # Supprimer les dossiers existants si nécessaire
-        self.dossier_ids.unlink()
-        
-        # Créer les nouveaux dossiers
-        dossiers_vals = []
-        for i in range(1, self.nombre_dossiers + 1):
-            dossiers_vals.append({
-                'reception_id': self.id,
-                'type_dossier': self.type_dossier,
-                'state': 'reception',
-                'date_reception': self.date_reception,
-                'archiviste_id': self.archiviste_id.id,
-            })
-        
-        self.env['dossier.collecteur'].create(dossiers_vals)
+        self.write({
+            'creation_en_cours': True,
+            'creation_valider': valider,
+            'creation_demarrer': demarrer,
+            'creation_erreur': False,
+        })
+        if self.import_fichier_id:
+            message = _("Import du bordereau %s poursuivi en tâche de fond à partir de la ligne %d") % (
+                self.import_fichier_id.name, self.import_derniere_ligne + 1
+            )
+        else:
+            message = _("Création de %d dossiers collecteurs lancée en tâche de fond") % restant
+        self.message_post(body=message, subtype_xmlid='mail.mt_note')
+        self.env.ref('archivage_collecteurs_complet.cron_creer_dossiers_reception')._trigger()
+        return False
+    
+    def _poursuivre_creation_dossiers(self, echeance):
+        """Un passage du cron de création : suite du bordereau importé, sinon dossiers manquants.
+
+        Chaque lot est validé en base ; retourne False si l'échéance
+        (time.monotonic) est atteinte avant la fin.
+        """
+        self.ensure_one()
+        if self.import_fichier_id:
+            return self.env['wizard.import.bordereau']._poursuivre_import(self, echeance)
+        return self._creer_dossiers_par_lots(commit=True, echeance=echeance)
+    
+    def _compter_dossiers(self):
+        self.ensure_one()
+        return self.env['dossier.collecteur'].search_count([('reception_id', '=', self.id)])
+    
+    def _get_vals_dossier(self):
+        """Valeurs de création d'un dossier de la réception"""
+        return {
+            'reception_id': self.id,
+            'type_dossier': self.type_dossier,
+            'state': 'reception',
+            'date_reception': self.date_reception,
+        }
+    
+    def _creer_dossiers_par_lots(self, commit=False, echeance=None):
+        """Crée les dossiers manquants par lots de TAILLE_LOT_CREATION.
+
+        Reprend là où une exécution précédente s'est arrêtée : seul le nombre
+        de dossiers existants compte. Avec commit, chaque lot est validé en
+        base ; retourne False si l'échéance (time.monotonic) est atteinte
+        avant la fin.
+        """
+        self.ensure_one()
+        Dossier = self.env['dossier.collecteur'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True
+        )
+        while True:
+            restant = self.nombre_dossiers - self._compter_dossiers()
+            if restant <= 0:
+                return True
+            Dossier.create([self._get_vals_dossier() for _i in range(min(restant, TAILLE_LOT_CREATION))])
+            if commit:
+                self.env.cr.commit()
+            if echeance and time.monotonic() > echeance:
+                return False
+    
+    def _terminer_creation_dossiers(self, valider, demarrer):
+        """Valide et démarre la réception une fois ses dossiers créés, selon la demande"""
+        self.ensure_one()
+        self.write({'creation_en_cours': False, 'creation_valider': False, 'creation_demarrer': False})
+        if valider and self.state == 'brouillon':
+            self.state = 'valide'
+            self.message_post(
+                body=_("Réception validée - %d dossiers collecteurs créés") % self.nombre_dossiers,
+                subtype_xmlid='mail.mt_comment'
+            )
+        if demarrer and self.state == 'valide':
+            self.action_demarrer_traitement()
     
     def _check_completion(self):
         """Vérifie si tous les dossiers sont terminés"""
@@ -382,14 +580,46 @@ class ReceptionDossier(models.Model):
                     subtype_xmlid='mail.mt_comment'
                 )
     
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_creer_dossiers(self, duree_max=DUREE_MAX_CREATION):
+        """Poursuit la création par lots des dossiers des réceptions en attente.
+
+        Les dossiers sont créés jusqu'au nombre reçu, ou à partir des lignes
+        restantes d'un bordereau importé. Chaque lot est validé en base, une interruption ne fait donc perdre que
+        le lot en cours. Quand sa durée maximale est atteinte avant la fin, le
+        cron se relance lui-même après DELAI_RELANCE_CREATION secondes.
+        """
+        echeance = time.monotonic() + duree_max
+        for reception in self.search([('creation_en_cours', '=', True)], order='id'):
+            try:
+                termine = reception._poursuivre_creation_dossiers(echeance)
+                if termine:
+                    reception._terminer_creation_dossiers(reception.creation_valider, reception.creation_demarrer)
+                self.env.cr.commit()
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Échec de la création des dossiers de la réception %s", reception.id)
+                reception.write({'creation_en_cours': False, 'creation_erreur': str(e)})
+                reception.message_post(
+                    body=_("Création des dossiers interrompue : %s") % e,
+                    subtype_xmlid='mail.mt_comment'
+                )
+                self.env.cr.commit()
+                continue
+            if not termine:
+                self.env.ref('archivage_collecteurs_complet.cron_creer_dossiers_reception')._trigger(
+                    at=fields.Datetime.now() + timedelta(seconds=DELAI_RELANCE_CREATION)
+                )
+                break
+        return True
+    
     # === CONTRAINTES ===
     @api.constrains('nombre_dossiers')
     def _check_nombre_dossiers(self):
         for record in self:
             if record.nombre_dossiers <= 0:
                 raise ValidationError(_("Le nombre de dossiers doit être supérieur à 0."))
-            if record.nombre_dossiers > 1000:
-                raise ValidationError(_("Le nombre de dossiers ne peut pas dépasser 1000 par réception."))
     
     @api.constrains('date_reception')
     def _check_date_reception(self):
@@ -5,6 +5,29 @@ from odoo.exceptions import UserError, ValidationError
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
 
+# Étapes de production mesurées par les KPIs : modèle source, responsable,
+# colonne de durée brute (minutes) et colonne du nombre de pièces
+ETAPES_KPI = {
+    'traitement': {
+        'model': 'traitement.physique',
+        'agent': 'agent_id',
+        'duree': 'duree_traitement',
+        'pieces': 'nombre_pieces_traitees',
+    },
+    'numerisation': {
+        'model': 'numerisation.dossier',
+        'agent': 'operateur_id',
+        'duree': 'duree_numerisation',
+        'pieces': 'nombre_pieces',
+    },
+    'indexation': {
+        'model': 'indexation.dossier',
+        'agent': 'agent_id',
+        'duree': 'duree_indexation',
+        'pieces': 'nombre_pieces_indexees',
+    },
+}
+
 
 class ReportingKPI(models.Model):
     _name = 'reporting.kpi'
@@ -53,21 +76,21 @@ class ReportingKPI(models.Model):
     # === KPIs RÉCEPTION ===
     nb_dossiers_receptionnes = fields.Integer(
         string='Dossiers Réceptionnés',
-        compute='_compute_kpis_reception',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de dossiers réceptionnés dans la période"
     )
     
     nb_receptions_total = fields.Integer(
         string='Nombre de Réceptions',
-        compute='_compute_kpis_reception',
+        compute='_compute_kpis',
         store=True,
         help="Nombre total de réceptions dans la période"
     )
     
     moyenne_dossiers_par_reception = fields.Float(
         string='Moyenne Dossiers/Réception',
-        compute='_compute_kpis_reception',
+        compute='_compute_kpis',
         store=True,
         help="Nombre moyen de dossiers par réception"
     )
@@ -75,21 +98,21 @@ class ReportingKPI(models.Model):
     # === KPIs TRAITEMENT PHYSIQUE ===
     nb_dossiers_traites = fields.Integer(
         string='Dossiers Traités',
-        compute='_compute_kpis_traitement',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de dossiers traités physiquement"
     )
     
     duree_moyenne_traitement = fields.Float(
         string='Durée Moyenne Traitement (min)',
-        compute='_compute_kpis_traitement',
+        compute='_compute_kpis',
         store=True,
         help="Durée moyenne de traitement par dossier en minutes"
     )
     
     duree_totale_traitement = fields.Float(
         string='Durée Totale Traitement (h)',
-        compute='_compute_kpis_traitement',
+        compute='_compute_kpis',
         store=True,
         help="Durée totale de traitement en heures"
     )
@@ -97,28 +120,28 @@ class ReportingKPI(models.Model):
     # === KPIs NUMÉRISATION ===
     nb_dossiers_numerises = fields.Integer(
         string='Dossiers Numérisés',
-        compute='_compute_kpis_numerisation',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de dossiers numérisés par jour"
     )
     
     nb_pieces_numerisees = fields.Integer(
         string='Pièces Numérisées',
-        compute='_compute_kpis_numerisation',
+        compute='_compute_kpis',
         store=True,
         help="Nombre total de pièces numérisées"
     )
     
     duree_moyenne_numerisation = fields.Float(
         string='Durée Moyenne Numérisation (min)',
-        compute='_compute_kpis_numerisation',
+        compute='_compute_kpis',
         store=True,
         help="Durée moyenne de numérisation par dossier"
     )
     
     vitesse_moyenne_numerisation = fields.Float(
         string='Vitesse Moyenne (pièces/min)',
-        compute='_compute_kpis_numerisation',
+        compute='_compute_kpis',
         store=True,
         help="Vitesse moyenne de numérisation"
     )
@@ -126,28 +149,28 @@ class ReportingKPI(models.Model):
     # === KPIs INDEXATION ===
     nb_pieces_indexees = fields.Integer(
         string='Pièces Indexées',
-        compute='_compute_kpis_indexation',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de pièces indexées"
     )
     
     nb_documents_indexes = fields.Integer(
         string='Documents Indexés',
-        compute='_compute_kpis_indexation',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de documents indexés"
     )
     
     duree_moyenne_indexation = fields.Float(
         string='Durée Moyenne Indexation (min)',
-        compute='_compute_kpis_indexation',
+        compute='_compute_kpis',
         store=True,
         help="Durée moyenne d'indexation par document"
     )
     
     vitesse_moyenne_indexation = fields.Float(
         string='Vitesse Moyenne Indexation (pièces/min)',
-        compute='_compute_kpis_indexation',
+        compute='_compute_kpis',
         store=True,
         help="Vitesse moyenne d'indexation"
     )
@@ -155,21 +178,21 @@ class ReportingKPI(models.Model):
     # === KPIs LIVRAISON ===
     nb_receptions_livrees = fields.Integer(
         string='Réceptions Livrées',
-        compute='_compute_kpis_livraison',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de réceptions livrées"
     )
     
     nb_dossiers_livres = fields.Integer(
         string='Dossiers Livrés',
-        compute='_compute_kpis_livraison',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de dossiers livrés"
     )
     
     nb_livraisons_effectuees = fields.Integer(
         string='Livraisons Effectuées',
-        compute='_compute_kpis_livraison',
+        compute='_compute_kpis',
         store=True,
         help="Nombre de livraisons effectuées"
     )
@@ -177,44 +200,46 @@ class ReportingKPI(models.Model):
     # === TAUX D'ERREURS ET QUALITÉ ===
     taux_erreurs = fields.Float(
         string='Taux d\'Erreurs (%)',
-        compute='_compute_taux_erreurs',
+        compute='_compute_kpis',
         store=True,
         help="Taux d'erreurs mensuel"
     )
     
     nb_erreurs_traitement = fields.Integer(
         string='Erreurs Traitement',
-        compute='_compute_taux_erreurs',
+        compute='_compute_kpis',
         store=True,
         help="Nombre d'erreurs en traitement"
     )
     
     nb_erreurs_numerisation = fields.Integer(
         string='Erreurs Numérisation',
-        compute='_compute_taux_erreurs',
+        compute='_compute_kpis',
         store=True,
         help="Nombre d'erreurs en numérisation"
     )
     
     nb_erreurs_indexation = fields.Integer(
         string='Erreurs Indexation',
-        compute='_compute_taux_erreurs',
+        compute='_compute_kpis',
         store=True,
         help="Nombre d'erreurs en indexation"
     )
     
     nb_erreurs_livraison = fields.Integer(
         string='Erreurs Livraison',
-        compute='_compute_taux_erreurs',
+        compute='_compute_kpis',
         store=True,
         help="Nombre d'erreurs en livraison"
     )
     
     # === PERFORMANCE PAR AGENT ===
-    performance_agents = fields.Text(
+    ligne_agent_ids = fields.One2many(
+        'reporting.kpi.agent',
+        'rapport_id',
         string='Performance par Agent',
-        compute='_compute_performance_agents',
-        help="Détail des performances par agent (JSON)"
+        readonly=True,
+        help="KPIs par agent et par étape sur la période du rapport"
     )
     
     # === TENDANCES ===
@@ -249,261 +274,278 @@ class ReportingKPI(models.Model):
         help="Notes sur le rapport"
     )
     
-    # === MÉTHODES DE CALCUL DES KPIs ===
-    @api.depends('date_debut', 'date_fin')
-    def _compute_kpis_reception(self):
-        for record in self:
-            domain = [
-                ('date_reception', '>=', record.date_debut),
-                ('date_reception', '<=', record.date_fin),
-                ('state', 'in', ['valide', 'en_cours', 'termine'])
-            ]
-            
-            receptions = self.env['reception.dossier'].search(domain)
-            
-            record.nb_receptions_total = len(receptions)
-            record.nb_dossiers_receptionnes = sum(receptions.mapped('nombre_dossiers'))
-            
-            if record.nb_receptions_total > 0:
-                record.moyenne_dossiers_par_reception = record.nb_dossiers_receptionnes / record.nb_receptions_total
-            else:
-                record.moyenne_dossiers_par_reception = 0
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_kpis_traitement(self):
-        for record in self:
-            domain = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'valide')
-            ]
-            
-            traitements = self.env['traitement.physique'].search(domain)
-            
-            record.nb_dossiers_traites = len(traitements)
-            
-            if traitements:
-                durees_effectives = traitements.mapped('duree_effective')
-                record.duree_moyenne_traitement = sum(durees_effectives) / len(durees_effectives)
-                record.duree_totale_traitement = sum(durees_effectives) / 60  # Conversion en heures
-            else:
-                record.duree_moyenne_traitement = 0
-                record.duree_totale_traitement = 0
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_kpis_numerisation(self):
-        for record in self:
-            domain = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'valide')
-            ]
-            
-            numerisations = self.env['numerisation.dossier'].search(domain)
-            
-            record.nb_dossiers_numerises = len(numerisations)
-            record.nb_pieces_numerisees = sum(numerisations.mapped('nombre_pieces'))
-            
-            if numerisations:
-                durees_effectives = numerisations.mapped('duree_effective')
-                vitesses = numerisations.mapped('vitesse_numerisation')
-                
-                record.duree_moyenne_numerisation = sum(durees_effectives) / len(durees_effectives)
-                record.vitesse_moyenne_numerisation = sum(vitesses) / len(vitesses)
-            else:
-                record.duree_moyenne_numerisation = 0
-                record.vitesse_moyenne_numerisation = 0
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_kpis_indexation(self):
-        for record in self:
-            domain = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'valide')
-            ]
-            
-            indexations = self.env['indexation.dossier'].search(domain)
-            
-            record.nb_documents_indexes = len(indexations)
-            record.nb_pieces_indexees = sum(indexations.mapped('nombre_pieces_indexees'))
-            
-            if indexations:
-                durees_effectives = indexations.mapped('duree_effective')
-                vitesses = indexations.mapped('vitesse_indexation')
-                
-                record.duree_moyenne_indexation = sum(durees_effectives) / len(durees_effectives)
-                record.vitesse_moyenne_indexation = sum(vitesses) / len(vitesses)
-            else:
-                record.duree_moyenne_indexation = 0
-                record.vitesse_moyenne_indexation = 0
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_kpis_livraison(self):
-        for record in self:
-            # Réceptions livrées
-            domain_receptions = [
-                ('date_reception', '>=', record.date_debut),
-                ('date_reception', '<=', record.date_fin),
-                ('state', '=', 'termine')
-            ]
-            receptions_livrees = self.env['reception.dossier'].search(domain_receptions)
-            record.nb_receptions_livrees = len(receptions_livrees)
-            
-            # Dossiers livrés
-            domain_dossiers = [
-                ('date_livraison', '>=', record.date_debut),
-                ('date_livraison', '<=', record.date_fin),
-                ('state', '=', 'livre')
-            ]
-            dossiers_livres = self.env['dossier.collecteur'].search(domain_dossiers)
-            record.nb_dossiers_livres = len(dossiers_livres)
-            
-            # Livraisons effectuées
-            domain_livraisons = [
-                ('date_livraison', '>=', record.date_debut),
-                ('date_livraison', '<=', record.date_fin),
-                ('state', 'in', ['livre', 'confirme'])
-            ]
-            livraisons = self.env['livraison.numerique'].search(domain_livraisons)
-            record.nb_livraisons_effectuees = len(livraisons)
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_taux_erreurs(self):
-        for record in self:
-            # Erreurs de traitement
-            domain_traitement = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'erreur')
-            ]
-            record.nb_erreurs_traitement = self.env['traitement.physique'].search_count(domain_traitement)
-            
-            # Erreurs de numérisation
-            domain_numerisation = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'erreur')
-            ]
-            record.nb_erreurs_numerisation = self.env['numerisation.dossier'].search_count(domain_numerisation)
-            
-            # Erreurs d'indexation
-            domain_indexation = [
-                ('heure_debut', '>=', record.date_debut),
-                ('heure_fin', '<=', record.date_fin),
-                ('state', '=', 'erreur')
-            ]
-            record.nb_erreurs_indexation = self.env['indexation.dossier'].search_count(domain_indexation)
-            
-            # Erreurs de livraison
-            domain_livraison = [
-                ('date_livraison', '>=', record.date_debut),
-                ('date_livraison', '<=', record.date_fin),
-                ('state', '=', 'erreur')
-            ]
-            record.nb_erreurs_livraison = self.env['livraison.numerique'].search_count(domain_livraison)
-            
-            # Calcul du taux d'erreurs global
-            total_erreurs = (record.nb_erreurs_traitement + record.nb_erreurs_numerisation + 
-                           record.nb_erreurs_indexation + record.nb_erreurs_livraison)
-            
-            total_operations = (record.nb_dossiers_traites + record.nb_dossiers_numerises + 
-                              record.nb_documents_indexes + record.nb_livraisons_effectuees)
-            
-            if total_operations > 0:
-                record.taux_erreurs = (total_erreurs / total_operations) * 100
-            else:
-                record.taux_erreurs = 0
-    
-    @api.depends('date_debut', 'date_fin')
-    def _compute_performance_agents(self):
+    # === MOTEUR DE CALCUL DES KPIs ===
+    @api.depends('date_debut', 'date_fin', 'periode_type')
+    def _compute_kpis(self):
+        """Calcule toutes les familles de KPIs en une passe.
+        
+        Les périodes des rapports sont agrégées ensemble par une seule
+        requête groupée.
+        """
+        periodes = {
+            record: (record.date_debut, record.date_fin)
+            for record in self if record.date_debut and record.date_fin
+        }
+        sommes = self._get_sommes_kpis(list(periodes.values()))
+        
         for record in self:
-            import json
-            
-            performance = {}
-            
-            # Performance agents de traitement
-            agents_traitement = self.env['res.users'].search([
-                ('groups_id.name', 'ilike', 'Agent de Traitement')
-            ])
-            
-            for agent in agents_traitement:
-                kpis = self.env['traitement.physique'].get_kpi_agent(
-                    agent.id, record.date_debut, record.date_fin
-                )
-                if kpis['nombre_dossiers'] > 0:
-                    performance[f"traitement_{agent.name}"] = kpis
-            
-            # Performance opérateurs numérisation
-            operateurs = self.env['res.users'].search([
-                ('groups_id.name', 'ilike', 'Opérateur Numérisation')
-            ])
-            
-            for operateur in operateurs:
-                kpis = self.env['numerisation.dossier'].get_kpi_operateur(
-                    operateur.id, record.date_debut, record.date_fin
-                )
-                if kpis['nombre_dossiers'] > 0:
-                    performance[f"numerisation_{operateur.name}"] = kpis
-            
-            # Performance agents indexation
-            agents_indexation = self.env['res.users'].search([
-                ('groups_id.name', 'ilike', 'Agent Indexation')
-            ])
-            
-            for agent in agents_indexation:
-                kpis = self.env['indexation.dossier'].get_kpi_agent(
-                    agent.id, record.date_debut, record.date_fin
-                )
-                if kpis['nombre_documents'] > 0:
-                    performance[f"indexation_{agent.name}"] = kpis
-            
-            record.performance_agents = json.dumps(performance, indent=2)
+            if record not in periodes:
+                record.update(self._finaliser_kpis(self._get_sommes_vides()))
+                continue
+            record.update(self._finaliser_kpis(sommes[periodes[record]]))
     
-    @api.depends('date_debut', 'date_fin', 'periode_type')
+    @api.depends('date_debut', 'date_fin', 'periode_type',
+                 'nb_dossiers_receptionnes', 'nb_dossiers_traites', 'nb_dossiers_numerises')
     def _compute_tendances(self):
+        """Calcule les évolutions sur la période précédente, sans recalculer les KPIs stockés.
+        
+        Seules les périodes précédentes sont agrégées, par une seule requête
+        groupée pour tous les rapports.
+        """
+        precedentes = {
+            record: self._get_periode_precedente(record.periode_type, record.date_debut, record.date_fin)
+            for record in self if record.date_debut and record.date_fin
+        }
+        sommes = self._get_sommes_kpis(list(precedentes.values()))
+        
         for record in self:
-            # Calculer la période précédente
-            if record.periode_type == 'quotidien':
-                date_debut_precedente = record.date_debut - timedelta(days=1)
-                date_fin_precedente = record.date_fin - timedelta(days=1)
-            elif record.periode_type == 'hebdomadaire':
-                date_debut_precedente = record.date_debut - timedelta(weeks=1)
-                date_fin_precedente = record.date_fin - timedelta(weeks=1)
-            elif record.periode_type == 'mensuel':
-                date_debut_precedente = record.date_debut - relativedelta(months=1)
-                date_fin_precedente = record.date_fin - relativedelta(months=1)
-            else:
-                # Pour les autres types, utiliser la même durée
-                duree = (record.date_fin - record.date_debut).days
-                date_debut_precedente = record.date_debut - timedelta(days=duree)
-                date_fin_precedente = record.date_debut - timedelta(days=1)
-            
-            # Créer un rapport temporaire pour la période précédente
-            rapport_precedent = self.new({
-                'date_debut': date_debut_precedente,
-                'date_fin': date_fin_precedente,
-                'periode_type': record.periode_type
-            })
-            
-            # Calculer les évolutions
-            if rapport_precedent.nb_dossiers_receptionnes > 0:
-                record.evolution_reception = ((record.nb_dossiers_receptionnes - rapport_precedent.nb_dossiers_receptionnes) / 
-                                            rapport_precedent.nb_dossiers_receptionnes) * 100
-            else:
-                record.evolution_reception = 0
-            
-            if rapport_precedent.nb_dossiers_traites > 0:
-                record.evolution_traitement = ((record.nb_dossiers_traites - rapport_precedent.nb_dossiers_traites) / 
-                                             rapport_precedent.nb_dossiers_traites) * 100
-            else:
-                record.evolution_traitement = 0
-            
-            if rapport_precedent.nb_dossiers_numerises > 0:
-                record.evolution_numerisation = ((record.nb_dossiers_numerises - rapport_precedent.nb_dossiers_numerises) / 
-                                               rapport_precedent.nb_dossiers_numerises) * 100
-            else:
-                record.evolution_numerisation = 0
+            if record not in precedentes:
+                record.update(dict.fromkeys(('evolution_reception', 'evolution_traitement', 'evolution_numerisation'), 0))
+                continue
+            record.update(self._calculer_evolutions(record, self._finaliser_kpis(sommes[precedentes[record]])))
+    
+    @api.model
+    def _finaliser_kpis_tendances(self, sommes, sommes_precedentes):
+        """Valeurs des KPIs d'une période, avec leur évolution sur la période précédente"""
+        valeurs = self._finaliser_kpis(sommes)
+        valeurs.update(self._calculer_evolutions(valeurs, self._finaliser_kpis(sommes_precedentes)))
+        return valeurs
+    
+    @api.model
+    def _calculer_evolutions(self, valeurs, precedentes):
+        """Évolutions des volumes d'une période (valeurs KPI ou rapport) sur la période précédente"""
+        return {
+            'evolution_reception': self._calculer_evolution(
+                valeurs['nb_dossiers_receptionnes'], precedentes['nb_dossiers_receptionnes']),
+            'evolution_traitement': self._calculer_evolution(
+                valeurs['nb_dossiers_traites'], precedentes['nb_dossiers_traites']),
+            'evolution_numerisation': self._calculer_evolution(
+                valeurs['nb_dossiers_numerises'], precedentes['nb_dossiers_numerises']),
+        }
+    
+    @api.model
+    def _get_periode_precedente(self, periode_type, date_debut, date_fin):
+        """Retourne les dates (début, fin) de la période précédant une période"""
+        if periode_type == 'quotidien':
+            return date_debut - timedelta(days=1), date_fin - timedelta(days=1)
+        if periode_type == 'hebdomadaire':
+            return date_debut - timedelta(weeks=1), date_fin - timedelta(weeks=1)
+        if periode_type == 'mensuel':
+            return date_debut - relativedelta(months=1), date_fin - relativedelta(months=1)
+        # Pour les autres types, utiliser la même durée
+        duree = (date_fin - date_debut).days
+        return date_debut - timedelta(days=duree), date_debut - timedelta(days=1)
+    
+    @api.model
+    def _calculer_evolution(self, valeur, valeur_precedente):
+        """Évolution en pourcentage par rapport à la période précédente"""
+        if valeur_precedente > 0:
+            return ((valeur - valeur_precedente) / valeur_precedente) * 100
+        return 0
+    
+    @api.model
+    def _get_sommes_vides(self):
+        """Retourne des sommes KPI à zéro pour une période"""
+        sommes = {
+            'nb_receptions': 0,
+            'nb_dossiers_receptionnes': 0,
+            'nb_receptions_livrees': 0,
+            'nb_dossiers_livres': 0,
+            'nb_livraisons': 0,
+            'nb_erreurs_livraison': 0,
+        }
+        for etape in ETAPES_KPI:
+            sommes[etape] = {'nombre': 0, 'duree': 0.0, 'pieces': 0, 'vitesse': 0.0, 'erreurs': 0}
+        return sommes
+    
+    @api.model
+    def _get_sommes_kpis(self, periodes):
+        """Agrège le cumul journalier pour une liste de périodes (date_debut, date_fin).
+        
+        Les KPIs sont obtenus en sommant les lignes de reporting.kpi.journalier
+        de chaque période, par une seule requête groupée couvrant toutes les
+        périodes demandées : le coût ne dépend que du nombre de jours et
+        d'agents, plus du volume des tables sources.
+        Retourne un dictionnaire {(date_debut, date_fin): sommes additives}.
+        """
+        periodes = sorted(set(periodes))
+        if not periodes:
+            return {}
+        
+        sommes = {periode: self._get_sommes_vides() for periode in periodes}
+        periodes_sql = ', '.join(['(%s::date, %s::date)'] * len(periodes))
+        params = [date_periode for periode in periodes for date_periode in periode]
+        
+        Cumul = self.env['reporting.kpi.journalier']
+        Cumul.flush_model()
+        self.env.cr.execute(f"""
+            WITH periodes(date_debut, date_fin) AS (VALUES {periodes_sql})
+            SELECT p.date_debut, p.date_fin, j.etape,
+                   SUM(j.nombre), SUM(j.nombre_dossiers), SUM(j.nombre_pieces),
+                   SUM(j.duree_totale), SUM(j.vitesse_totale),
+                   SUM(j.nombre_erreurs), SUM(j.nombre_livres)
+              FROM periodes p
+              JOIN {Cumul._table} j
+                ON j.date BETWEEN p.date_debut AND p.date_fin
+             GROUP BY p.date_debut, p.date_fin, j.etape
+        """, params)
+        
+        for (date_debut, date_fin, etape, nombre, nb_dossiers, pieces,
+             duree, vitesse, erreurs, nb_livres) in self.env.cr.fetchall():
+            periode = sommes[(date_debut, date_fin)]
+            if etape == 'reception':
+                periode['nb_receptions'] = int(nombre)
+                periode['nb_dossiers_receptionnes'] = int(nb_dossiers)
+                periode['nb_receptions_livrees'] = int(nb_livres)
+            elif etape == 'livraison':
+                periode['nb_livraisons'] = int(nombre)
+                periode['nb_dossiers_livres'] = int(nb_dossiers)
+                periode['nb_erreurs_livraison'] = int(erreurs)
+            elif etape in ETAPES_KPI:
+                periode[etape] = {
+                    'nombre': int(nombre),
+                    'duree': float(duree),
+                    'pieces': int(pieces),
+                    'vitesse': float(vitesse),
+                    'erreurs': int(erreurs),
+                }
+        
+        return sommes
+    
+    @api.model
+    def _finaliser_kpis(self, sommes):
+        """Convertit les sommes agrégées d'une période en valeurs des champs KPI"""
+        traitement = sommes['traitement']
+        numerisation = sommes['numerisation']
+        indexation = sommes['indexation']
+        
+        def moyenne(total, nombre):
+            return total / nombre if nombre else 0
+        
+        valeurs = {
+            # Réception
+            'nb_receptions_total': sommes['nb_receptions'],
+            'nb_dossiers_receptionnes': sommes['nb_dossiers_receptionnes'],
+            'moyenne_dossiers_par_reception': moyenne(sommes['nb_dossiers_receptionnes'], sommes['nb_receptions']),
+            # Traitement physique
+            'nb_dossiers_traites': traitement['nombre'],
+            'duree_moyenne_traitement': moyenne(traitement['duree'], traitement['nombre']),
+            'duree_totale_traitement': traitement['duree'] / 60,  # Conversion en heures
+            # Numérisation
+            'nb_dossiers_numerises': numerisation['nombre'],
+            'nb_pieces_numerisees': numerisation['pieces'],
+            'duree_moyenne_numerisation': moyenne(numerisation['duree'], numerisation['nombre']),
+            'vitesse_moyenne_numerisation': moyenne(numerisation['vitesse'], numerisation['nombre']),
+            # Indexation
+            'nb_documents_indexes': indexation['nombre'],
+            'nb_pieces_indexees': indexation['pieces'],
+            'duree_moyenne_indexation': moyenne(indexation['duree'], indexation['nombre']),
+            'vitesse_moyenne_indexation': moyenne(indexation['vitesse'], indexation['nombre']),
+            # Livraison
+            'nb_receptions_livrees': sommes['nb_receptions_livrees'],
+            'nb_dossiers_livres': sommes['nb_dossiers_livres'],
+            'nb_livraisons_effectuees': sommes['nb_livraisons'],
+            # Erreurs
+            'nb_erreurs_traitement': traitement['erreurs'],
+            'nb_erreurs_numerisation': numerisation['erreurs'],
+            'nb_erreurs_indexation': indexation['erreurs'],
+            'nb_erreurs_livraison': sommes['nb_erreurs_livraison'],
+        }
+        
+        total_erreurs = (valeurs['nb_erreurs_traitement'] + valeurs['nb_erreurs_numerisation'] +
+                         valeurs['nb_erreurs_indexation'] + valeurs['nb_erreurs_livraison'])
+        total_operations = (valeurs['nb_dossiers_traites'] + valeurs['nb_dossiers_numerises'] +
+                            valeurs['nb_documents_indexes'] + valeurs['nb_livraisons_effectuees'])
+        valeurs['taux_erreurs'] = moyenne(total_erreurs, total_operations) * 100
+        
+        return valeurs
+    
+    @api.model
+    def _get_sommes_agents_kpis(self, periodes):
+        """Agrège le cumul journalier par étape de production et par agent.
+        
+        Mêmes bornes que _get_sommes_kpis (jours du cumul compris dans la
+        période) : les lignes par agent d'un rapport s'additionnent en ses
+        KPIs. Une seule requête groupée pour toutes les périodes.
+        Retourne {(date_debut, date_fin): {(etape, agent_id): sommes}}.
+        """
+        periodes = sorted(set(periodes))
+        if not periodes:
+            return {}
+        
+        sommes = {periode: {} for periode in periodes}
+        periodes_sql = ', '.join(['(%s::date, %s::date)'] * len(periodes))
+        params = [date_periode for periode in periodes for date_periode in periode]
+        params.append(list(ETAPES_KPI))
+        
+        Cumul = self.env['reporting.kpi.journalier']
+        Cumul.flush_model()
+        self.env.cr.execute(f"""
+            WITH periodes(date_debut, date_fin) AS (VALUES {periodes_sql})
+            SELECT p.date_debut, p.date_fin, j.etape, j.agent_id,
+                   SUM(j.nombre), SUM(j.nombre_pieces), SUM(j.duree_totale), SUM(j.vitesse_totale)
+              FROM periodes p
+              JOIN {Cumul._table} j
+                ON j.date BETWEEN p.date_debut AND p.date_fin
+             WHERE j.etape = ANY(%s)
+               AND j.agent_id IS NOT NULL
+             GROUP BY p.date_debut, p.date_fin, j.etape, j.agent_id
+            HAVING SUM(j.nombre) > 0
+        """, params)
+        
+        for date_debut, date_fin, etape, agent_id, nombre, pieces, duree, vitesse in self.env.cr.fetchall():
+            sommes[(date_debut, date_fin)][(etape, agent_id)] = {
+                'nombre': int(nombre),
+                'nombre_pieces': int(pieces),
+                'duree_totale': float(duree),
+                'vitesse_totale': float(vitesse),
+            }
+        
+        return sommes
+    
+    def _generer_lignes_agents(self):
+        """(Re)génère les lignes de performance par agent des rapports.
+        
+        Les lignes sont lues dans le cumul journalier, comme les KPIs du
+        rapport, par une seule requête groupée pour tous les rapports ; elles
+        sont recréées en un seul create.
+        """
+        self.ligne_agent_ids.unlink()
+        
+        rapports = self.filtered(lambda r: r.date_debut and r.date_fin)
+        sommes = self._get_sommes_agents_kpis([(r.date_debut, r.date_fin) for r in rapports])
+        
+        vals_list = []
+        for record in rapports:
+            percentiles = self.env['reporting.kpi.histogramme'].get_percentiles(record.date_debut, record.date_fin)
+            for (etape, agent_id), sommes_agent in sommes[(record.date_debut, record.date_fin)].items():
+                nombre = sommes_agent['nombre']
+                percentiles_agent = percentiles.get((etape, agent_id), {})
+                vals_list.append({
+                    'rapport_id': record.id,
+                    'etape': etape,
+                    'agent_id': agent_id,
+                    'nombre': nombre,
+                    'nombre_pieces': sommes_agent['nombre_pieces'],
+                    'duree_totale': sommes_agent['duree_totale'],
+                    'duree_moyenne': sommes_agent['duree_totale'] / nombre,
+                    'vitesse_moyenne': sommes_agent['vitesse_totale'] / nombre,
+                    'duree_p50': percentiles_agent.get(50, 0),
+                    'duree_p90': percentiles_agent.get(90, 0),
+                    'duree_p99': percentiles_agent.get(99, 0),
+                })
+        
+        self.env['reporting.kpi.agent'].create(vals_list)
     
     # === MÉTHODES CRUD ===
     @api.model
@@ -512,7 +554,15 @@ class ReportingKPI(models.Model):
         if vals.get('periode_type') and not vals.get('date_debut'):
             vals.update(self._get_dates_periode(vals['periode_type']))
         
-        return super(ReportingKPI, self).create(vals)
+        rapport = super(ReportingKPI, self).create(vals)
+        rapport._generer_lignes_agents()
+        return rapport
+    
+    def write(self, vals):
+        result = super(ReportingKPI, self).write(vals)
+        if 'date_debut' in vals or 'date_fin' in vals:
+            self._generer_lignes_agents()
+        return result
     
     def _get_dates_periode(self, periode_type):
         """Retourne les dates de début et fin selon le type de période"""
@@ -565,14 +615,8 @@ class ReportingKPI(models.Model):
         self.ensure_one()
         
         # Forcer le recalcul de tous les champs computed
-        self._compute_kpis_reception()
-        self._compute_kpis_traitement()
-        self._compute_kpis_numerisation()
-        self._compute_kpis_indexation()
-        self._compute_kpis_livraison()
-        self._compute_taux_erreurs()
-        self._compute_performance_agents()
-        self._compute_tendances()
+        self._compute_kpis()
+        self._generer_lignes_agents()
         
         self.message_post(
             body=_("Rapport régénéré avec les données actuelles"),
@@ -639,65 +683,52 @@ class ReportingKPI(models.Model):
     
     @api.model
     def get_dashboard_data(self):
-        """Retourne les données pour le tableau de bord"""
-        aujourd_hui = fields.Date.today()
-        debut_mois = aujourd_hui.replace(day=1)
-        
-        # Données du mois en cours
-        rapport_mois = self.search([
-            ('periode_type', '=', 'mensuel'),
-            ('date_debut', '=', debut_mois)
-        ], limit=1)
-        
-        if not rapport_mois:
-            rapport_mois = self.generer_rapport_automatique('mensuel')
+        """Retourne les données pour le tableau de bord (instantané en cache)"""
+        return self.env['reporting.tableau.bord'].get_donnees()
+    
+    @api.model
+    def _calculer_donnees_tableau_bord(self, aujourd_hui):
+        """Calcule les données du tableau de bord directement depuis le cumul journalier.
         
-        # Données de la semaine en cours
+        Les périodes du jour, de la semaine et du mois, ainsi que la période
+        précédant le mois pour les tendances, sont agrégées en une requête.
+        Retourne les données et le premier jour du cumul utilisé.
+        """
+        debut_mois = aujourd_hui.replace(day=1)
+        fin_mois = (debut_mois + relativedelta(months=1)) - timedelta(days=1)
         debut_semaine = aujourd_hui - timedelta(days=aujourd_hui.weekday())
-        rapport_semaine = self.search([
-            ('periode_type', '=', 'hebdomadaire'),
-            ('date_debut', '=', debut_semaine)
-        ], limit=1)
         
-        if not rapport_semaine:
-            rapport_semaine = self.generer_rapport_automatique('hebdomadaire')
+        mois = (debut_mois, fin_mois)
+        mois_precedent = self._get_periode_precedente('mensuel', debut_mois, fin_mois)
+        semaine = (debut_semaine, debut_semaine + timedelta(days=6))
+        jour = (aujourd_hui, aujourd_hui)
         
-        # Données du jour
-        rapport_jour = self.search([
-            ('periode_type', '=', 'quotidien'),
-            ('date_debut', '=', aujourd_hui)
-        ], limit=1)
+        sommes = self._get_sommes_kpis([mois, mois_precedent, semaine, jour])
+        kpis_mois = self._finaliser_kpis_tendances(sommes[mois], sommes[mois_precedent])
+        kpis_semaine = self._finaliser_kpis(sommes[semaine])
+        kpis_jour = self._finaliser_kpis(sommes[jour])
         
-        if not rapport_jour:
-            rapport_jour = self.generer_rapport_automatique('quotidien')
-        
-        return {
-            'mensuel': {
-                'dossiers_receptionnes': rapport_mois.nb_dossiers_receptionnes,
-                'dossiers_traites': rapport_mois.nb_dossiers_traites,
-                'dossiers_numerises': rapport_mois.nb_dossiers_numerises,
-                'pieces_indexees': rapport_mois.nb_pieces_indexees,
-                'receptions_livrees': rapport_mois.nb_receptions_livrees,
-                'taux_erreurs': rapport_mois.taux_erreurs,
-                'evolution_reception': rapport_mois.evolution_reception,
-                'evolution_traitement': rapport_mois.evolution_traitement,
-                'evolution_numerisation': rapport_mois.evolution_numerisation,
-            },
-            'hebdomadaire': {
-                'dossiers_receptionnes': rapport_semaine.nb_dossiers_receptionnes,
-                'dossiers_traites': rapport_semaine.nb_dossiers_traites,
-                'dossiers_numerises': rapport_semaine.nb_dossiers_numerises,
-                'pieces_indexees': rapport_semaine.nb_pieces_indexees,
-                'receptions_livrees': rapport_semaine.nb_receptions_livrees,
-            },
-            'quotidien': {
-                'dossiers_receptionnes': rapport_jour.nb_dossiers_receptionnes,
-                'dossiers_traites': rapport_jour.nb_dossiers_traites,
-                'dossiers_numerises': rapport_jour.nb_dossiers_numerises,
-                'pieces_indexees': rapport_jour.nb_pieces_indexees,
-                'receptions_livrees': rapport_jour.nb_receptions_livrees,
+        def resume(kpis):
+            return {
+                'dossiers_receptionnes': kpis['nb_dossiers_receptionnes'],
+                'dossiers_traites': kpis['nb_dossiers_traites'],
+                'dossiers_numerises': kpis['nb_dossiers_numerises'],
+                'pieces_indexees': kpis['nb_pieces_indexees'],
+                'receptions_livrees': kpis['nb_receptions_livrees'],
             }
+        
+        donnees = {
+            'mensuel': dict(resume(kpis_mois), **{
+                'taux_erreurs': kpis_mois['taux_erreurs'],
+                'evolution_reception': kpis_mois['evolution_reception'],
+                'evolution_traitement': kpis_mois['evolution_traitement'],
+                'evolution_numerisation': kpis_mois['evolution_numerisation'],
+            }),
+            'hebdomadaire': resume(kpis_semaine),
+            'quotidien': resume(kpis_jour),
+            'files_attente': self.env['dossier.attente'].get_kpis_files_attente(debut_mois, fin_mois),
         }
+        return donnees, min(mois_precedent[0], semaine[0])
     
     # === CONTRAINTES ===
     @api.constrains('date_debut', 'date_fin')
@@ -718,3 +749,100 @@ class ReportingKPI(models.Model):
             result.append((record.id, name))
         return result
 
+
+class ReportingKPIAgent(models.Model):
+    _name = 'reporting.kpi.agent'
+    _description = "Ligne de Performance par Agent d'un Rapport KPI"
+    _order = 'rapport_id, etape, nombre_pieces desc'
+
+    rapport_id = fields.Many2one(
+        'reporting.kpi',
+        string='Rapport',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    etape = fields.Selection([
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation')
+    ], string='Étape', required=True, index=True)
+
+    agent_id = fields.Many2one(
+        'res.users',
+        string='Agent',
+        required=True,
+        index=True,
+        help="Agent ou opérateur ayant réalisé les opérations"
+    )
+
+    # Période du rapport, stockée pour comparer les rapports entre eux
+    periode_type = fields.Selection(
+        related='rapport_id.periode_type',
+        store=True,
+        index=True
+    )
+
+    date_debut = fields.Date(
+        related='rapport_id.date_debut',
+        store=True,
+        index=True
+    )
+
+    date_fin = fields.Date(
+        related='rapport_id.date_fin',
+        store=True
+    )
+
+    # === MESURES ===
+    nombre = fields.Integer(
+        string='Opérations Validées',
+        group_operator='sum',
+        help="Dossiers traités ou numérisés, documents indexés"
+    )
+
+    nombre_pieces = fields.Integer(
+        string='Pièces',
+        group_operator='sum'
+    )
+
+    duree_totale = fields.Float(
+        string='Durée Totale (min)',
+        group_operator='sum',
+        help="Durée effective totale, hors pauses"
+    )
+
+    duree_moyenne = fields.Float(
+        string='Durée Moyenne (min)',
+        group_operator='avg'
+    )
+
+    vitesse_moyenne = fields.Float(
+        string='Vitesse Moyenne (pièces/min)',
+        group_operator='avg'
+    )
+
+    # Percentiles estimés à partir de l'histogramme journalier des durées
+    duree_p50 = fields.Float(
+        string='Durée Médiane (min)',
+        group_operator='avg',
+        help="50e percentile de la durée effective"
+    )
+
+    duree_p90 = fields.Float(
+        string='Durée P90 (min)',
+        group_operator='avg',
+        help="90e percentile de la durée effective"
+    )
+
+    duree_p99 = fields.Float(
+        string='Durée P99 (min)',
+        group_operator='avg',
+        help="99e percentile de la durée effective"
+    )
+
+    _sql_constraints = [
+        ('rapport_etape_agent_uniq', 'unique(rapport_id, etape, agent_id)',
+         'Une seule ligne par agent et par étape pour un rapport.'),
+    ]
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import math
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+
+from .reporting_kpi import ETAPES_KPI
+
+# Facteur entre deux bornes de buckets successives : l'estimation d'un
+# percentile a une erreur relative d'au plus (GAMMA - 1) / (GAMMA + 1), soit ~2,4 %
+GAMMA_HISTOGRAMME = 1.05
+
+PERCENTILES_KPI = (50, 90, 99)
+
+
+class ReportingKPIHistogramme(models.Model):
+    _name = 'reporting.kpi.histogramme'
+    _description = 'Histogramme Journalier des Durées par Étape et par Agent'
+    _order = 'date desc, etape, indice'
+
+    date = fields.Date(
+        string='Date',
+        required=True,
+        index=True,
+        readonly=True,
+        help="Jour de début des opérations comptées"
+    )
+
+    etape = fields.Selection([
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation')
+    ], string='Étape', required=True, index=True, readonly=True)
+
+    agent_id = fields.Many2one(
+        'res.users',
+        string='Agent',
+        index=True,
+        readonly=True,
+        ondelete='set null'
+    )
+
+    indice = fields.Integer(
+        string='Bucket',
+        required=True,
+        readonly=True,
+        help="Indice logarithmique du bucket : durées dans ]GAMMA^(indice-1), GAMMA^indice]"
+    )
+
+    duree_max = fields.Float(
+        string='Borne Supérieure (min)',
+        readonly=True,
+        help="Durée effective maximale du bucket"
+    )
+
+    nombre = fields.Integer(
+        string='Opérations',
+        readonly=True,
+        group_operator='sum'
+    )
+
+    def init(self):
+        sql.create_unique_index(
+            self.env.cr,
+            'reporting_kpi_histogramme_cle_uniq',
+            self._table,
+            ['date', 'etape', 'COALESCE(agent_id, 0)', 'indice'],
+        )
+
+    # === BUCKETS ===
+    @api.model
+    def _indice_bucket(self, duree):
+        """Indice du bucket d'une durée strictement positive"""
+        return math.ceil(math.log(duree) / math.log(GAMMA_HISTOGRAMME))
+
+    @api.model
+    def _valeur_bucket(self, indice):
+        """Valeur représentative d'un bucket (erreur relative bornée)"""
+        return 2 * GAMMA_HISTOGRAMME ** indice / (GAMMA_HISTOGRAMME + 1)
+
+    # === MISE À JOUR INCRÉMENTALE ===
+    @api.model
+    def _appliquer_contributions(self, avant, apres):
+        """Applique la différence entre deux jeux de comptages par bucket"""
+        deltas = []
+        for cle in set(avant) | set(apres):
+            delta = apres.get(cle, 0) - avant.get(cle, 0)
+            if delta:
+                deltas.append(cle + (delta,))
+
+        if not deltas:
+            return
+
+        lignes_sql = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas))
+        params = [valeur for delta in deltas for valeur in delta]
+        self._upsert(f"SELECT * FROM (VALUES {lignes_sql}) AS v", params)
+
+    @api.model
+    def _upsert(self, select_sql, params):
+        """Ajoute aux buckets les comptages (date, étape, agent, indice, nombre) d'une requête"""
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (date, etape, agent_id, indice, duree_max, nombre,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT v.date::date, v.etape, v.agent_id::integer, v.indice::integer,
+                   POWER(%s, v.indice::integer), v.nombre::integer,
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM ({select_sql}) AS v(date, etape, agent_id, indice, nombre)
+            ON CONFLICT (date, etape, COALESCE(agent_id, 0), indice)
+            DO UPDATE SET nombre = t.nombre + EXCLUDED.nombre,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+        """, [GAMMA_HISTOGRAMME, self.env.uid, self.env.uid] + params)
+        self.invalidate_model()
+
+    # === RECONSTRUCTION (BACKFILL) ===
+    @api.model
+    def reconstruire(self, date_debut=None, date_fin=None):
+        """Reconstruit les histogrammes à partir des étapes de production"""
+        self.env.flush_all()
+        Journalier = self.env['reporting.kpi.journalier']
+        conditions = ['TRUE']
+        params = []
+        if date_debut:
+            conditions.append('date >= %s')
+            params.append(date_debut)
+        if date_fin:
+            conditions.append('date <= %s')
+            params.append(date_fin)
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE {' AND '.join(conditions)}", params)
+
+        for etape, config in ETAPES_KPI.items():
+            Etape = self.env[config['model']]
+            filtre, params = Journalier._filtre_dates('s.heure_debut', date_debut, date_fin)
+            duree_effective = f"(s.{config['duree']} - COALESCE(s.duree_pauses, 0))"
+            indice = f"CEIL(LN({duree_effective}) / LN(%s))::integer"
+            self._upsert(f"""
+                SELECT s.heure_debut::date, %s, s.{config['agent']}, {indice}, COUNT(*)
+                  FROM {Etape._table} s
+                 WHERE s.state = 'valide' AND s.heure_fin IS NOT NULL
+                   AND {duree_effective} > 0 AND {filtre}
+                 GROUP BY 1, 3, 4
+            """, [etape, GAMMA_HISTOGRAMME] + params)
+
+        self.invalidate_model()
+        return True
+
+    # === LECTURE ===
+    @api.model
+    def get_histogrammes(self, date_debut, date_fin, etapes=None, agent_ids=None, par_agent=True):
+        """Fusionne les histogrammes journaliers d'une période en une requête.
+
+        Retourne {(etape, agent_id): {indice: nombre}} ; agent_id vaut None
+        lorsque par_agent est faux (histogramme de toute l'étape).
+        """
+        self.flush_model()
+        colonne_agent = 'h.agent_id' if par_agent else 'NULL::integer'
+        conditions = ['h.date BETWEEN %s AND %s']
+        params = [date_debut, date_fin]
+        if etapes:
+            conditions.append('h.etape = ANY(%s)')
+            params.append(list(etapes))
+        if agent_ids is not None:
+            conditions.append('h.agent_id = ANY(%s)')
+            params.append(list(agent_ids))
+
+        self.env.cr.execute(f"""
+            SELECT h.etape, {colonne_agent}, h.indice, SUM(h.nombre)
+              FROM {self._table} h
+             WHERE {' AND '.join(conditions)}
+             GROUP BY 1, 2, 3
+            HAVING SUM(h.nombre) > 0
+        """, params)
+
+        histogrammes = defaultdict(dict)
+        for etape, agent_id, indice, nombre in self.env.cr.fetchall():
+            histogrammes[(etape, agent_id)][indice] = int(nombre)
+        return dict(histogrammes)
+
+    @api.model
+    def get_percentiles(self, date_debut, date_fin, etapes=None, agent_ids=None,
+                        par_agent=True, percentiles=PERCENTILES_KPI):
+        """Retourne les percentiles de durée effective (min) par étape et par agent.
+
+        Retourne {(etape, agent_id): {percentile: durée}}.
+        """
+        return {
+            cle: self._calculer_percentiles(histogramme, percentiles)
+            for cle, histogramme in self.get_histogrammes(
+                date_debut, date_fin, etapes, agent_ids, par_agent
+            ).items()
+        }
+
+    @api.model
+    def _calculer_percentiles(self, histogramme, percentiles=PERCENTILES_KPI):
+        """Estime les percentiles d'un histogramme {indice: nombre}"""
+        total = sum(histogramme.values())
+        resultat = dict.fromkeys(percentiles, 0.0)
+        if not total:
+            return resultat
+
+        indices = sorted(histogramme)
+        for percentile in percentiles:
+            rang = percentile / 100.0 * (total - 1)
+            cumul = 0
+            for indice in indices:
+                cumul += histogramme[indice]
+                if cumul > rang:
+                    resultat[percentile] = self._valeur_bucket(indice)
+                    break
+        return resultat
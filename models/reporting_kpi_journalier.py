@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import sql
+from collections import defaultdict
+from datetime import timedelta
+
+from .reporting_kpi import ETAPES_KPI
+
+# Mesures additives stockées dans le cumul journalier
+MESURES_KPI = (
+    'nombre',
+    'nombre_dossiers',
+    'nombre_pieces',
+    'duree_totale',
+    'vitesse_totale',
+    'nombre_erreurs',
+    'nombre_livres',
+)
+
+MESURES_DECIMALES = ('duree_totale', 'vitesse_totale')
+
+
+class ReportingKPIJournalier(models.Model):
+    _name = 'reporting.kpi.journalier'
+    _description = 'Cumul Journalier des KPIs par Étape et par Agent'
+    _order = 'date desc, etape'
+
+    date = fields.Date(
+        string='Date',
+        required=True,
+        index=True,
+        readonly=True,
+        help="Jour de l'activité cumulée"
+    )
+
+    etape = fields.Selection([
+        ('reception', 'Réception'),
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation'),
+        ('livraison', 'Livraison Numérique')
+    ], string='Étape', required=True, index=True, readonly=True)
+
+    agent_id = fields.Many2one(
+        'res.users',
+        string='Agent',
+        index=True,
+        readonly=True,
+        ondelete='set null',
+        help="Agent, opérateur ou archiviste responsable"
+    )
+
+    # === MESURES ===
+    nombre = fields.Integer(
+        string='Nombre',
+        readonly=True,
+        group_operator='sum',
+        help="Réceptions validées, traitements/numérisations/indexations validés ou livraisons effectuées"
+    )
+
+    nombre_dossiers = fields.Integer(
+        string='Dossiers',
+        readonly=True,
+        group_operator='sum',
+        help="Dossiers réceptionnés (réception) ou dossiers livrés (livraison)"
+    )
+
+    nombre_pieces = fields.Integer(
+        string='Pièces',
+        readonly=True,
+        group_operator='sum',
+        help="Pièces traitées, numérisées ou indexées"
+    )
+
+    duree_totale = fields.Float(
+        string='Durée Effective Totale (min)',
+        readonly=True,
+        group_operator='sum',
+        help="Somme des durées effectives (hors pauses)"
+    )
+
+    vitesse_totale = fields.Float(
+        string='Somme des Vitesses',
+        readonly=True,
+        group_operator='sum',
+        help="Somme des vitesses individuelles, pour le calcul des vitesses moyennes"
+    )
+
+    nombre_erreurs = fields.Integer(
+        string='Erreurs',
+        readonly=True,
+        group_operator='sum',
+        help="Opérations en erreur"
+    )
+
+    nombre_livres = fields.Integer(
+        string='Réceptions Livrées',
+        readonly=True,
+        group_operator='sum',
+        help="Réceptions terminées (étape réception)"
+    )
+
+    def init(self):
+        # Une seule ligne par jour, étape et agent (agent vide compris)
+        sql.create_unique_index(
+            self.env.cr,
+            'reporting_kpi_journalier_cle_uniq',
+            self._table,
+            ['date', 'etape', 'COALESCE(agent_id, 0)'],
+        )
+
+    # === MISE À JOUR INCRÉMENTALE ===
+    @api.model
+    def _appliquer_contributions(self, avant, apres):
+        """Applique la différence entre deux jeux de contributions au cumul.
+
+        Les contributions sont des dictionnaires {(date, etape, agent_id): mesures}.
+        Les deltas sont appliqués par un upsert atomique, sans lecture préalable
+        des lignes du cumul.
+        """
+        deltas = []
+        for cle in set(avant) | set(apres):
+            mesures_avant = avant.get(cle, {})
+            mesures_apres = apres.get(cle, {})
+            delta = [mesures_apres.get(m, 0) - mesures_avant.get(m, 0) for m in MESURES_KPI]
+            if any(delta):
+                deltas.append(cle + tuple(delta))
+
+        if not deltas:
+            return
+
+        lignes_sql = ', '.join(['(%s, %s, %s' + ', %s' * len(MESURES_KPI) + ')'] * len(deltas))
+        params = [valeur for delta in deltas for valeur in delta]
+        self._upsert(f"SELECT * FROM (VALUES {lignes_sql}) AS v", params)
+
+    @api.model
+    def _upsert(self, select_sql, params):
+        """Ajoute au cumul les lignes produites par une requête SELECT.
+
+        La requête doit retourner date, étape, agent puis les mesures dans l'ordre
+        de MESURES_KPI. Les lignes existantes sont incrémentées.
+        """
+        colonnes = ', '.join(MESURES_KPI)
+        valeurs = ', '.join(
+            f"v.{m}::{'float8' if m in MESURES_DECIMALES else 'integer'}" for m in MESURES_KPI
+        )
+        increments = ', '.join(f"{m} = t.{m} + EXCLUDED.{m}" for m in MESURES_KPI)
+
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (date, etape, agent_id, {colonnes}, create_uid, create_date, write_uid, write_date)
+            SELECT v.date::date, v.etape, v.agent_id::integer, {valeurs},
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM ({select_sql}) AS v(date, etape, agent_id, {colonnes})
+            ON CONFLICT (date, etape, COALESCE(agent_id, 0))
+            DO UPDATE SET {increments},
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+        """, [self.env.uid, self.env.uid] + params)
+        self.invalidate_model()
+
+    # === RECONSTRUCTION (BACKFILL) ===
+    @api.model
+    def reconstruire(self, date_debut=None, date_fin=None):
+        """Reconstruit le cumul à partir des tables sources.
+
+        Sans dates, l'ensemble de l'historique est recalculé. Chaque source est
+        agrégée par jour et par agent en une requête INSERT ... SELECT.
+        """
+        self.env.flush_all()
+        conditions = ['TRUE']
+        params = []
+        if date_debut:
+            conditions.append('date >= %s')
+            params.append(date_debut)
+        if date_fin:
+            conditions.append('date <= %s')
+            params.append(date_fin)
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE {' AND '.join(conditions)}", params)
+
+        self._reconstruire_receptions(date_debut, date_fin)
+        for etape in ETAPES_KPI:
+            self._reconstruire_etape(etape, date_debut, date_fin)
+        self._reconstruire_livraisons(date_debut, date_fin)
+        self.env['reporting.kpi.histogramme'].reconstruire(date_debut, date_fin)
+        self.env['agent.statistique.mensuelle'].reconstruire()
+
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def _filtre_dates(self, colonne, date_debut, date_fin):
+        """Retourne le filtre SQL et ses paramètres sur le jour d'une colonne datetime"""
+        conditions = [f"{colonne} IS NOT NULL"]
+        params = []
+        if date_debut:
+            conditions.append(f"{colonne} >= %s::date")
+            params.append(date_debut)
+        if date_fin:
+            conditions.append(f"{colonne} < %s::date + 1")
+            params.append(date_fin)
+        return ' AND '.join(conditions), params
+
+    @api.model
+    def _reconstruire_receptions(self, date_debut, date_fin):
+        Reception = self.env['reception.dossier']
+        filtre, params = self._filtre_dates('r.date_reception', date_debut, date_fin)
+        self._upsert(f"""
+            SELECT r.date_reception::date, 'reception', r.archiviste_id,
+                   COUNT(*), SUM(r.nombre_dossiers), 0, 0.0, 0.0, 0,
+                   COUNT(*) FILTER (WHERE r.state = 'termine')
+              FROM {Reception._table} r
+             WHERE r.state IN ('valide', 'en_cours', 'termine') AND {filtre}
+             GROUP BY r.date_reception::date, r.archiviste_id
+        """, params)
+
+    @api.model
+    def _reconstruire_etape(self, etape, date_debut, date_fin):
+        config = ETAPES_KPI[etape]
+        Etape = self.env[config['model']]
+        filtre, params = self._filtre_dates('s.heure_debut', date_debut, date_fin)
+        duree_effective = f"(s.{config['duree']} - COALESCE(s.duree_pauses, 0))"
+        self._upsert(f"""
+            SELECT s.heure_debut::date, %s, s.{config['agent']},
+                   COUNT(*) FILTER (WHERE s.state = 'valide'),
+                   0,
+                   COALESCE(SUM(s.{config['pieces']}) FILTER (WHERE s.state = 'valide'), 0),
+                   COALESCE(SUM({duree_effective}) FILTER (WHERE s.state = 'valide'), 0),
+                   COALESCE(SUM(CASE WHEN {duree_effective} > 0 AND s.{config['pieces']} > 0
+                                     THEN s.{config['pieces']} / {duree_effective}
+                                     ELSE 0 END) FILTER (WHERE s.state = 'valide'), 0),
+                   COUNT(*) FILTER (WHERE s.state = 'erreur'),
+                   0
+              FROM {Etape._table} s
+             WHERE s.state IN ('valide', 'erreur') AND s.heure_fin IS NOT NULL AND {filtre}
+             GROUP BY s.heure_debut::date, s.{config['agent']}
+        """, [etape] + params)
+
+    @api.model
+    def _reconstruire_livraisons(self, date_debut, date_fin):
+        Dossier = self.env['dossier.collecteur']
+        Reception = self.env['reception.dossier']
+        Livraison = self.env['livraison.numerique']
+
+        filtre, params = self._filtre_dates('l.date_livraison', date_debut, date_fin)
+        self._upsert(f"""
+            SELECT l.date_livraison::date, 'livraison', l.archiviste_id,
+                   COUNT(*) FILTER (WHERE l.state IN ('livre', 'confirme')),
+                   0, 0, 0.0, 0.0,
+                   COUNT(*) FILTER (WHERE l.state = 'erreur'),
+                   0
+              FROM {Livraison._table} l
+             WHERE l.state IN ('livre', 'confirme', 'erreur') AND {filtre}
+             GROUP BY l.date_livraison::date, l.archiviste_id
+        """, params)
+
+        filtre, params = self._filtre_dates('d.date_livraison', date_debut, date_fin)
+        self._upsert(f"""
+            SELECT d.date_livraison::date, 'livraison', r.archiviste_id,
+                   0, COUNT(*), 0, 0.0, 0.0, 0, 0
+              FROM {Dossier._table} d
+              JOIN {Reception._table} r ON r.id = d.reception_id
+             WHERE d.state = 'livre' AND {filtre}
+             GROUP BY d.date_livraison::date, r.archiviste_id
+        """, params)
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_reconstruire_cumul(self, jours=7):
+        """Backfill complet si le cumul est vide, sinon recalcul des derniers jours"""
+        if not self.search_count([], limit=1):
+            return self.reconstruire()
+        return self.reconstruire(date_debut=fields.Date.today() - timedelta(days=jours))
+
+
+class ReportingKPIJournalierMixin(models.AbstractModel):
+    _name = 'reporting.kpi.journalier.mixin'
+    _description = 'Alimentation du Cumul Journalier des KPIs'
+
+    # Étape alimentée par le modèle (clé de ETAPES_KPI pour les étapes de production)
+    _kpi_etape = None
+
+    # Champs dont la modification change la contribution d'un enregistrement
+    _kpi_champs = frozenset()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ReportingKPIJournalierMixin, self).create(vals_list)
+        self._appliquer_cumuls({}, records._get_contributions_cumuls())
+        return records
+
+    def write(self, vals):
+        if not self._kpi_champs.intersection(vals):
+            return super(ReportingKPIJournalierMixin, self).write(vals)
+
+        avant = self._get_contributions_cumuls()
+        result = super(ReportingKPIJournalierMixin, self).write(vals)
+        self._appliquer_cumuls(avant, self._get_contributions_cumuls())
+        return result
+
+    def unlink(self):
+        avant = self._get_contributions_cumuls()
+        result = super(ReportingKPIJournalierMixin, self).unlink()
+        self._appliquer_cumuls(avant, {})
+        return result
+
+    def _get_contributions_cumuls(self):
+        """Retourne les contributions des enregistrements à chaque table de cumul.
+
+        Retourne {modèle de cumul: contributions} ; chaque modèle de cumul
+        fournit _appliquer_contributions(avant, apres) pour son format.
+        """
+        contributions = self._get_contributions_kpi()
+        cumuls = {'reporting.kpi.journalier': contributions}
+        if self._kpi_etape in ETAPES_KPI:
+            cumuls['reporting.kpi.histogramme'] = self._get_contributions_histogramme()
+            cumuls['agent.statistique.mensuelle'] = contributions
+        return cumuls
+
+    @api.model
+    def _appliquer_cumuls(self, avant, apres):
+        for modele in set(avant) | set(apres):
+            self.env[modele]._appliquer_contributions(avant.get(modele, {}), apres.get(modele, {}))
+
+    def _get_contributions_kpi(self):
+        """Retourne la contribution des enregistrements au cumul journalier.
+
+        Par défaut, calcule la contribution d'une étape de production décrite
+        dans ETAPES_KPI : les enregistrements validés ou en erreur comptent pour
+        le jour de leur heure de début.
+        """
+        contributions = defaultdict(lambda: defaultdict(float))
+        config = ETAPES_KPI[self._kpi_etape]
+
+        for record in self:
+            if record.state not in ('valide', 'erreur') or not record.heure_debut or not record.heure_fin:
+                continue
+
+            cle = (record.heure_debut.date(), self._kpi_etape, record[config['agent']].id or None)
+            mesures = contributions[cle]
+
+            if record.state == 'erreur':
+                mesures['nombre_erreurs'] += 1
+                continue
+
+            duree_effective = record[config['duree']] - record.duree_pauses
+            pieces = record[config['pieces']]
+            mesures['nombre'] += 1
+            mesures['nombre_pieces'] += pieces
+            mesures['duree_totale'] += duree_effective
+            if duree_effective > 0 and pieces > 0:
+                mesures['vitesse_totale'] += pieces / duree_effective
+
+        return contributions
+
+    def _get_contributions_histogramme(self):
+        """Retourne la contribution des enregistrements à l'histogramme des durées.
+
+        Chaque opération validée de durée effective positive compte pour un
+        dans le bucket de sa durée : {(date, etape, agent_id, indice): nombre}.
+        """
+        Histogramme = self.env['reporting.kpi.histogramme']
+        contributions = defaultdict(int)
+        config = ETAPES_KPI[self._kpi_etape]
+
+        for record in self:
+            if record.state != 'valide' or not record.heure_debut or not record.heure_fin:
+                continue
+            duree_effective = record[config['duree']] - record.duree_pauses
+            if duree_effective <= 0:
+                continue
+            cle = (record.heure_debut.date(), self._kpi_etape, record[config['agent']].id or None,
+                   Histogramme._indice_bucket(duree_effective))
+            contributions[cle] += 1
+
+        return contributions
+
+    @api.model
+    def _get_sommes_agents(self, date_debut=None, date_fin=None, agent_ids=None):
+        """Agrège les opérations validées d'une étape de production par agent.
+
+        Une seule requête groupée, avec les mêmes bornes que les KPIs par agent
+        (heure_debut >= date_debut, heure_fin <= date_fin). Retourne
+        {agent_id: {'nombre', 'duree_totale', 'vitesse_totale', 'nombre_pieces'}}.
+        """
+        config = ETAPES_KPI[self._kpi_etape]
+        self.flush_model(['state', 'heure_debut', 'heure_fin', 'duree_pauses',
+                          config['agent'], config['duree'], config['pieces']])
+
+        conditions = ["s.state = 'valide'", f"s.{config['agent']} IS NOT NULL"]
+        params = []
+        if date_debut:
+            conditions.append('s.heure_debut >= %s')
+            params.append(date_debut)
+        if date_fin:
+            conditions.append('s.heure_fin <= %s')
+            params.append(date_fin)
+        if agent_ids is not None:
+            conditions.append(f"s.{config['agent']} = ANY(%s)")
+            params.append(list(agent_ids))
+
+        duree_effective = f"(COALESCE(s.{config['duree']}, 0) - COALESCE(s.duree_pauses, 0))"
+        self.env.cr.execute(f"""
+            SELECT s.{config['agent']}, COUNT(*),
+                   COALESCE(SUM({duree_effective}), 0),
+                   COALESCE(SUM(CASE WHEN {duree_effective} > 0 AND s.{config['pieces']} > 0
+                                     THEN s.{config['pieces']} / {duree_effective}
+                                     ELSE 0 END), 0),
+                   COALESCE(SUM(s.{config['pieces']}), 0)
+              FROM {self._table} s
+             WHERE {' AND '.join(conditions)}
+             GROUP BY s.{config['agent']}
+        """, params)
+
+        return {
+            agent_id: {
+                'nombre': nombre,
+                'duree_totale': float(duree),
+                'vitesse_totale': float(vitesse),
+                'nombre_pieces': int(pieces),
+            }
+            for agent_id, nombre, duree, vitesse, pieces in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _formater_kpis_agent(self, sommes, cle_nombre='nombre_dossiers'):
+        """Convertit les sommes d'un agent au format des KPIs par agent"""
+        nombre = sommes.get('nombre', 0)
+        return {
+            cle_nombre: nombre,
+            'duree_moyenne': sommes['duree_totale'] / nombre if nombre else 0,
+            'duree_totale': sommes.get('duree_totale', 0),
+            'vitesse_moyenne': sommes['vitesse_totale'] / nombre if nombre else 0,
+            'nombre_pieces_total': sommes.get('nombre_pieces', 0)
+        }
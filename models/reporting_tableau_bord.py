@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import json
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+# Durée de validité par défaut d'un instantané du tableau de bord (secondes)
+TTL_TABLEAU_BORD = 300
+
+
+class ReportingTableauBord(models.Model):
+    _name = 'reporting.tableau.bord'
+    _description = 'Instantané du Tableau de Bord KPI'
+    _order = 'date desc'
+    _rec_name = 'date'
+
+    date = fields.Date(
+        string='Date',
+        required=True,
+        readonly=True,
+        help="Jour auquel se rapportent les données du tableau de bord"
+    )
+
+    date_calcul = fields.Datetime(
+        string='Calculé le',
+        required=True,
+        readonly=True,
+        help="Date du dernier calcul de l'instantané"
+    )
+
+    date_debut_donnees = fields.Date(
+        string='Début des Données',
+        readonly=True,
+        help="Premier jour du cumul utilisé par l'instantané (périodes précédentes comprises)"
+    )
+
+    date_version_donnees = fields.Datetime(
+        string='Version des Données',
+        readonly=True,
+        help="Dernière modification du cumul visible lors du calcul ; toute modification plus récente périme l'instantané"
+    )
+
+    donnees = fields.Text(
+        string='Données',
+        readonly=True,
+        help="Données du tableau de bord sérialisées en JSON"
+    )
+
+    _sql_constraints = [
+        ('date_uniq', 'unique(date)', 'Un seul instantané par jour.'),
+    ]
+
+    # === LECTURE ===
+    @api.model
+    def get_donnees(self):
+        """Retourne les données du tableau de bord du jour.
+
+        L'instantané est servi tel quel tant qu'il a moins de TTL secondes et
+        qu'aucune validation n'a modifié le cumul journalier depuis son calcul ;
+        sinon il est recalculé à partir du cumul, sans créer de rapport.
+        """
+        aujourd_hui = fields.Date.today()
+        self.env.cr.execute(f"""
+            SELECT t.donnees
+              FROM {self._table} t
+             WHERE t.date = %s
+               AND t.date_calcul >= (clock_timestamp() AT TIME ZONE 'UTC') - %s * INTERVAL '1 second'
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM {self.env['reporting.kpi.journalier']._table} j
+                     WHERE j.date >= t.date_debut_donnees
+                       AND j.write_date > COALESCE(t.date_version_donnees, '-infinity')
+               )
+        """, [aujourd_hui, self._get_ttl()])
+        row = self.env.cr.fetchone()
+        if row and row[0]:
+            return json.loads(row[0])
+        return self._rafraichir(aujourd_hui)
+
+    @api.model
+    def _get_ttl(self):
+        ttl = self.env['ir.config_parameter'].sudo().get_param(
+            'archivage_collecteurs.tableau_bord_ttl', TTL_TABLEAU_BORD
+        )
+        return int(ttl)
+
+    # === CALCUL ===
+    @api.model
+    def _rafraichir(self, date_jour):
+        """Recalcule et enregistre l'instantané d'un jour.
+
+        La version des données est la dernière écriture du cumul visible par
+        la transaction qui a lu les données, lue avec elles, et non l'heure de
+        début de cette transaction : une validation plus récente que les
+        données lues périme l'instantané sans attendre la fin du TTL.
+        """
+        donnees, date_debut_donnees = self.env['reporting.kpi']._calculer_donnees_tableau_bord(date_jour)
+        Cumul = self.env['reporting.kpi.journalier']
+
+        # Upsert : plusieurs utilisateurs peuvent recalculer le même jour en parallèle
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS t
+                   (date, date_calcul, date_debut_donnees, date_version_donnees, donnees,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%s, clock_timestamp() AT TIME ZONE 'UTC', %s,
+                    (SELECT MAX(j.write_date) FROM {Cumul._table} j WHERE j.date >= %s), %s,
+                    %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC')
+            ON CONFLICT (date)
+            DO UPDATE SET date_calcul = EXCLUDED.date_calcul,
+                          date_debut_donnees = EXCLUDED.date_debut_donnees,
+                          date_version_donnees = EXCLUDED.date_version_donnees,
+                          donnees = EXCLUDED.donnees,
+                          write_uid = EXCLUDED.write_uid,
+                          write_date = EXCLUDED.write_date
+        """, [date_jour, date_debut_donnees, date_debut_donnees, json.dumps(donnees), self.env.uid, self.env.uid])
+        self.invalidate_model()
+        return donnees
+
+    # === MÉTHODES AUTOMATIQUES ===
+    @api.model
+    def cron_rafraichir_tableau_bord(self, jours_conservation=7):
+        """Précalcule l'instantané du jour et supprime les instantanés anciens"""
+        aujourd_hui = fields.Date.today()
+        self._rafraichir(aujourd_hui)
+        self.search([('date', '<', aujourd_hui - timedelta(days=jours_conservation))]).unlink()
+        return True
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api, _
+
+from .reporting_kpi import ETAPES_KPI
+
+_logger = logging.getLogger(__name__)
+
+
+class ReportingVueMaterialisee(models.AbstractModel):
+    _name = 'reporting.vue.materialisee'
+    _description = 'Vue Matérialisée de Reporting (lecture seule)'
+    _auto = False
+
+    # Chaque vue concrète définit _get_requete() : la requête SELECT de la vue,
+    # avec une colonne id stable d'un rafraîchissement à l'autre
+
+    # Colonnes de l'index unique qui apparie les lignes au rafraîchissement concurrent
+    _cle_unique = ('id',)
+
+    def init(self):
+        if self._abstract:
+            return
+        cr = self.env.cr
+        cr.execute(f"DROP VIEW IF EXISTS {self._table} CASCADE")
+        cr.execute(f"DROP MATERIALIZED VIEW IF EXISTS {self._table} CASCADE")
+        cr.execute(f"CREATE MATERIALIZED VIEW {self._table} AS ({self._get_requete()})")
+        # Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+        cr.execute(f"CREATE UNIQUE INDEX {self._table}_cle_uniq ON {self._table} ({', '.join(self._cle_unique)})")
+        if self._cle_unique != ('id',):
+            cr.execute(f"CREATE INDEX {self._table}_id_idx ON {self._table} (id)")
+
+    @api.model
+    def rafraichir(self):
+        """Rafraîchit la vue sans bloquer les lectures en cours"""
+        self.env.flush_all()
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def cron_rafraichir_vues(self):
+        """Rafraîchit toutes les vues matérialisées du module"""
+        for nom_modele in self.env.registry.descendants([self._name], '_inherit'):
+            modele = self.env[nom_modele]
+            if modele._abstract:
+                continue
+            _logger.info("Rafraîchissement de la vue matérialisée %s", modele._table)
+            modele.rafraichir()
+        return True
+
+
+class ReportingVueAgenceEtapes(models.Model):
+    _name = 'reporting.vue.agence.etapes'
+    _inherit = 'reporting.vue.materialisee'
+    _description = 'Durées des Étapes par Agence et par Mois'
+    _auto = False
+    _order = 'mois desc, code_agence, etape'
+    _cle_unique = ('mois', 'code_agence', 'etape')
+
+    mois = fields.Date(string='Mois', readonly=True)
+    code_agence = fields.Char(string='Code Agence', readonly=True)
+    etape = fields.Selection([
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation')
+    ], string='Étape', readonly=True)
+    nombre = fields.Integer(string='Opérations Validées', readonly=True, group_operator='sum')
+    nombre_pieces = fields.Integer(string='Pièces', readonly=True, group_operator='sum')
+    duree_totale = fields.Float(string='Durée Totale (min)', readonly=True, group_operator='sum')
+    duree_moyenne = fields.Float(string='Durée Moyenne (min)', readonly=True, group_operator='avg')
+
+    def _get_requete(self):
+        """Identifiant calculé depuis (mois, agence, étape) : une nouvelle ligne ne décale pas les autres"""
+        Dossier = self.env['dossier.collecteur']
+        requetes = []
+        for rang_etape, (etape, config) in enumerate(ETAPES_KPI.items()):
+            Etape = self.env[config['model']]
+            requetes.append(f"""
+                SELECT {rang_etape} AS rang_etape, '{etape}' AS etape, d.code_agence,
+                       s.{config['pieces']} AS pieces,
+                       s.{config['duree']} - COALESCE(s.duree_pauses, 0) AS duree_effective,
+                       s.heure_debut
+                  FROM {Etape._table} s
+                  JOIN {Dossier._table} d ON d.id = s.dossier_id
+                 WHERE s.state = 'valide' AND s.heure_debut IS NOT NULL
+            """)
+        # id = (mois depuis l'an 0 * nombre d'étapes + rang de l'étape) << 31 | empreinte de l'agence sur 31 bits,
+        # sous 2^53 pour rester exact côté client
+        return f"""
+            SELECT ((EXTRACT(YEAR FROM o.mois)::bigint * 12 + EXTRACT(MONTH FROM o.mois)::bigint)
+                        * {len(ETAPES_KPI)} + o.rang_etape) * 2147483648
+                   + (hashtext(o.code_agence)::bigint & 2147483647) AS id,
+                   o.mois, o.code_agence, o.etape, o.nombre, o.nombre_pieces, o.duree_totale, o.duree_moyenne
+              FROM (SELECT e.rang_etape,
+                           date_trunc('month', e.heure_debut)::date AS mois,
+                           COALESCE(e.code_agence, '') AS code_agence,
+                           e.etape,
+                           COUNT(*) AS nombre,
+                           COALESCE(SUM(e.pieces), 0) AS nombre_pieces,
+                           COALESCE(SUM(e.duree_effective), 0) AS duree_totale,
+                           COALESCE(AVG(e.duree_effective), 0) AS duree_moyenne
+                      FROM ({' UNION ALL '.join(requetes)}) e
+                     GROUP BY 1, 2, 3, 4) o
+        """
+
+
+class ReportingVueCartonNumerisation(models.Model):
+    _name = 'reporting.vue.carton.numerisation'
+    _inherit = 'reporting.vue.materialisee'
+    _description = 'Temps de Numérisation par Carton'
+    _auto = False
+    _order = 'date_fin desc'
+
+    carton_id = fields.Many2one('carton.numerisation', string='Carton', readonly=True)
+    numero_carton = fields.Char(string='N° Carton', readonly=True)
+    type_dossier = fields.Char(string='Type de Dossier', readonly=True)
+    nombre_dossiers = fields.Integer(string='Dossiers Numérisés', readonly=True, group_operator='sum')
+    nombre_pieces = fields.Integer(string='Pièces', readonly=True, group_operator='sum')
+    duree_totale = fields.Float(string='Durée Effective Totale (min)', readonly=True, group_operator='sum')
+    duree_moyenne_dossier = fields.Float(string='Durée Moyenne par Dossier (min)', readonly=True, group_operator='avg')
+    date_debut = fields.Datetime(string='Première Numérisation', readonly=True)
+    date_fin = fields.Datetime(string='Dernière Numérisation', readonly=True)
+
+    def _get_requete(self):
+        Carton = self.env['carton.numerisation']
+        Dossier = self.env['dossier.collecteur']
+        Numerisation = self.env['numerisation.dossier']
+        return f"""
+            SELECT c.id AS id, c.id AS carton_id, c.numero_carton, c.type_dossier,
+                   COUNT(n.id) AS nombre_dossiers,
+                   COALESCE(SUM(n.nombre_pieces), 0) AS nombre_pieces,
+                   COALESCE(SUM(n.duree_numerisation - COALESCE(n.duree_pauses, 0)), 0) AS duree_totale,
+                   COALESCE(AVG(n.duree_numerisation - COALESCE(n.duree_pauses, 0)), 0) AS duree_moyenne_dossier,
+                   MIN(n.heure_debut) AS date_debut,
+                   MAX(n.heure_fin) AS date_fin
+              FROM {Carton._table} c
+              JOIN {Dossier._table} d ON d.carton_id = c.id
+              JOIN {Numerisation._table} n ON n.dossier_id = d.id AND n.state = 'valide'
+             GROUP BY c.id, c.numero_carton, c.type_dossier
+        """
+
+
+class ReportingVueLivraisonVolumes(models.Model):
+    _name = 'reporting.vue.livraison.volumes'
+    _inherit = 'reporting.vue.materialisee'
+    _description = 'Volumes par Livraison Numérique'
+    _auto = False
+    _order = 'date_livraison desc'
+
+    livraison_id = fields.Many2one('livraison.numerique', string='Livraison', readonly=True)
+    numero_livraison = fields.Char(string='N° Livraison', readonly=True)
+    date_livraison = fields.Datetime(string='Date de Livraison', readonly=True)
+    archiviste_id = fields.Many2one('res.users', string='Archiviste', readonly=True)
+    state = fields.Char(string='État', readonly=True)
+    nombre_dossiers = fields.Integer(string='Dossiers', readonly=True, group_operator='sum')
+    nombre_pieces = fields.Integer(string='Pièces', readonly=True, group_operator='sum')
+    nombre_documents_indexes = fields.Integer(string='Documents Indexés', readonly=True, group_operator='sum')
+
+    def _get_requete(self):
+        Livraison = self.env['livraison.numerique']
+        Dossier = self.env['dossier.collecteur']
+        relation = Livraison._fields['dossier_ids']
+        return f"""
+            SELECT l.id AS id, l.id AS livraison_id, l.numero_livraison, l.date_livraison,
+                   l.archiviste_id, l.state,
+                   COUNT(d.id) AS nombre_dossiers,
+                   COALESCE(SUM(d.nombre_pieces), 0) AS nombre_pieces,
+                   COALESCE(SUM(d.nombre_documents_indexes), 0) AS nombre_documents_indexes
+              FROM {Livraison._table} l
+              LEFT JOIN {relation.relation} rel ON rel.{relation.column1} = l.id
+              LEFT JOIN {Dossier._table} d ON d.id = rel.{relation.column2}
+             GROUP BY l.id
+        """
@@ -43,36 +43,46 @@ class ResUsersInherit(models.Model):
     )
     
     # === STATISTIQUES DE PERFORMANCE ===
+    # Colonnes stockées, tenues à jour à partir des compteurs mensuels
+    # (agent.statistique.mensuelle) de l'étape correspondant à la spécialité
     nb_dossiers_traites_total = fields.Integer(
         string='Dossiers Traités (Total)',
-        compute='_compute_statistiques_performance',
+        readonly=True,
         help="Nombre total de dossiers traités par l'agent"
     )
     
     nb_dossiers_traites_mois = fields.Integer(
         string='Dossiers Traités (Ce Mois)',
-        compute='_compute_statistiques_performance',
+        readonly=True,
+        index=True,
         help="Nombre de dossiers traités ce mois"
     )
     
     duree_moyenne_traitement = fields.Float(
         string='Durée Moyenne Traitement (min)',
-        compute='_compute_statistiques_performance',
+        readonly=True,
         help="Durée moyenne de traitement par dossier"
     )
     
     vitesse_moyenne_travail = fields.Float(
         string='Vitesse Moyenne (pièces/min)',
-        compute='_compute_statistiques_performance',
+        readonly=True,
         help="Vitesse moyenne de travail"
     )
     
     taux_erreurs_agent = fields.Float(
         string='Taux d\'Erreurs (%)',
-        compute='_compute_statistiques_performance',
+        readonly=True,
         help="Taux d'erreurs de l'agent"
     )
     
+    statistique_mensuelle_ids = fields.One2many(
+        'agent.statistique.mensuelle',
+        'agent_id',
+        string='Statistiques Mensuelles',
+        help="Compteurs de production par mois et par étape"
+    )
+    
     # === PLANNING ET DISPONIBILITÉ ===
     horaire_debut = fields.Float(
         string='Heure de Début',
@@ -128,12 +138,16 @@ class ResUsersInherit(models.Model):
     quota_atteint_mois = fields.Boolean(
         string='Quota Atteint (Mois)',
         compute='_compute_quota_atteint',
+        store=True,
+        index=True,
         help="Indique si le quota mensuel est atteint"
     )
     
     pourcentage_objectif = fields.Float(
         string='% Objectif Atteint',
         compute='_compute_quota_atteint',
+        store=True,
+        index=True,
         help="Pourcentage de l'objectif mensuel atteint"
     )
     
@@ -200,118 +214,72 @@ class ResUsersInherit(models.Model):
     )
     
     # === MÉTHODES DE CALCUL ===
-    @api.depends('traitement_ids', 'numerisation_ids', 'indexation_ids')
-    def _compute_statistiques_performance(self):
-        for user in self:
-            # Calculer selon la spécialité de l'agent
-            if user.specialite_archivage == 'traitement':
-                user._compute_stats_traitement()
-            elif user.specialite_archivage == 'numerisation':
-                user._compute_stats_numerisation()
-            elif user.specialite_archivage == 'indexation':
-                user._compute_stats_indexation()
-            else:
-                # Valeurs par défaut
-                user.nb_dossiers_traites_total = 0
-                user.nb_dossiers_traites_mois = 0
-                user.duree_moyenne_traitement = 0
-                user.vitesse_moyenne_travail = 0
-                user.taux_erreurs_agent = 0
-    
-    def _compute_stats_traitement(self):
-        """Calcule les statistiques pour les agents de traitement"""
-        self.ensure_one()
-        
-        # Total des traitements validés
-        traitements_valides = self.traitement_ids.filtered(lambda t: t.state == 'valide')
-        self.nb_dossiers_traites_total = len(traitements_valides)
-        
-        # Traitements du mois en cours
-        debut_mois = fields.Date.today().replace(day=1)
-        traitements_mois = traitements_valides.filtered(
-            lambda t: t.heure_debut and t.heure_debut.date() >= debut_mois
-        )
-        self.nb_dossiers_traites_mois = len(traitements_mois)
-        
-        # Durée moyenne
-        if traitements_valides:
-            durees = traitements_valides.mapped('duree_effective')
-            self.duree_moyenne_traitement = sum(durees) / len(durees) if durees else 0
-            
-            # Vitesse moyenne (pièces par minute)
-            pieces_totales = sum(traitements_valides.mapped('nombre_pieces_traitees'))
-            duree_totale = sum(durees)
-            self.vitesse_moyenne_travail = pieces_totales / duree_totale if duree_totale > 0 else 0
-        else:
-            self.duree_moyenne_traitement = 0
-            self.vitesse_moyenne_travail = 0
-        
-        # Taux d'erreurs
-        traitements_erreur = self.traitement_ids.filtered(lambda t: t.state == 'erreur')
-        total_traitements = len(self.traitement_ids)
-        self.taux_erreurs_agent = (len(traitements_erreur) / total_traitements * 100) if total_traitements > 0 else 0
-    
-    def _compute_stats_numerisation(self):
-        """Calcule les statistiques pour les opérateurs de numérisation"""
-        self.ensure_one()
-        
-        # Total des numérisations validées
-        numerisations_valides = self.numerisation_ids.filtered(lambda n: n.state == 'valide')
-        self.nb_dossiers_traites_total = len(numerisations_valides)
-        
-        # Numérisations du mois en cours
-        debut_mois = fields.Date.today().replace(day=1)
-        numerisations_mois = numerisations_valides.filtered(
-            lambda n: n.heure_debut and n.heure_debut.date() >= debut_mois
-        )
-        self.nb_dossiers_traites_mois = len(numerisations_mois)
-        
-        # Durée moyenne et vitesse
-        if numerisations_valides:
-            durees = numerisations_valides.mapped('duree_effective')
-            self.duree_moyenne_traitement = sum(durees) / len(durees) if durees else 0
-            
-            vitesses = numerisations_valides.mapped('vitesse_numerisation')
-            self.vitesse_moyenne_travail = sum(vitesses) / len(vitesses) if vitesses else 0
-        else:
-            self.duree_moyenne_traitement = 0
-            self.vitesse_moyenne_travail = 0
-        
-        # Taux d'erreurs
-        numerisations_erreur = self.numerisation_ids.filtered(lambda n: n.state == 'erreur')
-        total_numerisations = len(self.numerisation_ids)
-        self.taux_erreurs_agent = (len(numerisations_erreur) / total_numerisations * 100) if total_numerisations > 0 else 0
+    @api.model
+    def _rafraichir_statistiques(self, user_ids=None):
+        """Met à jour les statistiques stockées des agents en une requête.
+        
+        Les valeurs sont recalculées à partir des compteurs mensuels de l'étape
+        correspondant à la spécialité de chaque agent (quelques lignes par
+        agent), sans parcourir les traitements, numérisations ou indexations.
+        Sans liste d'agents, tous les utilisateurs sont mis à jour.
+        """
+        Statistique = self.env['agent.statistique.mensuelle']
+        Statistique.flush_model()
+        self.flush_model(['specialite_archivage', 'objectif_mensuel'])
+        
+        condition = 'u2.id = ANY(%s)' if user_ids is not None else 'TRUE'
+        params = [fields.Date.today().replace(day=1)]
+        if user_ids is not None:
+            params.append(list(user_ids))
+        
+        self.env.cr.execute(f"""
+            UPDATE {self._table} u
+               SET nb_dossiers_traites_total = s.total,
+                   nb_dossiers_traites_mois = s.mois,
+                   duree_moyenne_traitement = CASE WHEN s.total > 0 THEN s.duree / s.total ELSE 0 END,
+                   vitesse_moyenne_travail = CASE
+                        WHEN u.specialite_archivage = 'traitement'
+                            THEN CASE WHEN s.duree > 0 THEN s.pieces / s.duree ELSE 0 END
+                        WHEN s.total > 0 THEN s.vitesse / s.total
+                        ELSE 0 END,
+                   taux_erreurs_agent = CASE WHEN s.total + s.erreurs > 0
+                                             THEN s.erreurs * 100.0 / (s.total + s.erreurs) ELSE 0 END,
+                   pourcentage_objectif = CASE WHEN u.objectif_mensuel > 0
+                                               THEN s.mois * 100.0 / u.objectif_mensuel ELSE 0 END,
+                   quota_atteint_mois = u.objectif_mensuel > 0 AND s.mois >= u.objectif_mensuel
+              FROM (SELECT u2.id AS user_id,
+                           COALESCE(SUM(st.nombre), 0) AS total,
+                           COALESCE(SUM(st.nombre) FILTER (WHERE st.mois = %s), 0) AS mois,
+                           COALESCE(SUM(st.duree_totale), 0) AS duree,
+                           COALESCE(SUM(st.nombre_pieces), 0) AS pieces,
+                           COALESCE(SUM(st.vitesse_totale), 0) AS vitesse,
+                           COALESCE(SUM(st.nombre_erreurs), 0) AS erreurs
+                      FROM {self._table} u2
+                      LEFT JOIN {Statistique._table} st
+                        ON st.agent_id = u2.id AND st.etape = u2.specialite_archivage
+                     WHERE {condition}
+                     GROUP BY u2.id) s
+             WHERE u.id = s.user_id
+        """, params)
+        self.invalidate_model([
+            'nb_dossiers_traites_total', 'nb_dossiers_traites_mois', 'duree_moyenne_traitement',
+            'vitesse_moyenne_travail', 'taux_erreurs_agent', 'pourcentage_objectif', 'quota_atteint_mois',
+        ])
     
-    def _compute_stats_indexation(self):
-        """Calcule les statistiques pour les agents d'indexation"""
-        self.ensure_one()
-        
-        # Total des indexations validées
-        indexations_valides = self.indexation_ids.filtered(lambda i: i.state == 'valide')
-        self.nb_dossiers_traites_total = len(indexations_valides)
-        
-        # Indexations du mois en cours
-        debut_mois = fields.Date.today().replace(day=1)
-        indexations_mois = indexations_valides.filtered(
-            lambda i: i.heure_debut and i.heure_debut.date() >= debut_mois
-        )
-        self.nb_dossiers_traites_mois = len(indexations_mois)
-        
-        # Durée moyenne et vitesse
-        if indexations_valides:
-            durees = indexations_valides.mapped('duree_effective')
-            self.duree_moyenne_traitement = sum(durees) / len(durees) if durees else 0
-            
-            vitesses = indexations_valides.mapped('vitesse_indexation')
-            self.vitesse_moyenne_travail = sum(vitesses) / len(vitesses) if vitesses else 0
-        else:
-            self.duree_moyenne_traitement = 0
-            self.vitesse_moyenne_travail = 0
-        
-        # Taux d'erreurs
-        indexations_erreur = self.indexation_ids.filtered(lambda i: i.state == 'erreur')
-        total_indexations = len(self.indexation_ids)
-        self.taux_erreurs_agent = (len(indexations_erreur) / total_indexations * 100) if total_indexations > 0 else 0
+    @api.model_create_multi
+    def create(self, vals_list):
+        users = super(ResUsersInherit, self).create(vals_list)
+        agents = users.filtered('specialite_archivage')
+        if agents:
+            self.env['agent.charge']._synchroniser(agents.ids)
+        return users
+    
+    def write(self, vals):
+        result = super(ResUsersInherit, self).write(vals)
+        if 'specialite_archivage' in vals:
+            self._rafraichir_statistiques(self.ids)
+            self.env['agent.charge']._synchroniser(self.ids)
+        return result
     
     @api.depends('nb_dossiers_traites_mois', 'objectif_mensuel')
     def _compute_quota_atteint(self):
@@ -443,48 +411,25 @@ class ResUsersInherit(models.Model):
         return True
     
     def get_workload_today(self):
-        """Retourne la charge de travail actuelle de l'agent"""
+        """Retourne la charge de travail actuelle de l'agent (dossiers ouverts dans sa spécialité)"""
         self.ensure_one()
-        
-        aujourd_hui = fields.Date.today()
-        
-        if self.specialite_archivage == 'traitement':
-            return len(self.traitement_ids.filtered(
-                lambda t: t.heure_debut and t.heure_debut.date() == aujourd_hui and t.state == 'en_cours'
-            ))
-        elif self.specialite_archivage == 'numerisation':
-            return len(self.numerisation_ids.filtered(
-                lambda n: n.heure_debut and n.heure_debut.date() == aujourd_hui and n.state == 'en_cours'
-            ))
-        elif self.specialite_archivage == 'indexation':
-            return len(self.indexation_ids.filtered(
-                lambda i: i.heure_debut and i.heure_debut.date() == aujourd_hui and i.state == 'en_cours'
-            ))
-        else:
-            return 0
+        charge = self.env['agent.charge'].search([('agent_id', '=', self.id)], limit=1)
+        return charge.taches_ouvertes
     
     @api.model
     def get_agents_disponibles(self, specialite=None):
         """Retourne la liste des agents disponibles pour une spécialité donnée"""
-        domain = [('disponible', '=', True), ('en_conge', '=', False)]
-        
-        if specialite:
-            domain.append(('specialite_archivage', '=', specialite))
+        if not specialite:
+            domain = [('disponible', '=', True), ('en_conge', '=', False)]
+            return self.search(domain).filtered(lambda a: a.is_available_now())
         
-        agents = self.search(domain)
-        return agents.filtered(lambda a: a.is_available_now())
+        agents = self.env['agent.charge']._get_agents_disponibles(specialite)
+        return self.browse([agent[0] for agent in agents])
     
     @api.model
     def get_agent_moins_charge(self, specialite):
         """Retourne l'agent le moins chargé pour une spécialité donnée"""
-        agents_disponibles = self.get_agents_disponibles(specialite)
-        
-        if not agents_disponibles:
-            return None
-        
-        # Trier par charge de travail croissante
-        agents_tries = sorted(agents_disponibles, key=lambda a: a.get_workload_today())
-        return agents_tries[0] if agents_tries else None
+        return self.env['agent.charge'].get_meilleur_agent(specialite) or None
     
     # === CONTRAINTES ===
     @api.constrains('horaire_debut', 'horaire_fin')
@@ -528,10 +473,27 @@ class ResUsersInherit(models.Model):
         ])
         agents_fin_conge.write({'en_conge': False})
     
+    @api.model
+    def cron_rafraichir_statistiques(self):
+        """Cron de report des compteurs mensuels sur les statistiques stockées.
+        
+        Seuls les agents dont un compteur a changé sont mis à jour ; au
+        changement de mois, tous les agents sont recalculés.
+        """
+        agent_ids = self.env['agent.statistique.mensuelle']._extraire_agents_a_reporter()
+        Parametres = self.env['ir.config_parameter'].sudo()
+        mois = fields.Date.to_string(fields.Date.today().replace(day=1))
+        if Parametres.get_param('archivage_collecteurs.mois_statistiques') != mois:
+            self._rafraichir_statistiques()
+            Parametres.set_param('archivage_collecteurs.mois_statistiques', mois)
+        elif agent_ids:
+            self._rafraichir_statistiques(agent_ids)
+        return True
+    
     @api.model
     def cron_check_objectifs(self):
         """Cron pour vérifier l'atteinte des objectifs et envoyer des alertes"""
-        debut_mois = fields.Date.today().replace(day=1)
+        self._rafraichir_statistiques()
         
         # Agents n'ayant pas atteint leurs objectifs à mi-mois
         if fields.Date.today().day == 15:
@@ -0,0 +1,80 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+import { debounce } from "@web/core/utils/timing";
+import { listView } from "@web/views/list/list_view";
+import { ListController } from "@web/views/list/list_controller";
+import { kanbanView } from "@web/views/kanban/kanban_view";
+import { KanbanController } from "@web/views/kanban/kanban_controller";
+
+const { onMounted, onWillUnmount, useComponent } = owl;
+
+// Regroupe les rechargements de page quand plusieurs transitions arrivent à la suite
+const DELAI_RECHARGEMENT = 1000;
+
+/**
+ * Met à jour la vue à la réception des passages d'étape poussés sur le bus.
+ *
+ * Les dossiers déjà affichés sont relus un par un ; la page n'est rechargée
+ * que si des dossiers inconnus de la vue arrivent (nouvelle charge de travail)
+ * ou si la vue est groupée.
+ */
+export function useFileEtapeBus() {
+    const component = useComponent();
+    const busService = useService("bus_service");
+
+    const rechargerPage = debounce(async () => {
+        await component.model.root.load();
+        component.model.notify();
+    }, DELAI_RECHARGEMENT);
+
+    const onNotification = async ({ detail: notifications }) => {
+        const ids = new Set();
+        for (const { type, payload } of notifications) {
+            if (type === "archivage_file_etape") {
+                payload.ids.forEach((id) => ids.add(id));
+            }
+        }
+        if (!ids.size) {
+            return;
+        }
+        const root = component.model.root;
+        if (root.isGrouped) {
+            return rechargerPage();
+        }
+        const affiches = root.records.filter((record) => ids.has(record.resId));
+        if (affiches.length < ids.size) {
+            return rechargerPage();
+        }
+        await Promise.all(affiches.filter((record) => !record.isInEdition).map((record) => record.load()));
+        component.model.notify();
+    };
+
+    onMounted(() => busService.addEventListener("notification", onNotification));
+    onWillUnmount(() => busService.removeEventListener("notification", onNotification));
+}
+
+export class FileEtapeListController extends ListController {
+    setup() {
+        super.setup();
+        useFileEtapeBus();
+    }
+}
+
+export class FileEtapeKanbanController extends KanbanController {
+    setup() {
+        super.setup();
+        useFileEtapeBus();
+    }
+}
+
+registry.category("views").add("file_etape_list", {
+    ...listView,
+    Controller: FileEtapeListController,
+});
+
+registry.category("views").add("file_etape_kanban", {
+    ...kanbanView,
+    Controller: FileEtapeKanbanController,
+});
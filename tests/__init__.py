@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import test_action_masse
+from . import test_compteur_delta
+from . import test_file_travail
+from . import test_notification_etape
+from . import test_sequence_lot
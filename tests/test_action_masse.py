@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.archivage_collecteurs_complet.models import action_masse
+
+
+@tagged('post_install', '-at_install')
+class TestActionMasse(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('archivage_collecteurs.affectation_automatique', 'False')
+        cls.reception = cls.env['reception.dossier'].create({
+            'bordereau_livraison': 'BL-TEST-ACTION-MASSE',
+            'nombre_dossiers': 5,
+        })
+        cls.dossiers = cls.env['dossier.collecteur'].create([
+            {'reception_id': cls.reception.id, 'state': 'reception'} for _i in range(5)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        # Les lots sont validés en base par l'action : le test reste dans sa transaction
+        self.patch(self.env.cr, 'commit', lambda: None)
+        self.patch(action_masse, 'TAILLE_LOT_ACTION_MASSE', 2)
+
+    def _lancer(self, methode='action_demarrer_traitement', dossiers=None):
+        domaine = [('id', 'in', (dossiers or self.dossiers).ids)]
+        return self.env['action.masse'].lancer('dossier.collecteur', methode, domaine)
+
+    def _echeance(self):
+        return time.monotonic() + 60
+
+    def test_reprise_apres_un_lot_en_echec(self):
+        """Une action arrêtée sur erreur reprend après son dernier lot validé, sans rejouer les précédents"""
+        action = self._lancer()
+        ActionMasse = type(self.env['action.masse'])
+        executer_lot = ActionMasse._executer_lot
+        lots = []
+
+        def executer_lot_en_echec(record, lot):
+            lots.append(lot.ids)
+            if len(lots) == 2:
+                raise Exception("Base indisponible")
+            return executer_lot(record, lot)
+
+        self.patch(ActionMasse, '_executer_lot', executer_lot_en_echec)
+        with self.assertRaises(Exception):
+            action._executer(self._echeance())
+        self.assertEqual(action.dernier_id, self.dossiers[1].id)
+        self.assertEqual(action.nombre_traites, 2)
+
+        action.write({'state': 'erreur', 'message_erreur': "Base indisponible"})
+        action.action_reprendre()
+        self.assertTrue(action._executer(self._echeance()))
+
+        self.assertEqual(lots, [self.dossiers[:2].ids, self.dossiers[2:4].ids, self.dossiers[2:4].ids,
+                                self.dossiers[4:].ids])
+        self.assertEqual(action.state, 'termine')
+        self.assertEqual(action.nombre_traites, 5)
+        self.assertEqual(set(self.dossiers.mapped('state')), {'traitement'})
+
+    def test_lot_refuse_rejoue_par_enregistrement(self):
+        """Un enregistrement refusé est rapporté sans empêcher le reste de son lot"""
+        refuse = self.dossiers[0]
+        refuse.write({'state': 'traitement'})
+        action = self._lancer(dossiers=self.dossiers[:2])
+
+        self.assertTrue(action._executer(self._echeance()))
+
+        self.assertEqual(action.state, 'termine')
+        self.assertEqual(action.nombre_traites, 1)
+        self.assertEqual(action.nombre_erreurs, 1)
+        self.assertIn(refuse.display_name, action.rapport_erreurs)
+        self.assertEqual(self.dossiers[1].state, 'traitement')
+
+    def test_methode_non_declaree_refusee(self):
+        """Seules les méthodes de _actions_masse sont lancées, exécutées ou substituées"""
+        with self.assertRaises(UserError):
+            self._lancer('unlink')
+
+        action = self._lancer()
+        with self.assertRaises(UserError):
+            action.write({'methode': 'unlink'})
+        with self.assertRaises(UserError):
+            action.write({'domaine': '[]'})
+
+        # Une méthode modifiée hors de l'ORM n'est pas exécutée pour autant
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE action_masse SET methode = 'unlink' WHERE id = %s", [action.id])
+        action.invalidate_recordset()
+        with self.assertRaises(UserError):
+            action._executer(self._echeance())
+        self.assertEqual(self.dossiers.exists(), self.dossiers)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestCompteurDelta(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.receptions = cls.env['reception.dossier'].create([
+            {'bordereau_livraison': 'BL-TEST-COMPTEUR-%s' % i, 'nombre_dossiers': 5} for i in range(2)
+        ])
+        cls.cartons = cls.env['carton.numerisation'].create([{}, {}])
+
+    def _compteurs_recalcules(self, modele, records):
+        """Compteurs donnés par la requête de reconstruction, pour les enregistrements demandés"""
+        self.env.flush_all()
+        self.env.cr.execute(f"SELECT * FROM ({modele._get_requete_compteurs()}) s WHERE s.id = ANY(%s)", [records.ids])
+        return {
+            ligne['id']: {compteur: ligne[compteur] for compteur in modele._compteurs}
+            for ligne in self.env.cr.dictfetchall()
+        }
+
+    def _verifier_compteurs(self):
+        for records in (self.receptions, self.cartons):
+            attendus = self._compteurs_recalcules(records.browse(), records)
+            self.assertEqual(records._get_compteurs(), attendus)
+            self.env['compteur.delta'].cron_consolider_compteurs()
+            records.invalidate_recordset()
+            self.assertEqual(
+                {record.id: {compteur: record[compteur] for compteur in records._compteurs} for record in records},
+                attendus
+            )
+            self.assertFalse(self.env['compteur.delta'].search([('res_model', '=', records._name)]))
+
+    def test_journal_et_consolidation_egaux_a_la_reconstruction(self):
+        """Créations, déplacements et suppressions : journal et colonnes consolidées suivent la reconstruction"""
+        reception_a, reception_b = self.receptions
+        carton_a, carton_b = self.cartons
+        Dossier = self.env['dossier.collecteur']
+
+        dossiers = Dossier.create([
+            {'reception_id': reception_a.id, 'state': 'reception', 'carton_id': carton_a.id} for _i in range(4)
+        ])
+        self._verifier_compteurs()
+
+        # Déplacement de réception et de carton, puis changements d'état
+        dossiers[0].write({'reception_id': reception_b.id, 'carton_id': carton_b.id})
+        dossiers[1].write({'state': 'traitement'})
+        dossiers[2].write({'state': 'livre', 'carton_id': False})
+        self._verifier_compteurs()
+
+        # Suppression et nouveau dossier avant consolidation
+        dossiers[1].unlink()
+        Dossier.create({'reception_id': reception_b.id, 'state': 'livre', 'carton_id': carton_a.id})
+        self._verifier_compteurs()
+
+    def test_reconstruction_vide_le_journal(self):
+        """La reconstruction recalcule les colonnes et vide le journal du modèle"""
+        self.env['dossier.collecteur'].create([
+            {'reception_id': self.receptions[0].id, 'state': 'reception'} for _i in range(3)
+        ])
+        attendus = self._compteurs_recalcules(self.receptions.browse(), self.receptions)
+
+        self.receptions.browse()._reconstruire_compteurs()
+
+        self.assertFalse(self.env['compteur.delta'].search([('res_model', '=', 'reception.dossier')]))
+        self.assertEqual(self.receptions[0].compteur_dossiers, attendus[self.receptions[0].id]['compteur_dossiers'])
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import odoo
+from odoo import SUPERUSER_ID, api, fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+from odoo.tests.common import BaseCase, get_db_name
+
+
+@tagged('post_install', '-at_install')
+class TestFileTravail(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('archivage_collecteurs.affectation_automatique', 'False')
+        groupes = 'base.group_user,archivage_collecteurs_complet.group_agent_traitement'
+        cls.agent_a = new_test_user(cls.env, login='agent_file_a', groups=groupes)
+        cls.agent_b = new_test_user(cls.env, login='agent_file_b', groups=groupes)
+
+        Dossier = cls.env['dossier.collecteur']
+        # Les dossiers déjà en base sortent de la file commune le temps du test
+        Dossier.search([('state', '=', 'traitement')]).write({
+            'agent_traitement_id': cls.env.ref('base.user_root').id,
+            'reserve_par_id': False,
+            'date_expiration_reservation': False,
+        })
+        cls.reception = cls.env['reception.dossier'].create({
+            'bordereau_livraison': 'BL-TEST-FILE',
+            'nombre_dossiers': 3,
+        })
+        cls.normal, cls.urgent, cls.critique = Dossier.create([
+            {'reception_id': cls.reception.id, 'state': 'traitement', 'priorite': priorite}
+            for priorite in ('normale', 'urgente', 'critique')
+        ])
+
+    def _reserver(self, agent):
+        return self.env['dossier.collecteur'].with_user(agent).reserver_prochain_dossier('traitement')
+
+    def test_priorite_puis_dossiers_distincts(self):
+        """La file sert le plus prioritaire ; un dossier réservé n'est pas servi à un autre agent"""
+        dossier_a = self._reserver(self.agent_a)
+        dossier_b = self._reserver(self.agent_b)
+
+        self.assertEqual(dossier_a, self.critique)
+        self.assertEqual(dossier_b, self.urgent)
+        self.assertEqual(dossier_a.reserve_par_id, self.agent_a)
+        self.assertEqual(dossier_a.agent_traitement_id, self.agent_a)
+
+    def test_dossiers_de_l_agent_avant_la_file_commune(self):
+        """Un dossier déjà affecté à l'agent passe avant un dossier plus prioritaire de la file commune"""
+        self.normal.write({'agent_traitement_id': self.agent_b.id})
+
+        self.assertEqual(self._reserver(self.agent_b), self.normal)
+        self.assertEqual(self._reserver(self.agent_a), self.critique)
+
+    def test_reservation_expiree_retourne_dans_la_file(self):
+        """Une réservation non démarrée et expirée laisse le dossier à un autre agent"""
+        dossier = self._reserver(self.agent_a)
+        self.assertEqual(dossier, self.critique)
+
+        dossier.write({'date_expiration_reservation': fields.Datetime.now() - timedelta(minutes=1)})
+
+        self.assertEqual(self._reserver(self.agent_b), self.critique)
+        self.assertEqual(self.critique.reserve_par_id, self.agent_b)
+
+    def test_affectation_automatique_est_un_bail(self):
+        """Un dossier affecté par l'ordonnanceur quitte la file commune jusqu'à l'échéance de son bail"""
+        Charge = self.env['agent.charge']
+        Dossier = self.env['dossier.collecteur']
+        affectations = Charge.affecter_dossiers(self.critique, 'traitement', [(self.agent_a.id, 0, 0, 0.0)])
+
+        self.assertEqual(affectations, {self.critique.id: self.agent_a.id})
+        self.assertTrue(self.critique.date_expiration_reservation > fields.Datetime.now())
+        self.assertNotIn(self.critique, Dossier._rechercher_file_commune('traitement', 10))
+        self.assertEqual(self._reserver(self.agent_b), self.urgent)
+        self.assertEqual(self._reserver(self.agent_a), self.critique)
+
+    def test_bail_expire_retourne_dans_la_file(self):
+        """Non démarré à l'échéance de son bail, le dossier affecté redevient disponible pour tous"""
+        Dossier = self.env['dossier.collecteur']
+        self.env['agent.charge'].affecter_dossiers(self.critique, 'traitement', [(self.agent_a.id, 0, 0, 0.0)])
+        self.critique.write({'date_expiration_reservation': fields.Datetime.now() - timedelta(minutes=1)})
+
+        self.assertIn(self.critique, Dossier._rechercher_file_commune('traitement', 10))
+        self.assertEqual(self._reserver(self.agent_b), self.critique)
+        self.assertEqual(self.critique.agent_traitement_id, self.agent_b)
+
+    def test_changement_d_etape_libere_la_reservation(self):
+        """Une réservation ne vaut que pour l'étape où elle a été prise"""
+        dossier = self._reserver(self.agent_a)
+        dossier.write({'state': 'transfert'})
+
+        self.assertFalse(dossier.reserve_par_id)
+        self.assertFalse(dossier.date_expiration_reservation)
+
+
+@tagged('post_install', '-at_install')
+class TestFileTravailConcurrente(BaseCase):
+    """Réservations sur deux transactions réellement concurrentes.
+
+    Les dossiers doivent être visibles des deux curseurs : ils sont validés
+    en base puis supprimés en fin de test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.registry = odoo.registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            reception = env['reception.dossier'].create({
+                'bordereau_livraison': 'BL-TEST-FILE-CONCURRENTE',
+                'nombre_dossiers': 2,
+            })
+            dossiers = env['dossier.collecteur'].create([
+                {'reception_id': reception.id, 'state': 'traitement', 'priorite': 'critique'} for _i in range(2)
+            ])
+            self.reception_id, self.dossier_ids = reception.id, dossiers.ids
+        self.addCleanup(self._supprimer_donnees)
+
+    def _supprimer_donnees(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['dossier.collecteur'].browse(self.dossier_ids).unlink()
+            env['reception.dossier'].browse(self.reception_id).unlink()
+
+    def test_deux_curseurs_ne_reservent_jamais_le_meme_dossier(self):
+        """Pendant qu'une transaction tient sa réservation, l'autre saute la ligne verrouillée"""
+        with self.registry.cursor() as cr_a, self.registry.cursor() as cr_b:
+            env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+            env_b = api.Environment(cr_b, env_a.ref('base.user_admin').id, {})
+
+            dossier_a = env_a['dossier.collecteur'].reserver_prochain_dossier('traitement')
+            dossier_b = env_b['dossier.collecteur'].reserver_prochain_dossier('traitement')
+
+            self.assertTrue(dossier_a and dossier_b)
+            self.assertNotEqual(dossier_a.id, dossier_b.id)
+            cr_a.rollback()
+            cr_b.rollback()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestNotificationEtape(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('archivage_collecteurs.notification_periodique', 'False')
+        groupes = 'base.group_user,archivage_collecteurs_complet.group_agent_traitement'
+        cls.agents = new_test_user(cls.env, login='agent_notif_1', groups=groupes) \
+            | new_test_user(cls.env, login='agent_notif_2', groups=groupes)
+        cls.reception = cls.env['reception.dossier'].create({
+            'bordereau_livraison': 'BL-TEST-NOTIF',
+            'nombre_dossiers': 3,
+        })
+        cls.dossiers = cls.env['dossier.collecteur'].create([
+            {'reception_id': cls.reception.id, 'state': 'reception'} for _i in range(3)
+        ])
+
+    def _recapitulatifs(self, agent):
+        return self.env['mail.message'].search([
+            ('message_type', '=', 'user_notification'),
+            ('partner_ids', 'in', agent.partner_id.ids),
+        ])
+
+    def test_transition_de_lot_un_recapitulatif_par_destinataire(self):
+        """Un lot de dossiers arrivant dans une étape donne un seul message à chaque agent de l'étape"""
+        avant = {agent.id: self._recapitulatifs(agent) for agent in self.agents}
+
+        self.dossiers.action_demarrer_traitement()
+
+        for agent in self.agents:
+            nouveaux = self._recapitulatifs(agent) - avant[agent.id]
+            self.assertEqual(len(nouveaux), 1)
+            for dossier in self.dossiers:
+                self.assertIn(dossier.numero_dossier, nouveaux.body)
+        self.assertFalse(self.env['notification.etape'].search([('dossier_id', 'in', self.dossiers.ids)]))
+
+    def test_destinataire_sans_notification_interne(self):
+        """Un agent qui refuse les notifications internes ne reçoit pas de récapitulatif"""
+        agent = self.agents[0]
+        agent.notification_interne = False
+        avant = self._recapitulatifs(agent)
+
+        self.dossiers.action_demarrer_traitement()
+
+        self.assertFalse(self._recapitulatifs(agent) - avant)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSequenceLot(TransactionCase):
+
+    def _creer_sequence(self, code, **vals):
+        return self.env['ir.sequence'].create(dict({
+            'name': code,
+            'code': code,
+            'company_id': False,
+            'number_next': 1,
+            'number_increment': 1,
+        }, **vals))
+
+    def test_sequence_standard(self):
+        """Bloc de numéros consécutifs, puis le tirage unitaire reprend après le bloc"""
+        self._creer_sequence('test.lot.standard', implementation='standard', prefix='S/', padding=4)
+        Sequence = self.env['ir.sequence']
+
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.standard', 3), ['S/0001', 'S/0002', 'S/0003'])
+        self.assertEqual(Sequence.next_by_code('test.lot.standard'), 'S/0004')
+
+    def test_sequence_sans_trou(self):
+        """Sans trou : le bloc respecte l'incrément et avance number_next d'autant"""
+        sequence = self._creer_sequence(
+            'test.lot.no_gap', implementation='no_gap', prefix='N/', number_next=10, number_increment=2
+        )
+        Sequence = self.env['ir.sequence']
+
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.no_gap', 3), ['N/10', 'N/12', 'N/14'])
+        self.assertEqual(sequence.number_next, 16)
+        self.assertEqual(Sequence.next_by_code('test.lot.no_gap'), 'N/16')
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.no_gap', 2), ['N/18', 'N/20'])
+
+    def test_sequence_par_plage_de_dates(self):
+        """Par plage de dates : chaque bloc est numéroté dans la plage de sa date"""
+        self._creer_sequence(
+            'test.lot.plage', implementation='no_gap', prefix='D/%(range_year)s/', use_date_range=True
+        )
+        Sequence = self.env['ir.sequence']
+
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.plage', 2, sequence_date='2024-05-01'),
+                         ['D/2024/1', 'D/2024/2'])
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.plage', 1, sequence_date='2025-01-15'), ['D/2025/1'])
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.plage', 1, sequence_date='2024-12-31'), ['D/2024/3'])
+
+    def test_bloc_vide_ou_sequence_inconnue(self):
+        Sequence = self.env['ir.sequence']
+        self._creer_sequence('test.lot.vide', implementation='no_gap')
+
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.vide', 0), [])
+        self.assertEqual(Sequence.next_by_code_lot('test.lot.inconnue', 3), [])
+
+    def test_numeroter_ne_remplace_pas_les_numeros_fournis(self):
+        """_numeroter ne tire que les numéros manquants, en un bloc"""
+        self._creer_sequence('test.lot.numeroter', implementation='no_gap', prefix='X/')
+        vals_list = [{}, {'name': 'FOURNI'}, {}]
+
+        self.env['ir.sequence']._numeroter(vals_list, 'name', 'test.lot.numeroter')
+
+        self.assertEqual([vals['name'] for vals in vals_list], ['X/1', 'FOURNI', 'X/2'])
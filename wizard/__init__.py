@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from . import wizard_nouvelle_reception
+from . import wizard_simulation_capacite
 
+from . import wizard_import_bordereau
+from . import wizard_action_masse
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.safe_eval import safe_eval
+
+# Nombre maximal d'identifiants que le client web transmet dans active_ids (active_ids_limit)
+LIMITE_IDS_CLIENT = 20000
+
+
+class WizardActionMasse(models.TransientModel):
+    _name = 'wizard.action.masse'
+    _description = 'Assistant Action de Masse'
+
+    action_masse = fields.Selection(
+        selection='_selection_actions_masse',
+        string='Action',
+        required=True,
+        default=lambda self: self._default_action_masse()
+    )
+
+    res_model = fields.Char(
+        string='Modèle',
+        compute='_compute_res_model',
+        store=True
+    )
+
+    domaine = fields.Char(
+        string='Enregistrements',
+        required=True,
+        default=lambda self: repr(self._get_domaine_contexte()),
+        help="Filtre des enregistrements à traiter ; il est réévalué à chaque lot"
+    )
+
+    nombre_enregistrements = fields.Integer(
+        string='Enregistrements Visés',
+        compute='_compute_nombre_enregistrements'
+    )
+
+    # === VALEURS PAR DÉFAUT ===
+    @api.model
+    def _selection_actions_masse(self):
+        selection = []
+        for nom_modele in self.env.registry.descendants(['action.masse.mixin'], '_inherit'):
+            Modele = self.env[nom_modele]
+            if Modele._abstract:
+                continue
+            selection += [
+                ('%s:%s' % (nom_modele, methode), '%s : %s' % (Modele._description, libelle))
+                for methode, libelle in Modele._actions_masse
+            ]
+        return selection
+
+    @api.model
+    def _default_action_masse(self):
+        prefixe = '%s:' % self.env.context.get('active_model')
+        return next((cle for cle, _libelle in self._selection_actions_masse() if cle.startswith(prefixe)), False)
+
+    @api.model
+    def _get_domaine_contexte(self):
+        """Domaine des enregistrements sélectionnés dans la liste d'origine.
+
+        Quand toute la liste filtrée est sélectionnée, son domaine est repris
+        tel quel plutôt que la liste d'identifiants transmise par le client.
+        """
+        contexte = self.env.context
+        ids = contexte.get('active_ids') or []
+        domaine_actif = contexte.get('active_domain')
+        if domaine_actif is not None and contexte.get('active_model') in self.env:
+            nombre = self.env[contexte['active_model']].search_count(domaine_actif)
+            if not ids or len(ids) >= min(nombre, LIMITE_IDS_CLIENT):
+                return domaine_actif
+        return [('id', 'in', ids)] if ids else []
+
+    # === MÉTHODES DE CALCUL ===
+    @api.depends('action_masse')
+    def _compute_res_model(self):
+        for wizard in self:
+            wizard.res_model = wizard.action_masse.split(':')[0] if wizard.action_masse else False
+
+    @api.depends('res_model', 'domaine')
+    def _compute_nombre_enregistrements(self):
+        for wizard in self:
+            try:
+                domaine = safe_eval(wizard.domaine or '[]')
+                wizard.nombre_enregistrements = self.env[wizard.res_model].search_count(domaine) if wizard.res_model else 0
+            except Exception:
+                wizard.nombre_enregistrements = 0
+
+    # === ACTIONS ===
+    def action_lancer(self):
+        """Confie l'action au cron d'exécution par lots et ouvre son suivi"""
+        self.ensure_one()
+        if not self.nombre_enregistrements:
+            raise UserError(_("Aucun enregistrement ne correspond à la sélection."))
+
+        res_model, methode = self.action_masse.split(':')
+        action = self.env['action.masse'].lancer(res_model, methode, safe_eval(self.domaine))
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Action de Masse'),
+            'res_model': 'action.masse',
+            'res_id': action.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def action_annuler(self):
+        """Annuler le wizard"""
+        return {'type': 'ir.actions.act_window_close'}
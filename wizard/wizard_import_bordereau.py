@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import logging
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Lignes validées, dédoublonnées et créées ensemble
+TAILLE_LOT_IMPORT = 1000
+
+# Nombre maximal d'erreurs détaillées dans le rapport (les suivantes sont seulement comptées)
+LIMITE_ERREURS_RAPPORT = 100
+
+# En-têtes reconnus (normalisés : minuscules, sans accents, espaces remplacés par _)
+COLONNES_BORDEREAU = {
+    'radical_dossier': ('radical', 'radical_dossier', 'radical_du_dossier'),
+    'code_agence': ('agence', 'code_agence', 'code_de_l_agence'),
+    'reference_externe': ('reference', 'reference_dossier', 'ref', 'reference_externe', 'numero_dossier'),
+}
+
+
+def _normaliser_entete(valeur):
+    texte = unicodedata.normalize('NFKD', str(valeur or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(texte.lower().replace("'", ' ').split())
+
+
+def _texte_cellule(valeur):
+    """Valeur de cellule en texte ; les codes lus comme nombres par le tableur perdent leur partie décimale nulle"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+class WizardImportBordereau(models.TransientModel):
+    _name = 'wizard.import.bordereau'
+    _description = 'Assistant Import de Bordereau'
+
+    # === FICHIER ===
+    fichier = fields.Binary(
+        string='Bordereau',
+        required=True,
+        attachment=True,
+        help="Fichier CSV ou XLSX du bureau d'ordre : une ligne par dossier (radical, agence, référence)"
+    )
+
+    nom_fichier = fields.Char(string='Nom du Fichier')
+
+    separateur = fields.Selection([
+        (';', 'Point-virgule'),
+        (',', 'Virgule'),
+        ('\t', 'Tabulation')
+    ], string='Séparateur CSV', default=';', required=True)
+
+    encodage = fields.Selection([
+        ('utf-8-sig', 'UTF-8'),
+        ('cp1252', 'Windows-1252')
+    ], string='Encodage CSV', default='utf-8-sig', required=True)
+
+    # === RÉCEPTION ===
+    date_reception = fields.Datetime(
+        string='Date de Réception',
+        default=fields.Datetime.now,
+        required=True
+    )
+
+    bordereau_livraison = fields.Char(string='N° Bordereau de Livraison')
+
+    coursier = fields.Char(string='Nom du Coursier')
+
+    valider_reception = fields.Boolean(
+        string='Valider la réception',
+        default=True,
+        help="Valider la réception une fois les dossiers importés"
+    )
+
+    # === RÉSULTATS ===
+    state = fields.Selection([
+        ('brouillon', 'Brouillon'),
+        ('en_cours', 'Suite en Tâche de Fond'),
+        ('termine', 'Terminé')
+    ], default='brouillon')
+
+    reception_id = fields.Many2one('reception.dossier', string='Réception Créée', readonly=True)
+    nombre_lignes = fields.Integer(string='Lignes Lues', readonly=True)
+    nombre_importes = fields.Integer(string='Dossiers Créés', readonly=True)
+    nombre_doublons = fields.Integer(string='Doublons Ignorés', readonly=True)
+    nombre_erreurs = fields.Integer(string='Lignes en Erreur', readonly=True)
+    rapport_erreurs = fields.Text(string="Rapport d'Erreurs", readonly=True)
+
+    # === ACTIONS ===
+    def action_importer(self):
+        """Importe le bordereau par lots et crée la réception avec ses dossiers pré-remplis.
+
+        Les lignes sont lues jusqu'au premier lot importable, qui crée la
+        réception. Si le fichier continue au-delà, la suite est confiée au cron
+        de création des dossiers de la réception, qui la reprend par lots
+        validés en base : un gros bordereau ne tient pas la requête HTTP.
+        """
+        self.ensure_one()
+        if self.state != 'brouillon':
+            raise UserError(_("Ce bordereau a déjà été importé."))
+
+        bilan = {'lignes': 0, 'importes': 0, 'doublons': 0, 'erreurs': 0, 'rapport': []}
+        reception = self.env['reception.dossier']
+        lot = []
+        derniere_ligne = 0
+        suite = False
+        with self._ouvrir_fichier() as flux:
+            for numero_ligne, ligne in self._iterer_lignes(flux, self.separateur, self.encodage, self.nom_fichier):
+                if reception and not lot:
+                    suite = True
+                    break
+                bilan['lignes'] += 1
+                lot.append((numero_ligne, ligne))
+                if len(lot) >= TAILLE_LOT_IMPORT:
+                    reception = self._importer_lot(lot, reception, bilan)
+                    derniere_ligne = numero_ligne
+                    lot = []
+        if lot:
+            reception = self._importer_lot(lot, reception, bilan)
+            derniere_ligne = lot[-1][0]
+
+        if not reception:
+            raise UserError(_("Aucun dossier à importer : %d lignes lues, %d doublons, %d erreurs.\n%s") % (
+                bilan['lignes'], bilan['doublons'], bilan['erreurs'], '\n'.join(bilan['rapport'])
+            ))
+
+        self._enregistrer_avancement(reception, bilan, derniere_ligne)
+        if suite:
+            reception.write({
+                'import_fichier_id': self._get_piece_jointe().copy({
+                    'name': self.nom_fichier or _('Bordereau'),
+                    'res_model': reception._name,
+                    'res_id': reception.id,
+                    'res_field': False,
+                }).id,
+                'import_separateur': self.separateur,
+                'import_encodage': self.encodage,
+            })
+            reception._lancer_creation_dossiers(valider=self.valider_reception)
+        else:
+            self._terminer_import(reception, bilan)
+            if self.valider_reception:
+                reception.action_valider_reception()
+
+        rapport = bilan['rapport']
+        if bilan['erreurs'] > len(rapport):
+            rapport.append(_("... et %d autres erreurs") % (bilan['erreurs'] - len(rapport)))
+        self.write({
+            'state': 'en_cours' if suite else 'termine',
+            'reception_id': reception.id,
+            'nombre_lignes': bilan['lignes'],
+            'nombre_importes': bilan['importes'],
+            'nombre_doublons': bilan['doublons'],
+            'nombre_erreurs': bilan['erreurs'],
+            'rapport_erreurs': '\n'.join(rapport),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_voir_reception(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Réception Importée'),
+            'res_model': 'reception.dossier',
+            'res_id': self.reception_id.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def action_annuler(self):
+        """Annuler le wizard"""
+        return {'type': 'ir.actions.act_window_close'}
+
+    # === LECTURE EN FLUX ===
+    def _get_piece_jointe(self):
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_field', '=', 'fichier'), ('res_id', '=', self.id)
+        ], limit=1)
+        if not attachment:
+            raise UserError(_("Veuillez déposer un bordereau."))
+        return attachment
+
+    def _ouvrir_fichier(self):
+        return self._ouvrir_piece_jointe(self._get_piece_jointe())
+
+    @api.model
+    @contextmanager
+    def _ouvrir_piece_jointe(self, attachment):
+        """Ouvre un bordereau déposé en lecture binaire, directement dans le filestore si possible.
+
+        Le contenu n'est ni chargé ni décodé en mémoire d'un bloc.
+        """
+        attachment = attachment.sudo()
+        if attachment.store_fname:
+            with open(attachment._full_path(attachment.store_fname), 'rb') as flux:
+                yield flux
+        else:
+            yield io.BytesIO(attachment.raw)
+
+    @api.model
+    def _est_xlsx(self, flux, nom_fichier):
+        debut = flux.read(4)
+        flux.seek(0)
+        return debut == b'PK\x03\x04' or (nom_fichier or '').lower().endswith('.xlsx')
+
+    @api.model
+    def _iterer_lignes(self, flux, separateur, encodage, nom_fichier):
+        """Génère (numéro de ligne, {champ: valeur}) ligne par ligne, quelle que soit la taille du fichier"""
+        if self._est_xlsx(flux, nom_fichier):
+            if openpyxl is None:
+                raise UserError(_("La lecture des fichiers XLSX nécessite la bibliothèque openpyxl."))
+            classeur = openpyxl.load_workbook(flux, read_only=True, data_only=True)
+            try:
+                lignes = classeur.active.iter_rows(values_only=True)
+                yield from self._associer_colonnes(lignes)
+            finally:
+                classeur.close()
+        else:
+            texte = io.TextIOWrapper(flux, encoding=encodage, newline='')
+            try:
+                yield from self._associer_colonnes(csv.reader(texte, delimiter=separateur))
+            finally:
+                texte.detach()
+
+    @api.model
+    def _associer_colonnes(self, lignes):
+        """Associe les colonnes du fichier aux champs du dossier d'après la ligne d'en-tête"""
+        entete = next(lignes, None)
+        if not entete:
+            raise UserError(_("Le bordereau est vide."))
+        alias = {nom: champ for champ, noms in COLONNES_BORDEREAU.items() for nom in noms}
+        indices = {}
+        for indice, valeur in enumerate(entete):
+            champ = alias.get(_normaliser_entete(valeur))
+            if champ and champ not in indices:
+                indices[champ] = indice
+        if 'radical_dossier' not in indices or 'code_agence' not in indices:
+            raise UserError(_("Le bordereau doit contenir au moins les colonnes radical et agence."))
+
+        for numero_ligne, valeurs in enumerate(lignes, start=2):
+            if not valeurs or not any(_texte_cellule(v) for v in valeurs):
+                continue
+            yield numero_ligne, {
+                champ: _texte_cellule(valeurs[indice]) if indice < len(valeurs) else ''
+                for champ, indice in indices.items()
+            }
+
+    # === TRAITEMENT PAR LOTS ===
+    @api.model
+    def _cle_doublon(self, ligne):
+        """Clé d'unicité d'un dossier : sa référence, à défaut le couple radical / agence"""
+        if ligne.get('reference_externe'):
+            return ('reference', ligne['reference_externe'])
+        return ('radical', ligne['radical_dossier'], ligne['code_agence'])
+
+    @api.model
+    def _valider_ligne(self, ligne):
+        """Retourne le message d'erreur d'une ligne, ou None si elle est importable"""
+        if len(ligne['radical_dossier']) < 3:
+            return _("radical dossier absent ou de moins de 3 caractères")
+        if len(ligne['code_agence']) < 2:
+            return _("code agence absent ou de moins de 2 caractères")
+        return None
+
+    @api.model
+    def _get_cles_existantes(self, lignes):
+        """Clés des lignes déjà présentes dans les dossiers, en une requête par type de clé"""
+        Dossier = self.env['dossier.collecteur']
+        Dossier.flush_model(['reference_externe', 'radical_dossier', 'code_agence'])
+        existantes = set()
+
+        references = [ligne['reference_externe'] for ligne in lignes if ligne.get('reference_externe')]
+        if references:
+            self.env.cr.execute(f"""
+                SELECT reference_externe FROM {Dossier._table} WHERE reference_externe = ANY(%s)
+            """, [references])
+            existantes.update(('reference', reference) for reference, in self.env.cr.fetchall())
+
+        couples = [ligne for ligne in lignes if not ligne.get('reference_externe')]
+        if couples:
+            self.env.cr.execute(f"""
+                SELECT d.radical_dossier, d.code_agence
+                  FROM {Dossier._table} d
+                  JOIN unnest(%s::varchar[], %s::varchar[]) AS c(radical, agence)
+                    ON d.radical_dossier = c.radical AND d.code_agence = c.agence
+            """, [[ligne['radical_dossier'] for ligne in couples], [ligne['code_agence'] for ligne in couples]])
+            existantes.update(('radical', radical, agence) for radical, agence in self.env.cr.fetchall())
+        return existantes
+
+    def _importer_lot(self, lot, reception, bilan):
+        """Valide, dédoublonne et crée un lot de lignes ; crée la réception au premier lot importable.
+
+        Les doublons sont recherchés dans le lot puis en base, où se trouvent
+        déjà les lots précédents : seul le lot courant est gardé en mémoire.
+        """
+        valides = []
+        for numero_ligne, ligne in lot:
+            erreur = self._valider_ligne(ligne)
+            if erreur:
+                bilan['erreurs'] += 1
+                if len(bilan['rapport']) < LIMITE_ERREURS_RAPPORT:
+                    bilan['rapport'].append(_("Ligne %d : %s") % (numero_ligne, erreur))
+                continue
+            valides.append(ligne)
+
+        existantes = self._get_cles_existantes(valides)
+        a_creer = []
+        for ligne in valides:
+            cle = self._cle_doublon(ligne)
+            if cle in existantes:
+                bilan['doublons'] += 1
+                continue
+            existantes.add(cle)
+            a_creer.append(ligne)
+        if not a_creer:
+            return reception
+
+        if not reception:
+            reception = self.env['reception.dossier'].create({
+                'date_reception': self.date_reception,
+                'bordereau_livraison': self.bordereau_livraison,
+                'coursier': self.coursier,
+                'nombre_dossiers': len(a_creer),
+                'archiviste_id': self.env.user.id,
+                'state': 'brouillon',
+            })
+
+        vals_dossier = reception._get_vals_dossier()
+        self.env['dossier.collecteur'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True
+        ).create([dict(vals_dossier, **ligne) for ligne in a_creer])
+        bilan['importes'] += len(a_creer)
+        _logger.info("Import de bordereau : %d dossiers créés pour la réception %s", bilan['importes'], reception.id)
+
+        # Le lot suivant ne garde rien en cache
+        self.env.invalidate_all()
+        return reception
+
+    # === SUITE EN TÂCHE DE FOND ===
+    @api.model
+    def _enregistrer_avancement(self, reception, bilan, derniere_ligne):
+        """Enregistre sur la réception le point de reprise et le bilan de l'import"""
+        reception.write({
+            'nombre_dossiers': bilan['importes'],
+            'import_derniere_ligne': derniere_ligne,
+            'import_nombre_doublons': bilan['doublons'],
+            'import_nombre_erreurs': bilan['erreurs'],
+            'import_rapport_erreurs': '\n'.join(bilan['rapport']) or False,
+        })
+
+    @api.model
+    def _terminer_import(self, reception, bilan):
+        reception.write({'import_fichier_id': False})
+        reception.message_post(
+            body=_("Import du bordereau : %d dossiers créés, %d doublons ignorés, %d lignes en erreur") % (
+                bilan['importes'], bilan['doublons'], bilan['erreurs']
+            ),
+            subtype_xmlid='mail.mt_note'
+        )
+
+    @api.model
+    def _poursuivre_import(self, reception, echeance):
+        """Importe les lignes du bordereau de la réception qui suivent son point de reprise.
+
+        Appelé par le cron de création des dossiers. Chaque lot est validé en
+        base avec le point de reprise et le bilan : une interruption ne fait
+        perdre que le lot en cours. Retourne False si l'échéance
+        (time.monotonic) est atteinte avant la fin du fichier.
+        """
+        reprise = reception.import_derniere_ligne
+        bilan = {
+            'lignes': 0,
+            'importes': reception.nombre_dossiers,
+            'doublons': reception.import_nombre_doublons,
+            'erreurs': reception.import_nombre_erreurs,
+            'rapport': (reception.import_rapport_erreurs or '').splitlines(),
+        }
+        fichier = reception.import_fichier_id
+        separateur, encodage, nom_fichier = reception.import_separateur, reception.import_encodage, fichier.name
+        lot = []
+        with self._ouvrir_piece_jointe(fichier) as flux:
+            for numero_ligne, ligne in self._iterer_lignes(flux, separateur, encodage, nom_fichier):
+                if numero_ligne <= reprise:
+                    continue
+                lot.append((numero_ligne, ligne))
+                if len(lot) < TAILLE_LOT_IMPORT:
+                    continue
+                self._importer_lot(lot, reception, bilan)
+                self._enregistrer_avancement(reception, bilan, numero_ligne)
+                self.env.cr.commit()
+                lot = []
+                if time.monotonic() > echeance:
+                    return False
+        if lot:
+            self._importer_lot(lot, reception, bilan)
+            self._enregistrer_avancement(reception, bilan, lot[-1][0])
+
+        self._terminer_import(reception, bilan)
+        return True
@@ -69,8 +69,6 @@ class WizardNouvelleReception(models.TransientModel):
         for record in self:
             if record.nombre_dossiers <= 0:
                 raise ValidationError(_("Le nombre de dossiers doit être supérieur à 0."))
-            if record.nombre_dossiers > 1000:
-                raise ValidationError(_("Le nombre de dossiers ne peut pas dépasser 1000 par réception."))
 
     @api.constrains('date_reception', 'heure_arrivee')
     def _check_dates(self):
@@ -98,14 +96,12 @@ class WizardNouvelleReception(models.TransientModel):
         
         reception = self.env['reception.dossier'].create(reception_vals)
         
-        # Créer automatiquement les dossiers si demandé
-        if self.creation_automatique_dossiers:
-            self._creer_dossiers_automatiquement(reception)
-        
-        # Démarrer le traitement si demandé
+        # Démarrer le traitement si demandé (validation et création des dossiers comprises),
+        # sinon créer automatiquement les dossiers si demandé
         if self.demarrer_traitement:
-            reception.action_valider_reception()
-            reception.action_demarrer_traitement()
+            reception._lancer_creation_dossiers(valider=True, demarrer=True)
+        elif self.creation_automatique_dossiers:
+            self._creer_dossiers_automatiquement(reception)
         
         # Retourner l'action pour ouvrir la réception créée
         return {
@@ -118,16 +114,8 @@ class WizardNouvelleReception(models.TransientModel):
         }
     
     def _creer_dossiers_automatiquement(self, reception):
-        """Créer automatiquement les dossiers collecteurs"""
-        dossier_obj = self.env['dossier.collecteur']
-        
-        for i in range(self.nombre_dossiers):
-            dossier_vals = {
-                'reception_id': reception.id,
-                'type_dossier': self.type_dossier,
-                'state': 'recu'
-            }
-            dossier_obj.create(dossier_vals)
+        """Créer automatiquement les dossiers collecteurs (par lots, en tâche de fond au-delà du seuil)"""
+        reception._lancer_creation_dossiers()
     
     def action_annuler(self):
         """Annuler le wizard"""
@@ -361,25 +349,41 @@ class WizardTransfertStock(models.TransientModel):
             'note': self.notes
         }
         
+        # Produit et unité résolus une fois pour tout le transfert
+        product = self._get_product_dossier()
+        dossiers = self.dossier_ids
+        if not all(dossiers.mapped('numero_dossier')):
+            raise UserError(_("Chaque dossier transféré doit avoir un numéro : il sert de numéro de série."))
+
+        # Un seul mouvement pour tous les dossiers, suivi par numéro de série
+        picking_vals['move_ids'] = [(0, 0, {
+            'name': _('Transfert de %d dossiers') % len(dossiers),
+            'product_id': product.id,
+            'product_uom_qty': len(dossiers),
+            'product_uom': product.uom_id.id,
+            'location_id': self.emplacement_source_id.id,
+            'location_dest_id': self.emplacement_destination_id.id,
+        })]
         picking = self.env['stock.picking'].create(picking_vals)
+        picking.action_confirm()
         
-        # Créer les lignes de transfert pour chaque dossier
-        for dossier in self.dossier_ids:
-            move_vals = {
-                'name': f'Transfert {dossier.numero_dossier}',
-                'product_id': self._get_product_dossier().id,
-                'product_uom_qty': 1,
-                'product_uom': self.env.ref('uom.product_uom_unit').id,
-                'picking_id': picking.id,
-                'location_id': self.emplacement_source_id.id,
-                'location_dest_id': self.emplacement_destination_id.id,
-            }
-            self.env['stock.move'].create(move_vals)
+        # Une ligne par dossier (son numéro de série), créées en une fois
+        lots = self._get_lots_dossiers(product, dossiers)
+        self._receptionner_numeros_absents(product, lots)
+        move = picking.move_ids
+        self.env['stock.move.line'].create([{
+            'move_id': move.id,
+            'picking_id': picking.id,
+            'product_id': product.id,
+            'product_uom_id': product.uom_id.id,
+            'location_id': self.emplacement_source_id.id,
+            'location_dest_id': self.emplacement_destination_id.id,
+            'lot_id': lots[dossier.numero_dossier],
+            'qty_done': 1,
+        } for dossier in dossiers])
         
         # Valider automatiquement si demandé
         if self.valider_automatiquement:
-            picking.action_confirm()
-            picking.action_assign()
             picking.button_validate()
         
         # Envoyer notification si demandé
@@ -418,20 +422,82 @@ class WizardTransfertStock(models.TransientModel):
         return self.env['stock.picking.type'].search([('code', '=', 'internal')], limit=1)
     
     def _get_product_dossier(self):
-        """Retourner le produit générique pour les dossiers"""
-        # Créer ou récupérer un produit générique pour les dossiers
-        product = self.env['product.product'].search([('default_code', '=', 'DOSSIER_COLLECTEUR')], limit=1)
+        """Retourner le produit générique des dossiers, suivi par numéro de série"""
+        product = self.env.ref('archivage_collecteurs_complet.product_dossier_collecteur', raise_if_not_found=False)
         if not product:
-            product = self.env['product.product'].create({
-                'name': 'Dossier Collecteur',
-                'default_code': 'DOSSIER_COLLECTEUR',
-                'type': 'product',
-                'categ_id': self.env.ref('product.product_category_all').id,
-                'uom_id': self.env.ref('uom.product_uom_unit').id,
-                'uom_po_id': self.env.ref('uom.product_uom_unit').id,
-            })
+            raise UserError(_("Le produit Dossier Collecteur du module est introuvable."))
+        if product.tracking != 'serial':
+            raise UserError(_("Le produit %s doit être suivi par numéro de série pour transférer des dossiers.")
+                            % product.display_name)
         return product
     
+    def _get_lots_dossiers(self, product, dossiers):
+        """Retourner {numéro de dossier: id du numéro de série}, en créant d'un bloc les numéros manquants"""
+        Lot = self.env['stock.lot']
+        company = self.env.company
+        numeros = list(set(dossiers.mapped('numero_dossier')))
+        lots = {
+            lot.name: lot.id
+            for lot in Lot.search([
+                ('product_id', '=', product.id), ('company_id', '=', company.id), ('name', 'in', numeros)
+            ])
+        }
+        manquants = [numero for numero in numeros if numero not in lots]
+        if manquants:
+            lots.update({
+                lot.name: lot.id
+                for lot in Lot.create([
+                    {'name': numero, 'product_id': product.id, 'company_id': company.id} for numero in manquants
+                ])
+            })
+        return lots
+    
+    def _receptionner_numeros_absents(self, product, lots):
+        """Fait entrer en stock, à l'emplacement source, les numéros de série encore jamais reçus.
+
+        Un dossier arrive chez l'archiviste sans avoir été reçu en stock : son
+        numéro est d'abord reçu depuis l'emplacement fournisseur, pour que le
+        transfert interne ne laisse pas de quantité négative. Un numéro déjà
+        en stock ailleurs qu'à l'emplacement source est refusé.
+        """
+        source = self.emplacement_source_id
+        quants = self.env['stock.quant'].search([
+            ('product_id', '=', product.id),
+            ('lot_id', 'in', list(lots.values())),
+            ('location_id.usage', '=', 'internal'),
+            ('quantity', '>', 0),
+        ])
+        ailleurs = quants.filtered(lambda q: not q.location_id._child_of(source))
+        if ailleurs:
+            raise UserError(_("Ces dossiers ne sont pas dans l'emplacement %s : %s") % (
+                source.display_name, ', '.join(sorted(ailleurs.lot_id.mapped('name')))
+            ))
+
+        en_stock = set(quants.lot_id.ids)
+        absents = [lot_id for lot_id in lots.values() if lot_id not in en_stock]
+        if not absents:
+            return
+        fournisseur = self.env.ref('stock.stock_location_suppliers')
+        move = self.env['stock.move'].create({
+            'name': _('Réception de %d dossiers') % len(absents),
+            'product_id': product.id,
+            'product_uom_qty': len(absents),
+            'product_uom': product.uom_id.id,
+            'location_id': fournisseur.id,
+            'location_dest_id': source.id,
+            'origin': f'Transfert {self.type_transfert}',
+            'move_line_ids': [(0, 0, {
+                'product_id': product.id,
+                'product_uom_id': product.uom_id.id,
+                'location_id': fournisseur.id,
+                'location_dest_id': source.id,
+                'lot_id': lot_id,
+                'qty_done': 1,
+            }) for lot_id in absents],
+        })
+        move._action_confirm()
+        move._action_done()
+
     def _envoyer_notification_transfert(self, picking):
         """Envoyer une notification du transfert"""
         # Logique de notification (email, message, etc.)
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import math
+import random
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Étapes dont la durée est mesurée ; le transfert et la livraison sont
+# considérés comme immédiats
+ETAPES_SIMULATION = ('traitement', 'numerisation', 'indexation')
+
+# État du dossier -> indice de la prochaine étape simulée (3 = plus rien à simuler)
+ETAT_VERS_ETAPE = {
+    'reception': 0,
+    'traitement': 0,
+    'transfert': 1,
+    'numerisation': 1,
+    'indexation': 2,
+    'livraison': 3,
+    'livre': 3,
+}
+
+JOURS_OUVRES = {
+    'lundi_vendredi': frozenset(range(5)),
+    'lundi_samedi': frozenset(range(6)),
+    'personnalise': frozenset(range(7)),
+}
+
+# Journée de travail d'un agent ajouté par la simulation, si l'étape n'a pas d'agent (minutes)
+MINUTES_AGENT_DEFAUT = 480.0
+
+
+class WizardSimulationCapacite(models.TransientModel):
+    _name = 'wizard.simulation.capacite'
+    _description = 'Simulation de Capacité et Dimensionnement des Équipes'
+
+    # Paramètres de simulation
+    date_debut = fields.Date(
+        string='Début de la Simulation',
+        default=fields.Date.context_today,
+        required=True
+    )
+
+    horizon_jours = fields.Integer(
+        string='Horizon (jours)',
+        default=90,
+        required=True,
+        help="Nombre de jours calendaires simulés"
+    )
+
+    nombre_replications = fields.Integer(
+        string='Réplications',
+        default=500,
+        required=True,
+        help="Nombre de scénarios aléatoires simulés ; les dates de fin sont des percentiles sur ces scénarios"
+    )
+
+    historique_jours = fields.Integer(
+        string='Historique (jours)',
+        default=90,
+        required=True,
+        help="Période passée dont les durées effectives alimentent les tirages"
+    )
+
+    # Agents supplémentaires
+    agents_traitement_sup = fields.Integer(string='Agents de Traitement en Plus')
+    agents_numerisation_sup = fields.Integer(string='Opérateurs de Numérisation en Plus')
+    agents_indexation_sup = fields.Integer(string="Agents d'Indexation en Plus")
+
+    # Résultats
+    ligne_reception_ids = fields.One2many(
+        'wizard.simulation.capacite.reception',
+        'wizard_id',
+        string='Prévisions par Réception',
+        readonly=True
+    )
+
+    ligne_etape_ids = fields.One2many(
+        'wizard.simulation.capacite.etape',
+        'wizard_id',
+        string='Charge par Étape',
+        readonly=True
+    )
+
+    duree_calcul = fields.Float(string='Durée du Calcul (s)', readonly=True)
+
+    @api.constrains('horizon_jours', 'nombre_replications', 'historique_jours')
+    def _check_parametres(self):
+        for record in self:
+            if record.horizon_jours <= 0 or record.nombre_replications <= 0 or record.historique_jours <= 0:
+                raise ValidationError(_("L'horizon, le nombre de réplications et l'historique doivent être positifs."))
+
+    @api.constrains('agents_traitement_sup', 'agents_numerisation_sup', 'agents_indexation_sup')
+    def _check_agents_sup(self):
+        for record in self:
+            if min(record.agents_traitement_sup, record.agents_numerisation_sup, record.agents_indexation_sup) < 0:
+                raise ValidationError(_("Le nombre d'agents ajoutés ne peut pas être négatif."))
+
+    # === ACTIONS ===
+    def action_simuler(self):
+        """Lance la simulation et affiche les prévisions"""
+        self.ensure_one()
+        debut_calcul = time.time()
+
+        distributions = self._get_distributions()
+        capacites, agents_actuels, agents_simules = self._get_capacites()
+        receptions, volumes = self._get_encours()
+        if not receptions:
+            raise UserError(_("Aucune réception en cours : rien à simuler."))
+
+        if numpy is not None:
+            resultats = self._simuler_numpy(distributions, capacites, volumes)
+        else:
+            resultats = self._simuler_python(distributions, capacites, volumes)
+        jours_fin, debits, minutes_utilisees, encours_finaux = resultats
+
+        lignes_reception = []
+        for reception_id, volume, jours in zip(receptions, volumes, jours_fin):
+            p50, p90 = self._percentile(jours, 50), self._percentile(jours, 90)
+            lignes_reception.append((0, 0, {
+                'reception_id': reception_id,
+                'dossiers_restants': sum(volume[:3]),
+                'date_fin_p50': self.date_debut + timedelta(days=p50) if p50 is not None else False,
+                'date_fin_p90': self.date_debut + timedelta(days=p90) if p90 is not None else False,
+                'probabilite_horizon': 100.0 * sum(1 for jour in jours if jour is not None) / len(jours),
+            }))
+
+        lignes_etape = []
+        for k, etape in enumerate(ETAPES_SIMULATION):
+            capacite_totale = sum(capacites[k])
+            lignes_etape.append((0, 0, {
+                'etape': etape,
+                'agents_actuels': agents_actuels[k],
+                'agents_simules': agents_simules[k],
+                'capacite_jour': capacite_totale / self.horizon_jours,
+                'duree_moyenne': distributions[k][2],
+                'debit_moyen': debits[k] / self.horizon_jours,
+                'utilisation': 100.0 * minutes_utilisees[k] / capacite_totale if capacite_totale else 0,
+                'encours_final': encours_finaux[k],
+            }))
+
+        self.ligne_reception_ids.unlink()
+        self.ligne_etape_ids.unlink()
+        self.write({
+            'ligne_reception_ids': lignes_reception,
+            'ligne_etape_ids': lignes_etape,
+            'duree_calcul': time.time() - debut_calcul,
+        })
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Simulation de Capacité'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_annuler(self):
+        """Annuler le wizard"""
+        return {'type': 'ir.actions.act_window_close'}
+
+    # === DONNÉES D'ENTRÉE ===
+    def _get_distributions(self):
+        """Distributions empiriques des durées effectives par étape.
+
+        Lues dans les histogrammes journaliers (reporting.kpi.histogramme) :
+        retourne, par étape, (valeurs en minutes, probabilités, moyenne, variance).
+        """
+        Histogramme = self.env['reporting.kpi.histogramme']
+        date_fin = self.date_debut
+        date_debut = date_fin - timedelta(days=self.historique_jours)
+        histogrammes = Histogramme.get_histogrammes(date_debut, date_fin, etapes=ETAPES_SIMULATION, par_agent=False)
+
+        etapes = dict(Histogramme._fields['etape'].selection)
+        distributions = []
+        for etape in ETAPES_SIMULATION:
+            histogramme = histogrammes.get((etape, None))
+            if not histogramme:
+                raise UserError(_("Aucune durée historique pour l'étape %s sur la période choisie.") % etapes[etape])
+            total = sum(histogramme.values())
+            valeurs = [Histogramme._valeur_bucket(indice) for indice in sorted(histogramme)]
+            probabilites = [histogramme[indice] / total for indice in sorted(histogramme)]
+            moyenne = sum(v * p for v, p in zip(valeurs, probabilites))
+            variance = sum(p * (v - moyenne) ** 2 for v, p in zip(valeurs, probabilites))
+            distributions.append((valeurs, probabilites, moyenne, variance))
+        return distributions
+
+    def _get_capacites(self):
+        """Minutes de travail disponibles par étape et par jour simulé.
+
+        Tient compte des horaires, des jours de travail et des congés connus
+        de chaque agent, plus les agents ajoutés (journée moyenne de l'étape,
+        du lundi au vendredi). Retourne (capacités [étape][jour], agents
+        actuels par étape, agents simulés par étape).
+        """
+        jours = [self.date_debut + timedelta(days=j) for j in range(self.horizon_jours)]
+        capacites = [[0.0] * self.horizon_jours for _etape in ETAPES_SIMULATION]
+        agents_actuels = [0] * len(ETAPES_SIMULATION)
+        minutes_agents = [[] for _etape in ETAPES_SIMULATION]
+
+        agents = self.env['res.users'].search([('specialite_archivage', 'in', list(ETAPES_SIMULATION))])
+        for agent in agents:
+            k = ETAPES_SIMULATION.index(agent.specialite_archivage)
+            minutes = max(agent.horaire_fin - agent.horaire_debut, 0) * 60
+            jours_ouvres = JOURS_OUVRES.get(agent.jours_travail, JOURS_OUVRES['personnalise'])
+            agents_actuels[k] += 1
+            minutes_agents[k].append(minutes)
+            for j, jour in enumerate(jours):
+                if jour.weekday() not in jours_ouvres:
+                    continue
+                if agent.date_debut_conge and agent.date_fin_conge:
+                    if agent.date_debut_conge <= jour <= agent.date_fin_conge:
+                        continue
+                elif agent.en_conge:
+                    continue
+                capacites[k][j] += minutes
+
+        ajouts = (self.agents_traitement_sup, self.agents_numerisation_sup, self.agents_indexation_sup)
+        for k, ajout in enumerate(ajouts):
+            if not ajout:
+                continue
+            minutes = sum(minutes_agents[k]) / len(minutes_agents[k]) if minutes_agents[k] else MINUTES_AGENT_DEFAUT
+            for j, jour in enumerate(jours):
+                if jour.weekday() in JOURS_OUVRES['lundi_vendredi']:
+                    capacites[k][j] += ajout * minutes
+
+        agents_simules = [actuels + ajout for actuels, ajout in zip(agents_actuels, ajouts)]
+        return capacites, agents_actuels, agents_simules
+
+    def _get_encours(self):
+        """Dossiers restants des réceptions non terminées, par prochaine étape, en une requête.
+
+        Retourne (ids des réceptions par ordre d'arrivée, volumes) où chaque
+        volume compte les dossiers par indice d'étape (0 à 3).
+        """
+        Reception = self.env['reception.dossier']
+        Dossier = self.env['dossier.collecteur']
+        Reception.flush_model()
+        Dossier.flush_model(['reception_id', 'state'])
+        self.env.cr.execute(f"""
+            SELECT r.id, r.state, r.nombre_dossiers, d.state, COUNT(d.id)
+              FROM {Reception._table} r
+              LEFT JOIN {Dossier._table} d ON d.reception_id = r.id
+             WHERE r.state IN ('brouillon', 'valide', 'en_cours')
+             GROUP BY r.id, r.state, r.nombre_dossiers, d.state
+             ORDER BY r.date_reception, r.id
+        """)
+
+        volumes = {}
+        for reception_id, etat_reception, nombre_dossiers, etat_dossier, nombre in self.env.cr.fetchall():
+            volume = volumes.setdefault(reception_id, [0, 0, 0, 0])
+            if etat_dossier:
+                volume[ETAT_VERS_ETAPE.get(etat_dossier, 0)] += nombre
+            elif etat_reception == 'brouillon':
+                # Dossiers pas encore créés : tout reste à faire
+                volume[0] += nombre_dossiers or 0
+
+        receptions = [reception_id for reception_id, volume in volumes.items() if sum(volume[:3])]
+        return receptions, [volumes[reception_id] for reception_id in receptions]
+
+    # === MOTEUR DE SIMULATION ===
+    # Simulation à pas journalier : chaque jour, chaque étape traite sa file
+    # dans la limite de la capacité en minutes de son équipe, en tirant les
+    # durées dans la distribution historique. Les dossiers terminés passent à
+    # l'étape suivante le lendemain. Les réceptions sont servies dans leur
+    # ordre d'arrivée : une réception est terminée quand le nombre cumulé de
+    # dossiers sortis de l'indexation couvre ses dossiers et ceux des
+    # réceptions précédentes.
+
+    def _borne_tirages(self, capacite, moyenne, variance):
+        """Nombre de tirages suffisant pour couvrir une journée de capacité (moyenne + 4 écarts-types)"""
+        attendu = capacite / moyenne
+        ecart = math.sqrt(capacite * variance / moyenne ** 3) if variance else 0
+        return int(math.ceil(attendu + 4 * ecart)) + 1
+
+    def _simuler_numpy(self, distributions, capacites, volumes):
+        """Simulation vectorisée sur toutes les réplications à la fois"""
+        generateur = numpy.random.default_rng()
+        replications = self.nombre_replications
+        volumes = numpy.array(volumes, dtype=float)
+        files = numpy.tile(volumes[:, :3].sum(axis=0), (replications, 1))
+        termines = numpy.zeros(replications)
+        termines_cumules = numpy.zeros((replications, self.horizon_jours))
+        debits = numpy.zeros(len(ETAPES_SIMULATION))
+        minutes_utilisees = numpy.zeros(len(ETAPES_SIMULATION))
+        lignes = numpy.arange(replications)
+
+        for j in range(self.horizon_jours):
+            sorties = numpy.zeros((replications, len(ETAPES_SIMULATION)))
+            for k, (valeurs, probabilites, moyenne, variance) in enumerate(distributions):
+                capacite = capacites[k][j]
+                file_max = int(files[:, k].max())
+                if capacite <= 0 or not file_max:
+                    continue
+                tirages = min(file_max, self._borne_tirages(capacite, moyenne, variance))
+                cumul = generateur.choice(valeurs, size=(replications, tirages), p=probabilites).cumsum(axis=1)
+                nombre = numpy.minimum((cumul <= capacite).sum(axis=1), files[:, k])
+                utilisees = numpy.where(nombre > 0, cumul[lignes, numpy.maximum(nombre.astype(int) - 1, 0)], 0)
+                sorties[:, k] = nombre
+                debits[k] += nombre.sum()
+                minutes_utilisees[k] += utilisees.sum()
+
+            files[:, 0] -= sorties[:, 0]
+            files[:, 1] += sorties[:, 0] - sorties[:, 1]
+            files[:, 2] += sorties[:, 1] - sorties[:, 2]
+            termines += sorties[:, 2]
+            termines_cumules[:, j] = termines
+
+        jours_fin = []
+        for objectif in volumes[:, :3].sum(axis=1).cumsum():
+            atteint = termines_cumules >= objectif - 1e-9
+            jour = atteint.argmax(axis=1)
+            jours_fin.append([int(jour[i]) if atteint[i, jour[i]] else None for i in range(replications)])
+
+        return (
+            jours_fin,
+            (debits / replications).tolist(),
+            (minutes_utilisees / replications).tolist(),
+            files.mean(axis=0).tolist(),
+        )
+
+    def _simuler_python(self, distributions, capacites, volumes):
+        """Même simulation, une réplication à la fois (sans numpy)"""
+        replications = self.nombre_replications
+        objectifs = list(itertools.accumulate(sum(volume[:3]) for volume in volumes))
+        initiales = [sum(volume[k] for volume in volumes) for k in range(len(ETAPES_SIMULATION))]
+        jours_fin = [[] for _objectif in objectifs]
+        debits = [0.0] * len(ETAPES_SIMULATION)
+        minutes_utilisees = [0.0] * len(ETAPES_SIMULATION)
+        encours_finaux = [0.0] * len(ETAPES_SIMULATION)
+
+        for _replication in range(replications):
+            files = list(initiales)
+            termines = 0
+            prochain = 0
+            fins = [None] * len(objectifs)
+            for j in range(self.horizon_jours):
+                sorties = [0] * len(ETAPES_SIMULATION)
+                for k, (valeurs, probabilites, moyenne, variance) in enumerate(distributions):
+                    capacite = capacites[k][j]
+                    if capacite <= 0 or not files[k]:
+                        continue
+                    tirages = min(files[k], self._borne_tirages(capacite, moyenne, variance))
+                    utilisees = 0.0
+                    for duree in random.choices(valeurs, weights=probabilites, k=tirages):
+                        if utilisees + duree > capacite:
+                            break
+                        utilisees += duree
+                        sorties[k] += 1
+                    debits[k] += sorties[k]
+                    minutes_utilisees[k] += utilisees
+
+                files[0] -= sorties[0]
+                files[1] += sorties[0] - sorties[1]
+                files[2] += sorties[1] - sorties[2]
+                termines += sorties[2]
+                while prochain < len(objectifs) and termines >= objectifs[prochain]:
+                    fins[prochain] = j
+                    prochain += 1
+
+            for i, fin in enumerate(fins):
+                jours_fin[i].append(fin)
+            for k in range(len(ETAPES_SIMULATION)):
+                encours_finaux[k] += files[k]
+
+        return (
+            jours_fin,
+            [debit / replications for debit in debits],
+            [minutes / replications for minutes in minutes_utilisees],
+            [encours / replications for encours in encours_finaux],
+        )
+
+    @api.model
+    def _percentile(self, jours, percentile):
+        """Percentile (rang le plus proche) des jours de fin ; None si au-delà de l'horizon"""
+        rang = max(int(math.ceil(percentile / 100.0 * len(jours))) - 1, 0)
+        valeurs = sorted(jours, key=lambda jour: math.inf if jour is None else jour)
+        return valeurs[rang]
+
+
+class WizardSimulationCapaciteReception(models.TransientModel):
+    _name = 'wizard.simulation.capacite.reception'
+    _description = 'Prévision de Fin par Réception'
+    _order = 'date_fin_p50, id'
+
+    wizard_id = fields.Many2one('wizard.simulation.capacite', required=True, ondelete='cascade')
+    reception_id = fields.Many2one('reception.dossier', string='Réception', readonly=True)
+    dossiers_restants = fields.Integer(string='Dossiers Restants', readonly=True)
+    date_fin_p50 = fields.Date(
+        string='Fin Probable (P50)',
+        readonly=True,
+        help="Vide si la moitié des scénarios ne termine pas dans l'horizon"
+    )
+    date_fin_p90 = fields.Date(
+        string='Fin Pessimiste (P90)',
+        readonly=True,
+        help="Vide si plus de 10 % des scénarios ne terminent pas dans l'horizon"
+    )
+    probabilite_horizon = fields.Float(string="% Terminé dans l'Horizon", readonly=True)
+
+
+class WizardSimulationCapaciteEtape(models.TransientModel):
+    _name = 'wizard.simulation.capacite.etape'
+    _description = 'Charge Simulée par Étape'
+
+    wizard_id = fields.Many2one('wizard.simulation.capacite', required=True, ondelete='cascade')
+    etape = fields.Selection([
+        ('traitement', 'Traitement Physique'),
+        ('numerisation', 'Numérisation'),
+        ('indexation', 'Indexation')
+    ], string='Étape', readonly=True)
+    agents_actuels = fields.Integer(string='Agents Actuels', readonly=True)
+    agents_simules = fields.Integer(string='Agents Simulés', readonly=True)
+    capacite_jour = fields.Float(string='Capacité Moyenne (min/jour)', readonly=True)
+    duree_moyenne = fields.Float(string='Durée Moyenne Historique (min)', readonly=True)
+    debit_moyen = fields.Float(string='Débit Moyen (dossiers/jour)', readonly=True)
+    utilisation = fields.Float(string='Utilisation (%)', readonly=True)
+    encours_final = fields.Float(string='En-cours en Fin d\'Horizon', readonly=True)